@@ -0,0 +1,117 @@
+"""Incremental alert engine.
+
+Alert rules are registered once, each against one kind of entity
+("patient" or "stage"). When an entity changes, only the rules for that
+entity kind are evaluated, and only for that entity:
+
+* a rule that matches raises (or refreshes) the alert `<rule>-<key>`;
+* a rule that no longer matches resolves it.
+
+Active alerts live in a bounded, insertion-ordered buffer keyed by alert id,
+which is also the dedup index. Reading the newest N alerts walks N entries
+and recomputes nothing; once the buffer is full the oldest alert is evicted.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class AlertRule:
+    def __init__(self, name, entity, alert_type, check):
+        self.name = name
+        self.entity = entity
+        self.alert_type = alert_type
+        # check(entity_value, key, config) -> message string, or None if clear
+        self.check = check
+
+
+class AlertEngine:
+    def __init__(self, config=None, capacity=200, clock=time.time):
+        self.config = config if config is not None else {}
+        self.capacity = capacity
+        self.clock = clock
+        self._rules = {}
+        self._alerts = OrderedDict()
+
+    def rule(self, name, entity, alert_type='warning'):
+        """Decorator registering `check(value, key, config)` as a rule."""
+        def register(check):
+            self._rules.setdefault(entity, []).append(AlertRule(name, entity, alert_type, check))
+            return check
+        return register
+
+    # -- updates --------------------------------------------------------------
+
+    def evaluate(self, entity, key, value):
+        """Re-check the rules for one changed entity. Returns True if the
+        set of active alerts changed."""
+        changed = False
+        for rule in self._rules.get(entity, ()):
+            alert_id = f'{rule.name}-{key}'
+            message = rule.check(value, key, self.config) if value is not None else None
+            if message is None:
+                changed |= self._alerts.pop(alert_id, None) is not None
+            else:
+                changed |= self._raise(alert_id, rule.alert_type, message)
+        return changed
+
+    def resolve(self, entity, key):
+        """Clear every alert raised for `key` (e.g. a removed patient)."""
+        return self.evaluate(entity, key, None)
+
+    def add(self, alert_id, alert_type, message, timestamp=None):
+        """Raise a one-off alert that no rule manages."""
+        return self._raise(alert_id, alert_type, message, timestamp)
+
+    def rebuild(self, entities):
+        """Evaluate every rule for every entity, e.g. after thresholds change.
+
+        `entities` maps entity kind -> iterable of (key, value).
+        """
+        changed = False
+        for entity, items in entities.items():
+            for key, value in items:
+                changed |= self.evaluate(entity, key, value)
+        return changed
+
+    def clear(self):
+        self._alerts.clear()
+
+    def _raise(self, alert_id, alert_type, message, timestamp=None):
+        existing = self._alerts.get(alert_id)
+        if existing is not None:
+            if existing['message'] == message and existing['type'] == alert_type:
+                return False
+            # same condition, new details: keep its place and first-seen time
+            existing['message'] = message
+            existing['type'] = alert_type
+            existing['updated'] = _iso(self.clock())
+            return True
+
+        ts = self.clock() if timestamp is None else timestamp
+        self._alerts[alert_id] = {'id': alert_id, 'type': alert_type, 'message': message,
+                                  'timestamp': ts, 'time': _iso(ts)}
+        while len(self._alerts) > self.capacity:
+            self._alerts.popitem(last=False)
+        return True
+
+    # -- reads ----------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def __contains__(self, alert_id):
+        return alert_id in self._alerts
+
+    def top(self, limit=10):
+        """Newest `limit` alerts first (copies, safe to serialise or keep)."""
+        result = []
+        for alert in reversed(self._alerts.values()):
+            if len(result) >= limit:
+                break
+            result.append(dict(alert))
+        return result
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts).isoformat(timespec='seconds')
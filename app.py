@@ -1,39 +1,81 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, Response, stream_with_context
+import base64
+import functools
+import hmac
+import json
+import os
 import random
+import threading
+import time
+import uuid
+
+import balancer
+import cache
+import flow_sim
+import persistence
+import scenarios
+from alerts import AlertEngine
+from demographics import AgeBands
+from event_log import MovementLog
+from flow_scheduler import TickScheduler
+from lifecycle import JsonlArchive, PatientLifecycle
+from live_updates import EventBroker
+from metrics import SIZE_BUCKETS, Metrics, RouteProfiler
+from patient_json import PatientJSON
+from patient_store import PatientRegistry
+from timeseries import TimeSeriesStore
+from wait_stats import WaitHistogram, WaitStats
 
 app = Flask(__name__)
 
+# Request counts and latency/size histograms per route, timings of the hot
+# internal paths, and values read at scrape time (registered further down);
+# served as Prometheus text on /metrics
+metrics = Metrics()
+metrics.counter('http_requests_total', 'Requests by route, method and status')
+metrics.histogram('http_request_duration_seconds', 'Request latency by route and method')
+metrics.histogram('http_response_bytes', 'Response body size by route (streamed bodies excluded)', SIZE_BUCKETS)
+metrics.histogram('publish_seconds', 'Duration of publish_changes (flush, read view rebuild, push)')
+metrics.histogram('generate_alerts_seconds', 'Duration of generate_alerts')
+metrics.histogram('flow_tick_seconds', 'Duration of auto-flow ticks (advance, then balance)')
+# cProfile for the next N requests to one route, armed via /api/admin/profile
+route_profiler = RouteProfiler()
+# Admin endpoints exist only when MEDIFLOW_ADMIN_TOKEN is set, and require it
+# in the X-Admin-Token header
+admin_config = {'token': os.environ.get('MEDIFLOW_ADMIN_TOKEN')}
+
 # Flow mode: automatic or manual
 flow_mode = {'auto': False}
 
-# Auto-balance configuration (crowd threshold and moves per stage)
+# Auto-balance configuration (crowd threshold and moves per stage), the
+# seconds between auto-flow ticks and the maximum number of patients each
+# stage can hold (None = unlimited)
 auto_config = {
     'crowd_threshold': 40,
-    'max_moves_per_stage': 3
+    'max_moves_per_stage': 3,
+    'tick_seconds': 10,
+    'stage_capacity': {
+        'Reception': 50,
+        'Screening': 20,
+        'Imaging': 10,
+        'Consultation': 15,
+        'Surgery': 4,
+        'Treatment': 10,
+        'Pharmacy': 20,
+        'Discharge': None,
+    },
 }
 
 # Define the ordered stages for patient movement
 STAGE_ORDER = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
 
+# Simulated minutes covered by one /api/simulate call
+SIMULATION_TICK_MINUTES = 30
+
 # Sample data for simulation
 sample_data = {
-    'total_patients': 143,
-    'avg_wait_time': 23.3,
     'active_staff': 14,
     'occupancy': 82,
-    'patient_distribution': {
-        'Reception': 1,
-        'Consultation': 1,
-        'Discharge': 1,
-        'Imaging': 1,
-        'Treatment': 1
-    },
-    'wait_times': {
-        'total_patients': 170,
-        'avg_wait': 21,
-        'max_wait': 47,
-        'min_wait': 5
-    }
 }
 
 # Sample patient data
@@ -45,6 +87,84 @@ sample_patients = [
     {'id': 5, 'name': 'Charlie Wilson', 'age': 67, 'condition': 'Macular Degeneration', 'status': 'In Treatment', 'stage': 'Treatment', 'priority': 'High', 'doctor_id': 4, 'entry_time': '11:00', 'waiting_time': 10},
 ]
 
+# Indexed store for the live patients (seeded from the sample data above)
+patient_registry = PatientRegistry(STAGE_ORDER, (p.copy() for p in sample_patients))
+# Append-only log of every stage transition; historical charts replay it
+movement_log = MovementLog()
+
+# Rolled-up analytics samples (1-minute / 1-hour / 1-day buckets), taken on
+# every state change; /api/analytics trends read these instead of raw events
+ANALYTICS_METRICS = (['patients', 'occupancy', 'avg_wait', 'active_staff']
+                     + [f'count:{stage}' for stage in STAGE_ORDER]
+                     + [f'wait:{stage}' for stage in STAGE_ORDER])
+analytics_store = TimeSeriesStore(ANALYTICS_METRICS)
+
+# Push channel for live dashboard updates (Server-Sent Events)
+live_broker = EventBroker()
+# Last state pushed to clients, so unchanged data is not re-sent
+_last_published = {'distribution': None, 'alerts': None, 'overview': None, 'wait_times': None}
+# Bumped whenever dashboard-visible state changes; used as the snapshot ETag
+state_version = {'value': 0}
+# Serialized bodies of the read-heavy polling endpoints. Keys carry the state
+# version, so every write invalidates them (publish_changes bumps it) and old
+# versions age out through LRU/TTL. In-process by default; with
+# MEDIFLOW_CACHE_URL=redis://... they live in Redis instead, under a
+# per-process prefix since the state they render is this process's memory.
+cache_config = {
+    'url': os.environ.get('MEDIFLOW_CACHE_URL'),
+    'ttl': 60,
+    'max_entries': 256,
+}
+response_cache = cache.connect(cache_config['url'], prefix=f'mediflow:{uuid.uuid4().hex[:12]}:',
+                               max_entries=cache_config['max_entries'])
+
+# Single-writer state: every handler that mutates patients, alerts, counters or
+# config runs under this lock, so a multi-threaded server sees each write as
+# one step. Readers never take it; they use `read_view` (see publish_changes)
+# or copy records out of the registry.
+state_lock = threading.RLock()
+
+
+def writes_state(fn):
+    """Run a route handler as the single writer."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with state_lock:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+@app.before_request
+def _start_request_metrics():
+    from flask import g, request
+    rule = request.url_rule
+    # (start time, route template, method); templates keep label values bounded
+    g.request_metrics = (time.perf_counter(), '<unmatched>' if rule is None else rule.rule, request.method)
+    g.profile = route_profiler.start(g.request_metrics[1])
+
+
+@app.after_request
+def _record_request_metrics(response):
+    from flask import g
+    started, route, method = g.get('request_metrics') or (None, '<unmatched>', '')
+    if started is not None:
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        (('route', route), ('method', method)))
+    metrics.inc('http_requests_total', (('route', route), ('method', method), ('status', str(response.status_code))))
+    size = response.content_length
+    if size is not None:
+        metrics.observe('http_response_bytes', size, (('route', route),))
+    return response
+
+
+@app.teardown_request
+def _finish_profile(exc):
+    from flask import g
+    profile = g.pop('profile', None)
+    if profile is not None:
+        route_profiler.finish(profile)
+
+
 # Sample staff data
 sample_staff = [
     {'id': 1, 'name': 'Dr. Sarah Johnson', 'role': 'Ophthalmologist', 'status': 'Available', 'patients_today': 8},
@@ -62,14 +182,144 @@ sample_resources = [
     {'id': 4, 'name': 'Surgical Machine', 'status': 'Busy'},
 ]
 
+# Branch (site) this instance serves. site_router.py runs one instance per
+# site, each with its own state, lock, scheduler and caches; `{site}` in
+# MEDIFLOW_DB / MEDIFLOW_ARCHIVE is replaced with the id so sites never share
+# a file.
+site_config = {'id': os.environ.get('MEDIFLOW_SITE', 'main')}
+
+
+def site_path(path):
+    return path.replace('{site}', site_config['id']) if path else path
+
+
+# Optional SQLite persistence: set MEDIFLOW_DB to a database file (e.g.
+# database.db) to keep patients, staff and resources across restarts. Reads
+# are always served from memory; changes are flushed in one batch per write.
+persistence_config = {'path': site_path(os.environ.get('MEDIFLOW_DB'))}
+
+# Patients leave memory `retention_minutes` after reaching Discharge (0 keeps
+# them). They are archived to the database when MEDIFLOW_DB is set, else to
+# the MEDIFLOW_ARCHIVE JSON-lines file when that is set, else just dropped.
+lifecycle_config = {
+    'retention_minutes': float(os.environ.get('MEDIFLOW_DISCHARGE_RETENTION_MINUTES', 240)),
+    'archive_path': site_path(os.environ.get('MEDIFLOW_ARCHIVE')),
+}
+
+
+def open_patient_db(path):
+    """Load the persisted state from `path` (seeding it from the sample data
+    when empty) and start mirroring registry changes into it."""
+    db = persistence.PatientStore(persistence.ConnectionPool(path))
+    db.ensure_schema()
+    movement_log.attach(db.pool)
+    movement_log.restore()
+    stored = db.load_patients()
+    if stored:
+        patient_registry.clear()
+        for p in stored:
+            patient_registry.add(p)
+    else:
+        db.replace_patients(patient_registry)
+    for records, load, save in ((sample_staff, db.load_staff, db.save_staff),
+                                (sample_resources, db.load_resources, db.save_resources)):
+        stored = load()
+        if stored:
+            records[:] = stored
+        else:
+            save(records)
+    db.track(patient_registry)
+    return db
+
+
+patient_db = open_patient_db(persistence_config['path']) if persistence_config['path'] else None
+# Log whatever differs from the last run (or the seed patients on a fresh start)
+movement_log.sync(patient_registry, cause='startup')
+patient_registry.add_listener(movement_log.listener)
+# Waiting-time histograms (overall, per stage and priority) kept current from
+# registry changes; the wait-time figures are read from these
+wait_stats = WaitStats(exclude=('Discharge',))
+wait_stats.sync(patient_registry)
+patient_registry.add_listener(wait_stats.listener)
+# Age-band counts of the patients in care, for the demographics chart
+age_bands = AgeBands(exclude=('Discharge',))
+age_bands.sync(patient_registry)
+patient_registry.add_listener(age_bands.listener)
+# Each patient's JSON, re-encoded only when that patient changes
+patient_json = PatientJSON(patient_registry, version=lambda: state_version['value'] + 1)
+patient_registry.add_listener(patient_json.listener)
+# Discharged patients are archived and removed once their retention runs out,
+# so a long-running process holds a bounded number of patients
+if patient_db is not None:
+    patient_archive = patient_db.archive_patients
+    # ids of archived patients are never handed out again
+    patient_registry.reserve_ids(patient_db.last_archived_id())
+elif lifecycle_config['archive_path']:
+    patient_archive = JsonlArchive(lifecycle_config['archive_path'])
+else:
+    patient_archive = None
+lifecycle = PatientLifecycle(patient_registry, retention=lifecycle_config['retention_minutes'] * 60,
+                             archive=patient_archive)
+patient_registry.add_listener(lifecycle.listener)
+
 # Sample alerts data
 sample_alerts = [
-    {'id': 1, 'type': 'warning', 'message': 'High patient wait time in Reception', 'time': '2 minutes ago'},
-    {'id': 2, 'type': 'info', 'message': 'Dr. Chen completed 12 patient consultations today', 'time': '15 minutes ago'},
-    {'id': 3, 'type': 'success', 'message': 'Pharmacy inventory restocked', 'time': '1 hour ago'},
-    {'id': 4, 'type': 'danger', 'message': 'Room 3 equipment maintenance required', 'time': '2 hours ago'},
+    {'id': 1, 'type': 'warning', 'message': 'High patient wait time in Reception', 'age_minutes': 2},
+    {'id': 2, 'type': 'info', 'message': 'Dr. Chen completed 12 patient consultations today', 'age_minutes': 15},
+    {'id': 3, 'type': 'success', 'message': 'Pharmacy inventory restocked', 'age_minutes': 60},
+    {'id': 4, 'type': 'danger', 'message': 'Room 3 equipment maintenance required', 'age_minutes': 120},
 ]
 
+# Alert thresholds used by the alert rules below
+alert_config = {
+    'long_wait_minutes': 45,
+    'stage_load': 40,
+}
+
+# Alerts are evaluated incrementally: the registry reports each changed
+# patient and only the rules for that patient and its stages are re-checked
+alert_engine = AlertEngine(alert_config)
+
+
+@alert_engine.rule('wait', entity='patient', alert_type='warning')
+def long_wait_alert(patient, patient_id, config):
+    wait = patient.get('waiting_time', 0)
+    if wait >= config['long_wait_minutes']:
+        return f'Patient {patient.get("name")} wait time very high ({wait} min)'
+    return None
+
+
+@alert_engine.rule('load', entity='stage', alert_type='danger')
+def stage_load_alert(count, stage, config):
+    if count >= config['stage_load']:
+        return f'High load in {stage}: {count} patients'
+    return None
+
+
+def _on_patient_change(patient, old_stage, removed):
+    alert_engine.evaluate('patient', patient['id'], None if removed else patient)
+    for stage in {old_stage, patient.get('stage')}:
+        if stage is not None:
+            alert_engine.evaluate('stage', stage, patient_registry.stage_count(stage))
+
+
+def rebuild_alerts(keep_existing=False):
+    """Re-evaluate every rule against the full state (startup, reset,
+    threshold changes)."""
+    if not keep_existing:
+        alert_engine.clear()
+        now = time.time()
+        for a in sorted(sample_alerts, key=lambda a: -a['age_minutes']):
+            alert_engine.add(a['id'], a['type'], a['message'], timestamp=now - a['age_minutes'] * 60)
+    alert_engine.rebuild({
+        'patient': ((p['id'], p) for p in patient_registry),
+        'stage': patient_registry.stage_counts().items(),
+    })
+
+
+patient_registry.add_listener(_on_patient_change)
+rebuild_alerts()
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -144,101 +394,437 @@ def parking():
 def satisfaction():
     return render_template('satisfaction.html')
 
+def overview_payload():
+    data = sample_data.copy()
+    # Patients currently held, so archiving discharged patients lowers it
+    data['total_patients'] = len(patient_registry)
+    data['avg_wait_time'] = round(wait_stats.mean() or 0, 1)
+    data['patient_distribution'] = patient_registry.stage_counts()
+    return data
+
+
+def distribution_payload():
+    # Per-stage counts are maintained by the registry on every move
+    distribution = patient_registry.stage_counts()
+    return {
+        'labels': list(distribution.keys()),
+        'data': list(distribution.values())
+    }
+
+
+def sample_analytics(now=None):
+    """Fold the current counts and waits into the analytics rollups. Uses
+    the registry's per-stage totals, so the cost does not grow with the
+    number of patients."""
+    totals = patient_registry.stage_wait_totals()
+    values = {
+        'patients': len(patient_registry),
+        'occupancy': sample_data['occupancy'],
+        'avg_wait': wait_stats.mean(),
+        'active_staff': sample_data['active_staff'],
+    }
+    for stage in STAGE_ORDER:
+        count, total = totals.get(stage, (0, 0))
+        values[f'count:{stage}'] = count
+        # Empty stages have no wait to report
+        values[f'wait:{stage}'] = total / count if count else None
+    analytics_store.add(time.time() if now is None else now, values)
+
+
+def wait_times_payload():
+    """Waiting-time statistics of the patients currently in care."""
+    overall = wait_stats.summary()
+    return {
+        'total_patients': overall['count'],
+        'avg_wait': overall['mean'] or 0,
+        'max_wait': overall['max'] or 0,
+        'min_wait': overall['min'] or 0,
+        'p50': overall['p50'],
+        'p90': overall['p90'],
+        'p99': overall['p99'],
+        'by_stage': {stage: wait_stats.summary(f'stage:{stage}')
+                     for stage in STAGE_ORDER if stage not in wait_stats.exclude},
+        'by_priority': {priority: wait_stats.summary(f'priority:{priority}') for priority in ('High', 'Medium', 'Low')},
+    }
+
+
+def build_read_view():
+    """Immutable copy of the dashboard read models for the current version."""
+    return {
+        'version': state_version['value'],
+        'overview': overview_payload(),
+        'distribution': distribution_payload(),
+        'wait_times': wait_times_payload(),
+        'alerts': generate_alerts(),
+    }
+
+
+@metrics.timed('publish_seconds')
+def publish_changes(moved=(), added=(), alerts=None, removed=()):
+    """Push only what changed to live clients: the touched patients (and the
+    ids of removed ones), and the distribution, alerts, overview and wait
+    times if they differ from what was last sent.
+
+    Every state mutation goes through here (under `state_lock`), so this is
+    also where the dashboard state version is bumped and a fresh read view is
+    swapped in. Readers holding the previous view keep a consistent copy."""
+    global read_view
+    if patient_db is not None:
+        patient_db.flush()
+    movement_log.flush()
+    sample_analytics()
+    state_version['value'] += 1
+    view = build_read_view()
+    if alerts is not None:
+        view['alerts'] = alerts
+    read_view = view
+
+    changed = {m['id'] for m in moved} | {p['id'] for p in added}
+    if changed or removed:
+        live_broker.publish('patients', {
+            'changed': [patient_registry.get(pid).copy() for pid in sorted(changed) if pid in patient_registry],
+            'moved': list(moved),
+            'removed': list(removed),
+        })
+
+    # any write can change these (a single move changes the waits), so they
+    # are compared rather than tied to particular callers
+    for name in ('distribution', 'alerts', 'overview', 'wait_times'):
+        if view[name] != _last_published[name]:
+            _last_published[name] = view[name]
+            live_broker.publish(name, view[name])
+
+
+@app.route('/api/stream')
+def live_stream():
+    """Server-Sent Events stream of dashboard deltas."""
+    from flask import request
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(
+        stream_with_context(live_broker.stream(last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.route('/api/dashboard-snapshot')
+def get_dashboard_snapshot():
+    """Everything the dashboard renders in one payload, with a version ETag.
+
+    Clients revalidating with a matching If-None-Match get an empty 304.
+    """
+    from flask import request
+    view = read_view
+    version = view['version']
+    etag = f'v{version}'
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    response = cached_json('dashboard-snapshot',
+                           lambda view: dict(view, staff=sample_staff, resources=sample_resources), view)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_json(name, build, view=None):
+    """JSON response with `build(view)` serialized once per state version
+    and then served from `response_cache`."""
+    view = read_view if view is None else view
+    key = f'{name}:v{view["version"]}'
+    body = response_cache.get(key)
+    if body is None:
+        body = app.json.dumps(build(view))
+        response_cache.set(key, body, ttl=cache_config['ttl'])
+    return Response(body, mimetype='application/json')
+
+
 @app.route('/api/overview')
 def get_overview():
-    # Return fixed data to match dashboard requirements
-    data = sample_data.copy()
-    return jsonify(data)
+    return cached_json('overview', lambda view: view['overview'])
 
 @app.route('/api/patient-distribution')
 def get_patient_distribution():
-    # Simulate dynamic patient distribution
-    distribution = sample_data['patient_distribution'].copy()
-    for stage in distribution:
-        variation = random.randint(-3, 3)
-        distribution[stage] = max(5, distribution[stage] + variation)
+    return cached_json('distribution', lambda view: view['distribution'])
+
+
+def rollup_payload(view):
+    """This site's figures in a form that merges across sites (see
+    site_router.py): the overview counts, alert counts by type and the wait
+    histograms of the patients in care. The histograms are read live, so
+    they may be one write ahead of the counts."""
+    alerts = {}
+    for alert in view['alerts']:
+        alerts[alert['type']] = alerts.get(alert['type'], 0) + 1
+    return {
+        'site': site_config['id'],
+        'version': view['version'],
+        'overview': view['overview'],
+        'alerts': alerts,
+        'wait': {key: histogram.to_dict() for key, histogram in list(wait_stats.current.items())},
+    }
+
+
+@app.route('/api/rollup')
+def get_rollup():
+    return cached_json('rollup', rollup_payload)
+
+
+def _response_cache_counts():
+    stats = response_cache.stats()
+    return [((('result', name),), stats[name])
+            for name in ('hits', 'misses', 'sets', 'evictions', 'expirations', 'errors') if name in stats]
+
+
+def _flow_tick_counts():
+    stats = flow_scheduler.stats()
+    return [((('outcome', name),), stats[name]) for name in ('ticks', 'overruns', 'skipped', 'errors')]
+
+
+metrics.register('patients', 'gauge', 'Patients per stage',
+                 lambda: [((('stage', stage),), count)
+                          for stage, count in read_view['overview']['patient_distribution'].items()])
+metrics.register('state_version', 'gauge', 'Dashboard state version (bumped on every write)',
+                 lambda: [((), read_view['version'])])
+metrics.register('response_cache_operations_total', 'counter', 'Response cache lookups and writes by result',
+                 _response_cache_counts)
+metrics.register('response_cache_hit_ratio', 'gauge', 'Response cache hits / lookups',
+                 lambda: [((), response_cache.stats()['hit_rate'])])
+metrics.register('flow_scheduler_ticks_total', 'counter', 'Auto-flow ticks run, overrun, skipped and failed',
+                 _flow_tick_counts)
+metrics.register('live_subscribers', 'gauge', 'Open Server-Sent Events connections',
+                 lambda: [((), live_broker.subscriber_count())])
+metrics.register('archived_patients_total', 'counter', 'Discharged patients archived and removed from memory',
+                 lambda: [((), lifecycle.stats['archived'])])
+metrics.register('discharged_retained', 'gauge', 'Discharged patients still in memory, awaiting archiving',
+                 lambda: [((), len(lifecycle))])
+
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition of the metrics above."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _admin_denied():
+    """Error response unless the request carries the admin token; without
+    MEDIFLOW_ADMIN_TOKEN the admin endpoints do not exist."""
+    from flask import request
+    token = admin_config['token']
+    if not token:
+        return jsonify({'status': 'error', 'message': 'Not found'}), 404
+    given = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        return jsonify({'status': 'error', 'message': 'Invalid admin token'}), 403
+    return None
+
+
+@app.route('/api/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """Profile one route: POST {"route": "/api/patients", "requests": 20}
+    arms cProfile for that many requests, GET returns the accumulated report
+    (`sort`, `limit`), DELETE disarms."""
+    from flask import request
+    denied = _admin_denied()
+    if denied is not None:
+        return denied
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        route = data.get('route')
+        if route not in {rule.rule for rule in app.url_map.iter_rules()}:
+            return jsonify({'status': 'error', 'message': f'Unknown route {route!r}'}), 400
+        try:
+            count = int(data.get('requests', 20))
+        except (TypeError, ValueError):
+            count = 0
+        if not 1 <= count <= 1000:
+            return jsonify({'status': 'error', 'message': 'requests must be between 1 and 1000'}), 400
+        route_profiler.arm(route, count)
+        return jsonify(dict(route_profiler.status(), status='success'))
+    if request.method == 'DELETE':
+        route_profiler.disarm()
+        return jsonify(dict(route_profiler.status(), status='success'))
+
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        return jsonify({'status': 'error', 'message': 'sort must be cumulative, tottime or calls'}), 400
+    limit = max(1, min(request.args.get('limit', 40, type=int) or 40, 500))
+    return jsonify(dict(route_profiler.status(), report=route_profiler.report(limit, sort)))
+
+
+@app.route('/api/cache-stats')
+def get_cache_stats():
+    """Hit/miss/eviction counters of the response cache."""
+    return jsonify(response_cache.stats())
+
+# Patient lists longer than this are streamed in chunks instead of being
+# assembled into one buffer
+PATIENTS_STREAM_THRESHOLD = 5000
+# Page sizes for /api/patients?limit=...
+patients_config = {'default_limit': 100, 'max_limit': 1000}
+# Query argument -> registry field for /api/patients filters
+PATIENT_FILTERS = {'stage': 'stage', 'priority': 'priority', 'status': 'status', 'doctor': 'doctor_id'}
+PAGE_ARGS = ('limit', 'cursor', 'sort', 'order', *PATIENT_FILTERS)
+
+
+def _encode_cursor(sort, key):
+    return base64.urlsafe_b64encode(json.dumps([sort, *key]).encode()).decode()
+
+
+def _decode_cursor(cursor, sort):
+    """The registry key a cursor from `_encode_cursor` points after."""
+    try:
+        cursor_sort, value, patient_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort:
+        raise ValueError('Cursor belongs to a different sort order')
+    if isinstance(patient_id, bool) or not isinstance(patient_id, int):
+        raise ValueError('Invalid cursor')
+    if sort == 'entry_time':
+        valid = isinstance(value, str)
+    else:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if not valid:
+        raise ValueError('Invalid cursor')
+    return value, patient_id
+
+
+def _page_args(args):
+    """Parse /api/patients paging arguments into `PatientRegistry.page`
+    keyword arguments. Raises ValueError for invalid values."""
+    limit = args.get('limit', patients_config['default_limit'], type=int)
+    if limit is None or not 1 <= limit <= patients_config['max_limit']:
+        raise ValueError(f'limit must be between 1 and {patients_config["max_limit"]}')
+    sort = args.get('sort', 'id')
+    if sort not in ('id', 'waiting_time', 'entry_time'):
+        raise ValueError('sort must be id, waiting_time or entry_time')
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    filters = {}
+    for name, field in PATIENT_FILTERS.items():
+        if name in args:
+            value = args.get(name, type=int) if name == 'doctor' else args[name]
+            if value is None:
+                raise ValueError('doctor must be an integer id')
+            filters[field] = value
+    after = _decode_cursor(args['cursor'], sort) if args.get('cursor') else None
+    return dict(filters, sort=sort, after=after, limit=limit, descending=order == 'desc')
 
-    return jsonify({
-        'labels': list(distribution.keys()),
-        'data': list(distribution.values())
-    })
 
 @app.route('/api/patients')
 def get_patients():
-    # Return patient data with some randomization for demo
-    # Deep-ish copy so we don't mutate the originals on each request
-    patient_list = [p.copy() for p in sample_patients]
-    for patient in patient_list:
-        # ensure the frontend fields exist and update waiting_time slightly for demo
-        if patient.get('status') == 'Waiting':
-            patient['waiting_time'] = max(0, patient.get('waiting_time', 0) + random.randint(-5, 5))
+    """Every patient; with paging arguments, one filtered and sorted page;
+    with `since=<version>`, only the patients changed after that version."""
+    from flask import request
+    args = request.args
+    # Read before the patients: anything changed meanwhile is tagged with a
+    # later version, so the client's next `since` request picks it up again
+    version = read_view['version']
+
+    if 'since' in args:
+        since = args.get('since', type=int)
+        if since is None:
+            return jsonify({'status': 'error', 'message': 'since must be a state version'}), 400
+        delta = patient_json.changes_since(since)
+        if delta is None:
+            # older than the change log: send everything for a full reload
+            body = patient_json.envelope(patient_json.fragments(), 'changed', version=version, full=True, removed=[])
         else:
-            patient['waiting_time'] = patient.get('waiting_time', 0)
-
-        # keep keys consistent: frontend expects `stage`, `priority`, `doctor_id`, `entry_time`, `waiting_time`
-        patient.setdefault('stage', patient.get('stage', 'undefined'))
-        patient.setdefault('priority', patient.get('priority', 'undefined'))
-        patient.setdefault('doctor_id', patient.get('doctor_id', 'undefined'))
-        patient.setdefault('entry_time', patient.get('entry_time', 'undefined'))
-
-    return jsonify(patient_list)
+            changed, removed = delta
+            body = patient_json.envelope(changed, 'changed', version=version, full=False, removed=removed)
+        return Response(body, mimetype='application/json')
+
+    if not any(name in args for name in PAGE_ARGS):
+        # Patients are pre-encoded by patient_json as they change. Taking the
+        # fragment list is atomic, so this needs no lock while a writer is
+        # moving patients.
+        fragments = patient_json.fragments()
+        if len(fragments) > PATIENTS_STREAM_THRESHOLD:
+            return Response(patient_json.stream(fragments), mimetype='application/json')
+        return Response(patient_json.body(fragments), mimetype='application/json')
+
+    try:
+        page_args = _page_args(args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    # Read from the live registry indexes without the lock (see
+    # PatientRegistry.read); it costs about the page size (or the smallest
+    # filtered set), not the patient count.
+    def read_page():
+        patients, last = patient_registry.page(**page_args)
+        return [patient_json.fragment(p['id']) for p in patients], last
+
+    fragments, last = patient_registry.read(read_page, state_lock)
+    next_cursor = None if last is None else _encode_cursor(page_args['sort'], last)
+    body = patient_json.envelope(fragments, version=version, next_cursor=next_cursor)
+    return Response(body, mimetype='application/json')
+
+
+def stage_room(stage):
+    """How many more patients `stage` can take under its configured capacity."""
+    capacity = auto_config['stage_capacity'].get(stage)
+    if capacity is None:
+        return len(patient_registry) + 1
+    return max(0, capacity - patient_registry.stage_count(stage))
 
 
 def advance_patients(auto_wait_threshold=30):
     """Move eligible patients to the next stage based on priority or waiting time.
+
+    High-priority patients and anyone waiting at least `auto_wait_threshold`
+    minutes are eligible; each stage releases them in (priority, longest
+    waiting) order, but only as many as the next stage has room for.
+    Stages are processed downstream first so room freed in this tick can be
+    used by the stage before it, and no patient moves more than once.
     Returns list of moved patient details.
     """
     moved = []
-    dist = sample_data.get('patient_distribution', {})
-
-    for patient in sample_patients:
-        current_stage = patient.get('stage')
-        if not current_stage or current_stage == 'Discharge':
-            continue
-
-        wait = patient.get('waiting_time', 0)
-        priority = patient.get('priority', 'Low')
-
-        if priority == 'High' or wait >= auto_wait_threshold:
-            try:
-                idx = STAGE_ORDER.index(current_stage)
-            except ValueError:
-                continue
-            if idx < len(STAGE_ORDER) - 1:
-                new_stage = STAGE_ORDER[idx + 1]
-                patient['stage'] = new_stage
-                patient['waiting_time'] = max(0, wait - random.randint(5, 15))
-
-                # adjust distribution counts
-                if current_stage in dist:
-                    dist[current_stage] = max(0, dist.get(current_stage, 1) - 1)
-                if new_stage in dist:
-                    dist[new_stage] = dist.get(new_stage, 0) + 1
-
-                moved.append({'id': patient['id'], 'from': current_stage, 'to': new_stage, 'priority': priority})
+
+    with movement_log.cause('advance'):
+        for idx in range(len(STAGE_ORDER) - 2, -1, -1):
+            current_stage = STAGE_ORDER[idx]
+            new_stage = STAGE_ORDER[idx + 1]
+            for patient in patient_registry.next_ready(current_stage, stage_room(new_stage), auto_wait_threshold):
+                wait = patient.get('waiting_time', 0)
+                patient_registry.move(patient['id'], new_stage, waiting_time=max(0, wait - random.randint(5, 15)))
+                moved.append({'id': patient['id'], 'from': current_stage, 'to': new_stage, 'priority': patient.get('priority', 'Low')})
 
     return moved
 
 
 @app.route('/api/flow-mode', methods=['GET', 'POST'])
 def flow_mode_api():
-    global flow_mode
     from flask import request
     if request.method == 'POST':
         data = request.get_json(silent=True) or {}
-        flow_mode['auto'] = bool(data.get('auto', False))
+        with state_lock:
+            flow_mode['auto'] = bool(data.get('auto', False))
+            live_broker.publish('flow_mode', {'auto': flow_mode['auto']})
+        if flow_mode['auto']:
+            flow_scheduler.ensure_started()
+        else:
+            flow_scheduler.wake()
         return jsonify({'status': 'success', 'auto': flow_mode['auto']})
     return jsonify({'auto': flow_mode['auto']})
 
 
-@app.route('/api/advance', methods=['POST'])
+@app.route('/api/advance', methods=['GET', 'POST'])
 def api_advance():
-    moved = advance_patients()
-    alerts = generate_alerts()
-    return jsonify({'status': 'success', 'moved': moved, 'alerts': alerts})
+    """Patients advanced by the latest auto-flow tick. Only the scheduler
+    moves patients, so clients polling this cannot speed up the flow."""
+    tick = last_tick
+    return jsonify({'status': 'success' if flow_mode['auto'] else 'idle', 'tick': tick['tick'], 'at': tick['at'],
+                    'moved': tick['advanced'], 'alerts': read_view['alerts']})
 
 
 @app.route('/api/move-patient', methods=['POST'])
+@writes_state
 def api_move_patient():
     """Manually move a single patient to a specified stage."""
     from flask import request
@@ -247,80 +833,49 @@ def api_move_patient():
     to_stage = data.get('to_stage')
     if patient_id is None or to_stage is None:
         return jsonify({'status': 'error', 'message': 'Missing id or to_stage'}), 400
+    if to_stage not in STAGE_ORDER:
+        return jsonify({'status': 'error', 'message': f'Unknown stage {to_stage!r}'}), 400
 
     moved = []
-    dist = sample_data.get('patient_distribution', {})
-    for p in sample_patients:
-        if p.get('id') == int(patient_id):
-            from_stage = p.get('stage')
-            if from_stage == to_stage:
-                return jsonify({'status': 'success', 'moved': []})
-            p['stage'] = to_stage
-            # reduce waiting time slightly when moved manually
-            p['waiting_time'] = max(0, p.get('waiting_time', 0) - 5)
-
-            # adjust distribution counts
-            if from_stage in dist:
-                dist[from_stage] = max(0, dist.get(from_stage, 1) - 1)
-            dist[to_stage] = dist.get(to_stage, 0) + 1
-
-            moved.append({'id': p['id'], 'from': from_stage, 'to': to_stage, 'priority': p.get('priority')})
-            break
+    try:
+        p = patient_registry.get(int(patient_id))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Invalid id'}), 400
+    if p is not None:
+        from_stage = p.get('stage')
+        if from_stage == to_stage:
+            return jsonify({'status': 'success', 'moved': []})
+        # reduce waiting time slightly when moved manually
+        with movement_log.cause('manual'):
+            patient_registry.move(p['id'], to_stage, waiting_time=max(0, p.get('waiting_time', 0) - 5))
+        moved.append({'id': p['id'], 'from': from_stage, 'to': to_stage, 'priority': p.get('priority')})
 
     alerts = generate_alerts()
+    publish_changes(moved=moved, alerts=alerts)
     return jsonify({'status': 'success', 'moved': moved, 'alerts': alerts})
 
 
 def auto_balance():
     """When auto flow mode is enabled, detect crowded stages and move some patients
-    to less-busy stages to balance load. Returns list of moved patients.
-    Uses `auto_config` for parameters."""
-    dist = sample_data.get('patient_distribution', {})
-    if not dist:
-        return []
-
+    forward to the next stage to balance load. Returns list of moved patients.
+    Uses `auto_config` for parameters; the moves come from balancer.plan_moves,
+    which relieves as much overflow as stage order and capacity allow with
+    the fewest moves and never pushes a receiving stage over the threshold."""
     crowd_threshold = int(auto_config.get('crowd_threshold', 40))
     max_moves_per_stage = int(auto_config.get('max_moves_per_stage', 3))
 
-    moved = []
+    plan = balancer.plan_moves(patient_registry.stage_counts(), STAGE_ORDER, crowd_threshold,
+                               max_moves_per_stage, auto_config.get('stage_capacity'))
 
-    # find least busy stages (candidates to receive patients)
-    sorted_stages = sorted(dist.items(), key=lambda kv: kv[1])
-    least_busy = [s for s, _ in sorted_stages[:3]] if sorted_stages else []
-
-    for stage, count in list(dist.items()):
-        if count >= crowd_threshold:
-            # number to move
-            to_move = min(max_moves_per_stage, count - crowd_threshold + 1)
-            # select candidates from patients in this stage by waiting_time desc
-            candidates = [p for p in sample_patients if p.get('stage') == stage]
-            candidates.sort(key=lambda x: x.get('waiting_time', 0), reverse=True)
-            for i in range(min(to_move, len(candidates))):
-                patient = candidates[i]
-                # choose a target stage (least busy) that's not the same
-                target = None
-                for t in least_busy:
-                    if t != stage:
-                        target = t
-                        break
-                if not target:
-                    # fallback: move to next logical stage if exists
-                    try:
-                        idx = STAGE_ORDER.index(stage)
-                        if idx < len(STAGE_ORDER) - 1:
-                            target = STAGE_ORDER[idx + 1]
-                    except ValueError:
-                        target = None
-                if not target:
-                    continue
-
-                # perform move
-                from_stage = patient.get('stage')
-                patient['stage'] = target
-                patient['waiting_time'] = max(0, patient.get('waiting_time', 0) - random.randint(5, 15))
-                if from_stage in dist:
-                    dist[from_stage] = max(0, dist.get(from_stage, 1) - 1)
-                dist[target] = dist.get(target, 0) + 1
+    moved = []
+    # plan is ordered downstream first, so patients moved into a stage are
+    # never picked again as that stage's longest-waiting
+    with movement_log.cause('balance'):
+        for from_stage, target, count in plan:
+            for patient in patient_registry.longest_waiting(from_stage, count):
+                patient_registry.move(
+                    patient['id'], target,
+                    waiting_time=max(0, patient.get('waiting_time', 0) - random.randint(5, 15)))
                 moved.append({'id': patient['id'], 'from': from_stage, 'to': target, 'priority': patient.get('priority')})
 
     return moved
@@ -328,180 +883,454 @@ def auto_balance():
 
 @app.route('/api/check-balance')
 def api_check_balance():
-    # Only run balancing when auto flow is enabled
+    """Patients moved by the balancing step of the latest auto-flow tick."""
     if not flow_mode.get('auto', False):
         return jsonify({'status': 'idle', 'moved': []})
+    tick = last_tick
+    return jsonify({'status': 'success', 'tick': tick['tick'], 'at': tick['at'],
+                    'moved': tick['balanced'], 'alerts': read_view['alerts']})
 
-    moved = auto_balance()
-    alerts = generate_alerts()
-    return jsonify({'status': 'success', 'moved': moved, 'alerts': alerts})
+
+# Result of the latest auto-flow tick, replaced whole by each tick
+last_tick = {'tick': 0, 'at': None, 'advanced': [], 'balanced': []}
+
+
+def archive_discharged():
+    """Archive and remove the patients discharged longer than the retention
+    window (caller holds state_lock). Returns their ids."""
+    with movement_log.cause('archive'):
+        return [p['id'] for p in lifecycle.sweep()]
+
+
+@metrics.timed('flow_tick_seconds')
+def flow_tick():
+    """One auto-flow step: advance eligible patients, relieve crowded
+    stages, then archive long-discharged patients. Run by `flow_scheduler`,
+    the only driver of the auto flow."""
+    global last_tick
+    with state_lock:
+        if not flow_mode['auto']:
+            return
+        advanced = advance_patients()
+        balanced = auto_balance()
+        archived = archive_discharged()
+        if advanced or balanced or archived:
+            publish_changes(moved=advanced + balanced, removed=archived, alerts=generate_alerts())
+        last_tick = {'tick': last_tick['tick'] + 1, 'at': time.time(), 'advanced': advanced, 'balanced': balanced}
+
+
+# Drives the auto flow every auto_config['tick_seconds'] while it is on; the
+# thread starts the first time auto mode is switched on
+flow_scheduler = TickScheduler(flow_tick, interval=lambda: auto_config['tick_seconds'],
+                               enabled=lambda: flow_mode['auto'], name=f'flow-scheduler:{site_config["id"]}')
+
+
+@app.route('/api/flow-scheduler')
+def get_flow_scheduler():
+    """Auto-flow tick counts, overruns and tick duration/lateness metrics."""
+    tick = last_tick
+    return jsonify(dict(flow_scheduler.stats(), last_tick=tick['tick'],
+                        last_moved=len(tick['advanced']) + len(tick['balanced'])))
 
 
 @app.route('/api/auto-config', methods=['GET', 'POST'])
 def api_auto_config():
     """Get or update auto-balance configuration."""
     from flask import request
-    global auto_config
     if request.method == 'POST':
         data = request.get_json(silent=True) or {}
-        try:
-            if 'crowd_threshold' in data:
-                val = int(data.get('crowd_threshold'))
-                auto_config['crowd_threshold'] = max(1, val)
-            if 'max_moves_per_stage' in data:
-                val = int(data.get('max_moves_per_stage'))
-                auto_config['max_moves_per_stage'] = max(1, val)
-        except (TypeError, ValueError):
-            return jsonify({'status': 'error', 'message': 'Invalid config values'}), 400
-        return jsonify({'status': 'success', 'config': auto_config})
+        with state_lock:
+            response = _update_auto_config(data)
+        # a new tick_seconds applies from now, not after the current wait
+        flow_scheduler.wake()
+        return response
 
     return jsonify(auto_config)
 
 
+def _update_auto_config(data):
+    """Apply a POSTed auto-config update (caller holds state_lock)."""
+    try:
+        if 'crowd_threshold' in data:
+            val = int(data.get('crowd_threshold'))
+            auto_config['crowd_threshold'] = max(1, val)
+        if 'max_moves_per_stage' in data:
+            val = int(data.get('max_moves_per_stage'))
+            auto_config['max_moves_per_stage'] = max(1, val)
+        if 'tick_seconds' in data:
+            val = float(data.get('tick_seconds'))
+            auto_config['tick_seconds'] = min(3600.0, max(1.0, val))
+        if 'stage_capacity' in data:
+            capacities = dict(auto_config['stage_capacity'])
+            for stage, val in data['stage_capacity'].items():
+                if stage not in STAGE_ORDER:
+                    raise ValueError(stage)
+                capacities[stage] = None if val is None else max(1, int(val))
+            auto_config['stage_capacity'] = capacities
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({'status': 'error', 'message': 'Invalid config values'}), 400
+    live_broker.publish('auto_config', auto_config)
+    return jsonify({'status': 'success', 'config': auto_config})
+
+
+@metrics.timed('generate_alerts_seconds')
 def generate_alerts():
-    alerts = []
-    for p in sample_patients:
-        if p.get('waiting_time', 0) >= 45:
-            alerts.append({'id': f'wait-{p["id"]}', 'type': 'warning', 'message': f'Patient {p["name"]} wait time very high ({p.get("waiting_time")} min)', 'time': 'just now'})
+    """Newest 10 active alerts. Alerts are maintained incrementally by
+    `alert_engine`, so this does not rescan patients or stages."""
+    return alert_engine.top(10)
+
+
+# Read models served to readers without locking; replaced wholesale by
+# publish_changes after every write
+read_view = build_read_view()
+sample_analytics()
 
-    dist = sample_data.get('patient_distribution', {})
-    for stage, count in dist.items():
-        if count >= 40:
-            alerts.append({'id': f'load-{stage}', 'type': 'danger', 'message': f'High load in {stage}: {count} patients', 'time': 'just now'})
 
-    merged = sample_alerts.copy()
-    existing_msgs = {a['message'] for a in merged}
-    for a in alerts:
-        if a['message'] not in existing_msgs:
-            merged.insert(0, a)
+@app.route('/api/alert-config', methods=['GET', 'POST'])
+def api_alert_config():
+    """Get or update alert thresholds."""
+    from flask import request
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            values = {key: max(1, int(data[key])) for key in ('long_wait_minutes', 'stage_load') if key in data}
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Invalid config values'}), 400
+        with state_lock:
+            alert_config.update(values)
+            rebuild_alerts(keep_existing=True)
+            publish_changes()
+        return jsonify({'status': 'success', 'config': alert_config})
 
-    return merged[:10]
+    return jsonify(alert_config)
 
 
 @app.route('/api/staff')
 def get_staff():
     # Return staff data
-    return jsonify(sample_staff)
+    return cached_json('staff', lambda view: sample_staff)
 
 
 @app.route('/api/doctors')
 def get_doctors():
     # Alias to staff endpoint used by frontend
-    return jsonify(sample_staff)
+    return cached_json('staff', lambda view: sample_staff)
 
 
 @app.route('/api/resources')
 def get_resources():
     # Return resources used by the resources page
-    return jsonify(sample_resources)
+    return cached_json('resources', lambda view: sample_resources)
 
 @app.route('/api/alerts')
 def get_alerts():
     # Return generated alerts based on current state
-    return jsonify(generate_alerts())
+    return jsonify(read_view['alerts'])
 
 @app.route('/api/wait-times')
 def get_wait_times():
-    # Simulate wait time analysis
-    wait_data = sample_data['wait_times'].copy()
-    wait_data['total_patients'] = random.randint(120, 180)
-    wait_data['avg_wait'] = round(random.uniform(15, 35), 1)
-    wait_data['max_wait'] = random.randint(35, 60)
-    wait_data['min_wait'] = random.randint(2, 10)
+    """Current waiting times, or with `window=<minutes>` the stage waits
+    completed in that window."""
+    from flask import request
+    if 'window' not in request.args:
+        return jsonify(read_view['wait_times'])
+    minutes = request.args.get('window', type=int)
+    longest = wait_stats.span // 60
+    if minutes is None or not 1 <= minutes <= longest:
+        return jsonify({'status': 'error', 'message': f'window must be between 1 and {longest} minutes'}), 400
+    return jsonify({
+        'window_minutes': minutes,
+        'overall': wait_stats.recent('all', minutes),
+        'by_stage': {stage: wait_stats.recent(f'stage:{stage}', minutes) for stage in wait_stats.keys('stage')},
+        'by_priority': {p: wait_stats.recent(f'priority:{p}', minutes) for p in wait_stats.keys('priority')},
+    })
+
+# Targets the analytics KPIs are scored against
+analytics_config = {
+    'patients_per_staff': 10,
+    'max_days': 730,
+}
+
+# strftime format for chart labels at each rollup resolution
+_ANALYTICS_LABELS = {'minute': '%H:%M', 'hour': '%m-%d %H:00', 'day': '%Y-%m-%d'}
+
+
+def _rounded(values, digits=1):
+    return [None if v is None else round(v, digits) for v in values]
+
+
+@app.route('/api/analytics')
+def get_analytics():
+    """KPIs and chart series for the analytics page.
+
+    Trends (`days`, default 30) come from the pre-aggregated rollups in
+    `analytics_store`; the current-state charts from the wait and age
+    aggregates kept up to date from the registry.
+    """
+    from flask import request
+    days = request.args.get('days', 30, type=int)
+    if days is None or not 1 <= days <= analytics_config['max_days']:
+        return jsonify({'status': 'error',
+                        'message': f'days must be between 1 and {analytics_config["max_days"]}'}), 400
+    end = time.time()
+    start = end - days * 86400
+
+    level, times, flow = analytics_store.query('patients', start, end)
+    # Skip the part of the range before the first sample
+    first = next((i for i, v in enumerate(flow) if v is not None), len(flow))
+    label_format = _ANALYTICS_LABELS[level.name]
+
+    stages = [stage for stage in STAGE_ORDER if stage != 'Discharge']
+    long_wait = alert_config['long_wait_minutes']
+    performance = []
+    for stage in stages:
+        wait = analytics_store.aggregate(f'wait:{stage}', start, end)
+        performance.append(None if wait is None else round(100 * max(0.0, 1 - wait / long_wait)))
+
+    # Waits of the patients in care, from the maintained histogram
+    waits = wait_stats.current.get('all') or WaitHistogram()
+    under_15, under_30 = waits.count_below(15), waits.count_below(30)
+
+    avg_wait = analytics_store.aggregate('avg_wait', start, end)
+    occupancy = analytics_store.aggregate('occupancy', start, end)
+    patients = analytics_store.aggregate('patients', start, end)
+    staff = analytics_store.aggregate('active_staff', start, end)
+    # Patient load per active staff member relative to the target ratio
+    efficiency = (100 * min(1.0, patients / staff / analytics_config['patients_per_staff'])
+                  if patients and staff else 0)
+
+    return jsonify({
+        'kpis': {
+            # Share of patients in care who are under the long-wait threshold
+            'satisfaction_score': round(100 * waits.count_below(long_wait) / len(waits)) if waits else 100,
+            'avg_wait_time': round(avg_wait or 0, 1),
+            'resource_utilization': round(occupancy or 0),
+            'cost_efficiency': round(efficiency),
+        },
+        'charts': {
+            'patient_flow': {
+                'labels': [time.strftime(label_format, time.localtime(t)) for t in times[first:]],
+                'data': _rounded(flow[first:]),
+            },
+            'department_performance': {'labels': stages, 'data': performance},
+            'waiting_time': {
+                'labels': ['< 15 min', '15-30 min', '30+ min'],
+                'data': [under_15, under_30 - under_15, len(waits) - under_30],
+            },
+            # No scanner bookings are tracked by the live dashboard
+            'resource_usage': {'labels': [], 'mri': [], 'ct': [], 'xray': [],
+                               'note': 'Scanner usage is not tracked'},
+            'demographics': {'labels': age_bands.labels(), 'data': list(age_bands.counts)},
+            # No billing data is tracked by the live dashboard
+            'revenue': {'labels': [], 'data': [], 'note': 'Billing data is not tracked'},
+        },
+        'range': {'days': days, 'resolution': level.name, 'points': len(times) - first},
+    })
+
+
+def _history_window():
+    """Parse `minutes` and `step` (minutes) query args into (start, end,
+    step seconds), clamped to the history the movement log holds."""
+    from flask import request
+    minutes = request.args.get('minutes', 60, type=int)
+    step = request.args.get('step', 5, type=int)
+    if minutes is None or step is None or minutes < 1 or step < 1 or minutes // step > 1000:
+        raise ValueError('minutes and step must be positive, with at most 1000 points')
+    end = time.time()
+    start = end - minutes * 60
+    if movement_log.history_start is not None:
+        start = max(start, movement_log.history_start)
+    return start, end, step * 60
+
+
+def _time_labels(times):
+    return [time.strftime('%H:%M', time.localtime(t)) for t in times]
+
+
+@app.route('/api/history/distribution')
+def get_distribution_history():
+    """Patients per stage over time, replayed from the movement log."""
+    try:
+        start, end, step = _history_window()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    times, series = movement_log.counts_over_time(start, end, step)
+    stages = STAGE_ORDER + sorted(s for s in series if s not in STAGE_ORDER)
+    return jsonify({
+        'labels': _time_labels(times),
+        'series': {stage: series.get(stage, [0] * len(times)) for stage in stages},
+    })
+
+
+@app.route('/api/history/flow')
+def get_flow_history():
+    """Arrivals, moves into each stage and moves by cause per time bucket."""
+    try:
+        start, end, step = _history_window()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    buckets, series = movement_log.flow(start, end, step)
+    return jsonify({'labels': _time_labels(buckets), 'series': series})
+
+
+@app.route('/api/history/events')
+def get_movement_events():
+    """Raw movement events after sequence number `since` (at most `limit`)."""
+    from flask import request
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 500, type=int) or 500, 5000)
+    events = movement_log.events(since_seq=since or 0, limit=limit)
+    return jsonify({'events': events, 'last_seq': movement_log.last_seq})
+
+
+def _valid_seed(seed):
+    # random.Random takes other types too, but hashes or rejects them
+    return seed is None or isinstance(seed, (int, str)) and not isinstance(seed, bool)
+
+
+def run_flow_simulation(config=None, seed=None):
+    """Run the discrete-event simulator against the current staff and rooms."""
+    return flow_sim.run_simulation(config, seed=seed, staff=sample_staff,
+                                   resources=sample_resources, stages=STAGE_ORDER)
+
+
+@app.route('/api/simulation/run', methods=['POST'])
+def api_run_simulation():
+    """Run a full discrete-event simulation for capacity planning.
+
+    Body: optional `seed` plus any of the `flow_sim.DEFAULT_CONFIG` keys.
+    Does not touch live state.
+    """
+    from flask import request
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Body must be a JSON object'}), 400
+    seed = data.pop('seed', None)
+    unknown = set(data) - set(flow_sim.DEFAULT_CONFIG)
+    if unknown:
+        return jsonify({'status': 'error', 'message': f'Unknown config keys: {sorted(unknown)}'}), 400
+    if not _valid_seed(seed):
+        return jsonify({'status': 'error', 'message': 'seed must be an integer or a string'}), 400
+    try:
+        flow_sim.check_limits(data)
+        result = run_flow_simulation(data, seed=seed)
+    except (TypeError, ValueError, KeyError, AttributeError) as e:
+        return jsonify({'status': 'error', 'message': f'Invalid simulation config: {e}'}), 400
+    return jsonify({'status': 'success', 'result': result})
+
+
+@app.route('/api/scenarios/sweep', methods=['POST'])
+def api_scenario_sweep():
+    """Run a what-if sweep and stream one JSON line per configuration.
+
+    Body: `grid` (see scenarios.py), optional `replications`, `seed`,
+    `workers`. Results arrive in completion order as newline-delimited JSON.
+    """
+    from flask import request
+    data = request.get_json(silent=True) or {}
+    grid = data.get('grid')
+    if not isinstance(grid, dict) or not grid:
+        return jsonify({'status': 'error', 'message': 'Missing grid'}), 400
+    try:
+        replications = int(data.get('replications', 5))
+        seed = int(data.get('seed', 0))
+        workers = data.get('workers')
+        workers = int(workers) if workers is not None else None
+        configs = scenarios.expand_grid(grid)
+        n_configs = len(configs)
+        if n_configs <= scenarios.MAX_CONFIGS:
+            for settings in configs:
+                flow_sim.check_limits(scenarios.sim_config(settings))
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({'status': 'error', 'message': f'Invalid sweep: {e}'}), 400
+    if n_configs > scenarios.MAX_CONFIGS or replications < 1:
+        return jsonify({'status': 'error', 'message': 'Sweep too large or no replications'}), 400
+
+    def generate():
+        for result in scenarios.sweep(grid, replications, seed, workers, sample_staff, sample_resources):
+            yield app.json.dumps(result) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
 
-    return jsonify(wait_data)
 
 @app.route('/api/simulate', methods=['POST'])
+@writes_state
 def simulate():
-    # Trigger comprehensive simulation - update all data fields
-    global sample_data
-    global sample_patients
-
-    # Simulate patient flow changes
-    sample_data['total_patients'] += random.randint(-5, 10)
-    sample_data['total_patients'] = max(50, sample_data['total_patients'])  # Keep minimum
-
-    sample_data['avg_wait_time'] = round(random.uniform(15, 40), 1)
-    sample_data['active_staff'] = max(5, min(20, sample_data['active_staff'] + random.randint(-1, 2)))
-    sample_data['occupancy'] = max(40, min(95, sample_data['occupancy'] + random.randint(-5, 8)))
-
-    # Update patient distribution dynamically
-    distribution = sample_data['patient_distribution']
-    total_dist = sum(distribution.values())
-
-    # Redistribute patients across departments with some randomness
-    for stage in distribution:
-        change = random.randint(-5, 8)
-        distribution[stage] = max(5, distribution[stage] + change)
-
-    # Normalize to maintain total
-    current_total = sum(distribution.values())
-    if current_total > 0:
-        factor = total_dist / current_total
-        for stage in distribution:
-            distribution[stage] = max(1, int(distribution[stage] * factor))
-
-    # Add random new arrivals to simulate incoming patients
-    new_arrivals = random.randint(1, 5)
-    max_id = max([p['id'] for p in sample_patients]) if sample_patients else 0
-    for i in range(new_arrivals):
-        max_id += 1
+    # Trigger comprehensive simulation - advance the clinic by one simulated
+    # tick, starting from the patients currently queued at each stage
+    from flask import request
+
+    data = request.get_json(silent=True) or {}
+    seed = data.get('seed') if isinstance(data, dict) else None
+    if not _valid_seed(seed):
+        return jsonify({'status': 'error', 'message': 'seed must be an integer or a string'}), 400
+    rng = random.Random(seed)
+    queued = {stage: count for stage, count in patient_registry.stage_counts().items() if stage != 'Discharge'}
+    result = run_flow_simulation({
+        'duration': SIMULATION_TICK_MINUTES,
+        'drain': False,
+        'initial_queues': queued,
+    }, seed=seed)
+
+    sample_data['active_staff'] = max(5, min(20, sample_data['active_staff'] + rng.randint(-1, 2)))
+    utilization = [s['utilization'] for s in result['stages'].values()]
+    sample_data['occupancy'] = round(100 * sum(utilization) / len(utilization))
+
+    # New arrivals are the simulated Poisson arrivals for this tick
+    added = []
+    for i in range(result['arrivals']):
+        max_id = patient_registry.next_id()
         # Put new arrivals in Reception or Screening
-        start_stage = random.choice(['Reception', 'Screening'])
+        start_stage = rng.choice(['Reception', 'Screening'])
         new_patient = {
             'id': max_id,
             'name': f'Patient {max_id}',
-            'age': random.randint(1, 90),
+            'age': rng.randint(1, 90),
             'condition': 'General',
             'status': 'Waiting',
             'stage': start_stage,
-            'priority': random.choices(['Low', 'Medium', 'High'], weights=[60,30,10])[0],
+            'priority': rng.choices(['Low', 'Medium', 'High'], weights=[60,30,10])[0],
             'doctor_id': None,
             'entry_time': 'now',
-            'waiting_time': random.randint(0, 10)
+            'waiting_time': rng.randint(0, 10)
         }
-        sample_patients.append(new_patient)
-        # update distribution counts
-        if start_stage in distribution:
-            distribution[start_stage] = distribution.get(start_stage, 0) + 1
-        else:
-            distribution[start_stage] = 1
-
-    # Update total patients count
-    sample_data['total_patients'] = len(sample_patients)
+        with movement_log.cause('arrival'):
+            patient_registry.add(new_patient)
+        added.append(new_patient)
 
-    # Update wait times data
-    wait_times = sample_data['wait_times']
-    wait_times['total_patients'] = sample_data['total_patients']
-    wait_times['avg_wait'] = sample_data['avg_wait_time']
-    wait_times['max_wait'] = random.randint(int(wait_times['avg_wait'] * 1.5), int(wait_times['avg_wait'] * 2.5))
-    wait_times['min_wait'] = random.randint(1, int(wait_times['avg_wait'] * 0.3))
+    archived = archive_discharged()
 
+    publish_changes(added=added, removed=archived)
     return jsonify({'status': 'success', 'message': 'Hospital activity simulation completed'})
 
 @app.route('/api/reset', methods=['POST'])
+@writes_state
 def reset():
-    # Reset data to initial state
-    global sample_data
-    sample_data = {
-        'total_patients': 145,
-        'avg_wait_time': 23.5,
+    # Reset data to initial state, in place so every module holding a
+    # reference to sample_data sees the reset values
+    sample_data.clear()
+    sample_data.update({
         'active_staff': 12,
         'occupancy': 78,
-        'patient_distribution': {
-            'Screening': 25,
-            'Imaging': 18,
-            'Reception': 32,
-            'Pharmacy': 15
-        },
-        'wait_times': {
-            'total_patients': 145,
-            'avg_wait': 23.5,
-            'max_wait': 45,
-            'min_wait': 5
-        }
-    }
-
+    })
+    with movement_log.cause('reset'):
+        # clear() does not notify listeners, so log everyone leaving first
+        movement_log.sync(())
+        patient_registry.clear()
+        wait_stats.clear()
+        age_bands.clear()
+        patient_json.sync(())
+        lifecycle.sync(())
+        for p in sample_patients:
+            patient_registry.add(p.copy())
+    if patient_db is not None:
+        patient_db.replace_patients(patient_registry)
+    rebuild_alerts()
+
+    # Clients reload everything after a reset rather than applying deltas
+    live_broker.publish('resync', {})
+    publish_changes()
     return jsonify({'status': 'success', 'message': 'Data reset to initial state'})
 
 if __name__ == '__main__':
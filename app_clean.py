@@ -5,24 +5,26 @@ import json
 import random
 import time
 import threading
-import numpy as np
-import pandas as pd
-import requests
 from datetime import datetime, timedelta
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-import redis
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 from dotenv import load_dotenv
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-import openpyxl
 from io import BytesIO
+import cache
+from lazy_imports import lazy_import
+from persistence import ConnectionPool
+import migrations
+
+# Heavy subsystems are imported on first use, not at worker start (see
+# benchmarks/check_startup.py): numeric code, HTTP client, report export
+np = lazy_import('numpy')
+requests = lazy_import('requests')
+openpyxl = lazy_import('openpyxl')
+colors = lazy_import('reportlab.lib.colors')
+pagesizes = lazy_import('reportlab.lib.pagesizes')
+platypus = lazy_import('reportlab.platypus')
+styles = lazy_import('reportlab.lib.styles')
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -36,12 +38,34 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Redis setup for caching
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
-# ML Model for predictions
-ml_model = None
-scaler = None
+# Cache: Redis at REDIS_URL when it answers, otherwise in-process. Connected
+# on first use so a missing server costs nothing at startup.
+cache_config = {'url': os.environ.get('REDIS_URL', 'redis://localhost:6379/0')}
+_cache = {'client': None}
+_cache_lock = threading.Lock()
+
+def get_cache():
+    with _cache_lock:
+        if _cache['client'] is None:
+            _cache['client'] = cache.connect(cache_config['url'])
+        return _cache['client']
+
+# ML model for wait predictions: pickled to disk, loaded on first use and
+# retrained by a background worker (see wait_model.py). Created on first use
+# so NumPy and scikit-learn stay unloaded until predictions are needed.
+_ml = {'model': None, 'worker': None}
+_ml_lock = threading.Lock()
+
+def get_wait_model():
+    """(WaitModel, RetrainWorker), created on first call"""
+    with _ml_lock:
+        if _ml['model'] is None:
+            from wait_model import RetrainWorker, WaitModel
+            model = WaitModel(os.environ.get('WAIT_MODEL_PATH', 'wait_model.pkl'))
+            _ml['worker'] = RetrainWorker(model, get_db,
+                                          interval=int(os.environ.get('WAIT_MODEL_RETRAIN_SECONDS', 3600)))
+            _ml['model'] = model
+        return _ml['model'], _ml['worker']
 
 # User class for Flask-Login
 class User(UserMixin):
@@ -65,146 +89,47 @@ def load_user(user_id):
     return None
 
 def train_ml_model():
-    """Train ML model for patient flow prediction"""
-    global ml_model, scaler
-
-    try:
-        conn = get_db()
-        cursor = conn.cursor()
-
-        # Get historical data
-        cursor.execute('''
-            SELECT
-                strftime('%H', datetime(created_at, 'unixepoch')) as hour,
-                strftime('%w', datetime(created_at, 'unixepoch')) as day_of_week,
-                COUNT(*) as patient_count,
-                AVG((entry_time - created_at) / 60) as avg_waiting_time
-            FROM patients
-            GROUP BY strftime('%Y-%m-%d %H', datetime(created_at, 'unixepoch'))
-            ORDER BY created_at DESC
-            LIMIT 1000
-        ''')
-
-        data = cursor.fetchall()
-        conn.close()
-
-        if len(data) < 10:
-            return  # Not enough data for training
-
-        df = pd.DataFrame(data, columns=['hour', 'day_of_week', 'patient_count', 'avg_waiting_time'])
-        df = df.fillna(0)
-
-        X = df[['hour', 'day_of_week', 'patient_count']].astype(float)
-        y = df['avg_waiting_time'].astype(float)
-
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
+    """Queue a retrain of the patient flow model in the background worker"""
+    _, worker = get_wait_model()
+    with _ml_lock:
+        if not worker.is_alive():
+            worker.start()
+    worker.request()
 
-        ml_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        ml_model.fit(X_train_scaled, y_train)
+# Database setup: one WAL-mode connection per thread, reused across requests.
+# conn.close() on a pooled connection only rolls back uncommitted work.
+db_pool = ConnectionPool('database.db')
 
-        print("ML model trained successfully")
+def get_db():
+    return db_pool.connection()
+
+@app.route('/api/predict-wait')
+def predict_wait():
+    """Predicted wait in minutes for every patient not yet discharged,
+    scored in one batch"""
+    from wait_model import waiting_patients
+    wait_model, _ = get_wait_model()
+    bundle = wait_model.get()
+    if bundle is None:
+        train_ml_model()
+        return jsonify({'status': 'error', 'message': 'Wait model is still being trained'}), 503
 
-    except Exception as e:
-        print(f"ML training error: {e}")
+    conn = get_db()
+    patient_ids, features = waiting_patients(conn)
+    conn.close()
 
-# Database setup
-def get_db():
-    conn = sqlite3.connect('database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    predicted = wait_model.predict(features, bundle)
+    return jsonify({
+        'status': 'success',
+        'model': {'trained_at': bundle['trained_at'], 'rows': bundle['rows']},
+        'predictions': [{'patient_id': pid, 'predicted_wait': wait}
+                        for pid, wait in zip(patient_ids.tolist(), np.round(predicted, 1).tolist())],
+    })
 
 def init_db():
+    # Tables, columns and indexes are versioned in migrations.py
     conn = get_db()
-    cursor = conn.cursor()
-
-    # Users table for authentication
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username TEXT UNIQUE,
-            email TEXT UNIQUE,
-            password_hash TEXT,
-            role TEXT,
-            full_name TEXT,
-            department TEXT,
-            created_at REAL,
-            is_active BOOLEAN DEFAULT 1
-        )
-    ''')
-
-    # Patients table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS patients (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            stage TEXT,
-            entry_time REAL,
-            doctor_id INTEGER,
-            resource_id INTEGER,
-            created_at REAL,
-            priority TEXT,
-            medical_history TEXT,
-            phone TEXT,
-            address TEXT,
-            emergency_contact TEXT
-        )
-    ''')
-
-    # Doctors table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS doctors (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            status TEXT,
-            specialization TEXT,
-            user_id INTEGER,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Resources table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS resources (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            status TEXT,
-            type TEXT
-        )
-    ''')
-
-    # Appointments table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY,
-            patient_id INTEGER,
-            doctor_id INTEGER,
-            appointment_date TEXT,
-            appointment_time TEXT,
-            status TEXT,
-            notes TEXT,
-            created_at REAL,
-            FOREIGN KEY (patient_id) REFERENCES patients (id),
-            FOREIGN KEY (doctor_id) REFERENCES doctors (id)
-        )
-    ''')
-
-    # Notifications table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notifications (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER,
-            message TEXT,
-            type TEXT,
-            is_read BOOLEAN DEFAULT 0,
-            created_at REAL,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    conn.commit()
+    migrations.migrate(conn)
     conn.close()
 
 def generate_simulated_data():
@@ -0,0 +1,129 @@
+"""Load-balancing planner for auto_balance.
+
+The stages form a chain (`STAGE_ORDER`) and a patient may only be moved one
+stage forward. A stage at or above the crowd threshold wants to shed
+`count - threshold + 1` patients (at most `max_moves_per_stage`); a stage
+can absorb patients until it reaches `threshold - 1` or its configured
+capacity, whichever is lower.
+
+Relief can travel further than one stage by chain pushes: stage i sends a
+patient to i+1, which sends one of its own patients on to i+2, and so on.
+That is a min-cost max-flow problem on a path graph:
+
+    source -> stage i          capacity = overflow of i            cost 0
+    stage i -> stage i+1       capacity = patients i may send on   cost 1
+    stage j -> sink            capacity = spare room in j          cost 0
+
+The max flow is the most overflow that can be relieved; the minimum cost is
+the fewest individual patient moves that achieve it. Since receivers never
+fill past `threshold - 1`, balancing cannot create a new hotspot.
+"""
+
+INF = float('inf')
+
+
+class _Graph:
+    def __init__(self, n):
+        self.adj = [[] for _ in range(n)]
+        # edge: [to, capacity, cost, index of reverse edge]
+
+    def add_edge(self, u, v, cap, cost):
+        if cap <= 0:
+            return None
+        self.adj[u].append([v, cap, cost, len(self.adj[v])])
+        self.adj[v].append([u, 0, -cost, len(self.adj[u]) - 1])
+        return self.adj[u][-1]
+
+    def min_cost_flow(self, s, t):
+        """Successive shortest paths with Bellman-Ford (costs may be negative
+        in the residual graph). Returns (flow, cost)."""
+        n = len(self.adj)
+        adj = self.adj
+        flow = cost = 0
+        while True:
+            dist = [INF] * n
+            prev = [None] * n
+            dist[s] = 0
+            changed = True
+            while changed:
+                changed = False
+                for u in range(n):
+                    du = dist[u]
+                    if du == INF:
+                        continue
+                    for i, (v, cap, c, _) in enumerate(adj[u]):
+                        if cap > 0 and du + c < dist[v]:
+                            dist[v] = du + c
+                            prev[v] = (u, i)
+                            changed = True
+            if dist[t] == INF:
+                return flow, cost
+
+            push = INF
+            v = t
+            while v != s:
+                u, i = prev[v]
+                push = min(push, adj[u][i][1])
+                v = u
+            v = t
+            while v != s:
+                u, i = prev[v]
+                edge = adj[u][i]
+                edge[1] -= push
+                adj[v][edge[3]][1] += push
+                v = u
+            flow += push
+            cost += push * dist[t]
+
+
+def plan_moves(counts, stages, crowd_threshold, max_moves_per_stage, capacities=None):
+    """Plan the moves that relieve crowded stages.
+
+    `counts` is {stage: patients}; `capacities` is {stage: max patients or
+    None}. Returns a list of (from_stage, to_stage, n) for adjacent stages,
+    ordered downstream first so that the caller can apply them without
+    moving the same patient twice.
+    """
+    capacities = capacities or {}
+    n = len(stages)
+    if n < 2:
+        return []
+    c = [int(counts.get(stage, 0)) for stage in stages]
+    source, sink = n, n + 1
+    graph = _Graph(n + 2)
+
+    overflow_total = 0
+    for i, stage in enumerate(stages):
+        if c[i] >= crowd_threshold:
+            overflow = min(max_moves_per_stage, c[i] - crowd_threshold + 1)
+            overflow_total += overflow
+            graph.add_edge(source, i, overflow, 0)
+        limit = crowd_threshold - 1
+        cap = capacities.get(stage)
+        if cap is not None:
+            limit = min(limit, cap)
+        graph.add_edge(i, sink, limit - c[i], 0)
+    if not overflow_total:
+        return []
+
+    forward = [graph.add_edge(i, i + 1, min(max_moves_per_stage, c[i]), 1) for i in range(n - 1)]
+    graph.min_cost_flow(source, sink)
+
+    moves = []
+    for i in range(n - 2, -1, -1):
+        edge = forward[i]
+        if edge is None:
+            continue
+        sent = min(max_moves_per_stage, c[i]) - edge[1]
+        if sent > 0:
+            moves.append((stages[i], stages[i + 1], sent))
+    return moves
+
+
+def apply_plan(counts, moves):
+    """Return the stage counts after `moves` (for reporting and benchmarks)."""
+    after = dict(counts)
+    for from_stage, to_stage, n in moves:
+        after[from_stage] = after.get(from_stage, 0) - n
+        after[to_stage] = after.get(to_stage, 0) + n
+    return after
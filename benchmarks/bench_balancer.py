@@ -0,0 +1,80 @@
+"""Compare balancer.plan_moves with the previous auto_balance heuristic.
+
+Run from the repo root:
+
+    python benchmarks/bench_balancer.py [trials]
+
+For random stage loads it reports planning time and, for each strategy,
+the average peak stage load left behind, the overflow (patients at or above
+the crowd threshold, summed over stages) left behind, how often balancing
+created a new stage at or above the threshold, and how often a patient was
+moved somewhere other than the next stage. The legacy heuristic can report
+a lower peak only because it ignores stage order (e.g. sending Discharge
+patients back to Reception).
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import balancer  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+
+
+def legacy_plan(counts, crowd_threshold, max_moves):
+    """Counts-only replica of the old auto_balance: overflow goes to the first
+    of the three initially least-busy stages, which never updates."""
+    moves = []
+    least_busy = [s for s, _ in sorted(counts.items(), key=lambda kv: kv[1])[:3]]
+    for stage, count in list(counts.items()):
+        if count >= crowd_threshold:
+            to_move = min(max_moves, count - crowd_threshold + 1)
+            target = next((t for t in least_busy if t != stage), None)
+            if target is None:
+                idx = STAGES.index(stage)
+                target = STAGES[idx + 1] if idx < len(STAGES) - 1 else None
+            if target:
+                moves.append((stage, target, to_move))
+    return moves
+
+
+def evaluate(counts, moves, threshold):
+    after = balancer.apply_plan(counts, moves)
+    new_hotspot = any(after[s] >= threshold > counts[s] for s in counts)
+    out_of_order = any(STAGES.index(b) != STAGES.index(a) + 1 for a, b, _ in moves)
+    overflow = sum(max(0, n - threshold + 1) for n in after.values())
+    return max(after.values()), overflow, new_hotspot, out_of_order
+
+
+def main(trials=5000):
+    rng = random.Random(11)
+    stats = {'legacy': [0, 0, 0, 0, 0.0], 'min-cost flow': [0, 0, 0, 0, 0.0]}
+    for _ in range(trials):
+        threshold = rng.randint(10, 40)
+        max_moves = rng.randint(1, 10)
+        counts = {s: rng.randint(0, int(threshold * 1.3)) for s in STAGES}
+        for name, planner in (('legacy', lambda: legacy_plan(counts, threshold, max_moves)),
+                              ('min-cost flow', lambda: balancer.plan_moves(counts, STAGES, threshold, max_moves))):
+            start = time.perf_counter()
+            moves = planner()
+            elapsed = time.perf_counter() - start
+            peak, overflow, hotspot, out_of_order = evaluate(counts, moves, threshold)
+            s = stats[name]
+            s[0] += peak
+            s[1] += overflow
+            s[2] += hotspot
+            s[3] += out_of_order
+            s[4] += elapsed
+
+    print(f'{trials} random loads over {len(STAGES)} stages')
+    print(f'{"strategy":<15}{"avg peak":>10}{"overflow":>10}{"new hotspot":>13}{"out of order":>14}{"us/plan":>10}')
+    for name, (peak, overflow, hotspot, ooo, elapsed) in stats.items():
+        print(f'{name:<15}{peak / trials:>10.2f}{overflow / trials:>10.2f}{hotspot / trials:>12.1%}'
+              f'{ooo / trials:>13.1%}{elapsed / trials * 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,73 @@
+"""Compare the six-request dashboard refresh with /api/dashboard-snapshot.
+
+Run from the repo root:
+
+    python benchmarks/bench_dashboard_snapshot.py [patients]
+
+Uses the Flask test client, so bytes are response bodies plus response
+headers as Werkzeug would send them (no TCP/HTTP framing overhead).
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as mediflow  # noqa: E402
+
+LEGACY_ROUTES = ['/api/overview', '/api/patient-distribution', '/api/wait-times',
+                 '/api/alerts', '/api/doctors', '/api/resources']
+
+
+def wire_bytes(response):
+    headers = sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+    return len(response.get_data()) + headers + len('HTTP/1.1 200 OK\r\n\r\n')
+
+
+def seed(n):
+    rng = random.Random(7)
+    for _ in range(n):
+        pid = mediflow.patient_registry.next_id()
+        mediflow.patient_registry.add({
+            'id': pid, 'name': f'Patient {pid}', 'status': 'Waiting',
+            'stage': rng.choice(mediflow.STAGE_ORDER),
+            'priority': rng.choice(['Low', 'Medium', 'High']),
+            'waiting_time': rng.randint(0, 40),
+        })
+    mediflow.publish_changes()
+
+
+def main(patients=1000, refreshes=200):
+    seed(patients)
+    client = mediflow.app.test_client()
+
+    start = time.perf_counter()
+    legacy_bytes = 0
+    for _ in range(refreshes):
+        for route in LEGACY_ROUTES:
+            legacy_bytes += wire_bytes(client.get(route))
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = client.get('/api/dashboard-snapshot')
+    etag = first.headers['ETag']
+    snapshot_bytes = wire_bytes(first)
+    not_modified = 0
+    for _ in range(refreshes - 1):
+        r = client.get('/api/dashboard-snapshot', headers={'If-None-Match': etag})
+        not_modified += r.status_code == 304
+        snapshot_bytes += wire_bytes(r)
+    snapshot_time = time.perf_counter() - start
+
+    print(f'{refreshes} dashboard refreshes, {len(mediflow.patient_registry)} patients, state unchanged')
+    print(f'{"":<22}{"requests":>10}{"bytes":>12}{"ms/refresh":>12}')
+    print(f'{"six endpoints":<22}{refreshes * len(LEGACY_ROUTES):>10}{legacy_bytes:>12}'
+          f'{legacy_time / refreshes * 1000:>12.3f}')
+    print(f'{"dashboard-snapshot":<22}{refreshes:>10}{snapshot_bytes:>12}'
+          f'{snapshot_time / refreshes * 1000:>12.3f}')
+    print(f'304 responses: {not_modified}/{refreshes - 1}')
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:2]))
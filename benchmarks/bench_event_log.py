@@ -0,0 +1,96 @@
+"""Movement log: append cost, memory per event, and restart time.
+
+Run from the repo root:
+
+    python benchmarks/bench_event_log.py [events] [patients] [snapshot_every]
+
+Records random stage transitions, flushes them to a temporary SQLite file,
+then rebuilds the current state two ways:
+
+* snapshot: MovementLog.restore() (latest snapshot + the events after it)
+* full:     replaying every event in patient_events from the start
+
+and checks both agree with the live log.
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations  # noqa: E402
+import persistence  # noqa: E402
+from event_log import MovementLog  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+CAUSES = ['advance', 'balance', 'manual']
+
+
+def full_replay(path):
+    state = {}
+    for pid, to_stage in sqlite3.connect(path).execute('SELECT patient_id, to_stage FROM patient_events ORDER BY seq'):
+        if to_stage is None:
+            state.pop(pid, None)
+        else:
+            state[pid] = to_stage
+    return state
+
+
+def main(n_events=500_000, n_patients=5_000, snapshot_every=1000):
+    rng = random.Random(5)
+    log = MovementLog(snapshot_every=snapshot_every, max_events=n_events * 2)
+    where = {}
+    start = time.perf_counter()
+    for _ in range(n_events):
+        pid = rng.randint(1, n_patients)
+        from_stage = where.get(pid)
+        to_stage = None if from_stage == 'Discharge' else STAGES[STAGES.index(from_stage) + 1] if from_stage else 'Reception'
+        log.record(pid, from_stage, to_stage, rng.choice(CAUSES) if from_stage else 'arrival')
+        if to_stage is None:
+            where.pop(pid)
+        else:
+            where[pid] = to_stage
+    append = time.perf_counter() - start
+    columns = log._columns[1:]
+    column_bytes = sum(c.itemsize * len(c) for c in columns)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'events.db')
+        pool = persistence.ConnectionPool(path)
+        migrations.migrate(pool.connection())
+        log.attach(pool)
+        start = time.perf_counter()
+        log.flush()
+        flush = time.perf_counter() - start
+
+        restored = MovementLog(snapshot_every=snapshot_every)
+        restored.attach(pool)
+        start = time.perf_counter()
+        replayed = restored.restore()
+        restore = time.perf_counter() - start
+
+        start = time.perf_counter()
+        replayed_full = full_replay(path)
+        full = time.perf_counter() - start
+
+    assert restored.state_at() == log.state_at() == replayed_full == where, 'replayed state differs'
+
+    half_hour = log.clock() - 1800
+    start = time.perf_counter()
+    log.counts_over_time(half_hour, log.clock(), 60)
+    history = time.perf_counter() - start
+
+    print(f'{n_events} events, {n_patients} patients, snapshot every {snapshot_every}')
+    print(f'append          {n_events / append:10.0f} events/s')
+    print(f'memory          {column_bytes / n_events:10.1f} bytes/event in columns')
+    print(f'flush to sqlite {flush * 1000:10.1f} ms')
+    print(f'restore         {restore * 1000:10.1f} ms  (snapshot + {replayed} events)')
+    print(f'full replay     {full * 1000:10.1f} ms')
+    print(f'30 min history  {history * 1000:10.1f} ms  (31 samples)')
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:4]))
@@ -0,0 +1,49 @@
+"""Time full-day discrete-event simulations at increasing arrival rates.
+
+Run from the repo root:
+
+    python benchmarks/bench_flow_sim.py
+
+Each run simulates a 10-hour arrival window (then drains the queues) with
+enough servers per stage to keep the clinic stable, and checks that a repeat
+run with the same seed gives identical statistics.
+"""
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flow_sim  # noqa: E402
+
+RATES = [12, 600, 1200, 2400, 3600]  # patients per hour
+MEAN_SERVICE = {'exponential': lambda m: m, 'lognormal': lambda m, s: m, 'fixed': lambda v: v,
+                'uniform': lambda lo, hi: (lo + hi) / 2, 'triangular': lambda lo, mode, hi: (lo + mode + hi) / 3}
+
+
+def stable_capacities(rate, target_load=0.85):
+    """Servers per stage so each stage runs at about `target_load`."""
+    capacities = {}
+    for stage in flow_sim.DEFAULT_STAGES:
+        kind, *params = flow_sim.DEFAULT_SERVICE[stage]
+        offered = rate / 60 * flow_sim.DEFAULT_ROUTING.get(stage, 1.0) * MEAN_SERVICE[kind](*params)
+        capacities[stage] = max(1, math.ceil(offered / target_load))
+    return capacities
+
+
+def main():
+    print(f"{'rate/h':>8} {'patients':>9} {'events':>9} {'seconds':>8} {'mean wait':>10} {'p95 wait':>9}")
+    for rate in RATES:
+        config = {'arrival_rate': rate, 'duration': 600, 'capacities': stable_capacities(rate)}
+        start = time.perf_counter()
+        result = flow_sim.run_simulation(config, seed=rate)
+        elapsed = time.perf_counter() - start
+        assert flow_sim.run_simulation(config, seed=rate) == result, 'seeded runs differ'
+        events = result['arrivals'] + sum(s['served'] for s in result['stages'].values())
+        print(f"{rate:>8} {result['arrivals']:>9} {events:>9} {elapsed:>8.3f} "
+              f"{result['wait']['mean']:>10.2f} {result['wait']['p95']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Time paged, filtered and incremental /api/patients requests.
+
+Run from the repo root:
+
+    python benchmarks/bench_patient_pages.py [repeat]
+
+Grows app.py's registry to 1k, 10k and 100k patients and times, through the
+Flask test client (milliseconds per request):
+
+* full: the whole list, as before pagination,
+* page: the first 100 by longest wait,
+* deep: a page up to 100 pages into that order, via its cursor,
+* filtered: 100 High-priority Reception patients by entry time,
+* narrow: one doctor's waiting patients (a small filtered set),
+* since: the changes after 50 patient moves.
+
+Paged and incremental requests should stay roughly flat as the list grows.
+Also checks that paging through the whole list with cursors returns every
+patient exactly once, in order. Exits non-zero if it does not.
+"""
+import os
+import random
+import sys
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as mediflow  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def grow(n, rng):
+    """Add patients until the registry holds `n`."""
+    with mediflow.state_lock:
+        while len(mediflow.patient_registry) < n:
+            pid = mediflow.patient_registry.next_id()
+            mediflow.patient_registry.add({
+                'id': pid, 'name': f'Patient {pid}',
+                'status': rng.choice(['Waiting', 'In Treatment']),
+                'stage': rng.choice(mediflow.STAGE_ORDER),
+                'priority': rng.choices(['Low', 'Medium', 'High'], weights=[60, 30, 10])[0],
+                'doctor_id': rng.randint(1, 200),
+                'entry_time': f'{rng.randint(7, 18):02}:{rng.randint(0, 59):02}',
+                'waiting_time': rng.randint(0, 120),
+            })
+        mediflow.publish_changes()
+
+
+def per_request_ms(client, url, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.get(url).get_data()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def check_cursor_walk(client):
+    ids, cursor = [], None
+    while True:
+        url = '/api/patients?limit=1000&sort=waiting_time&order=desc'
+        data = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        ids += [(p['waiting_time'], p['id']) for p in data['patients']]
+        cursor = quote(data['next_cursor'] or '')
+        if not cursor:
+            break
+    return ids == sorted(ids, reverse=True) and len(set(ids)) == len(mediflow.patient_registry)
+
+
+def main(repeat=20):
+    rng = random.Random(11)
+    client = mediflow.app.test_client()
+    failed = False
+    print(f"{'patients':>9} {'full':>9} {'page':>9} {'deep':>9} {'filtered':>9} {'narrow':>9} {'since':>9}")
+    for n in SIZES:
+        grow(n, rng)
+        first = client.get('/api/patients?limit=100&sort=waiting_time&order=desc').get_json()
+        cursor = quote(first['next_cursor'])
+        for _ in range(min(99, n // 100 - 2)):
+            url = f'/api/patients?limit=100&sort=waiting_time&order=desc&cursor={cursor}'
+            cursor = quote(client.get(url).get_json()['next_cursor'])
+
+        version = mediflow.read_view['version']
+        with mediflow.state_lock:
+            for pid in rng.sample(range(1, n + 1), 50):
+                if pid in mediflow.patient_registry:
+                    mediflow.patient_registry.move(pid, rng.choice(mediflow.STAGE_ORDER))
+            mediflow.publish_changes()
+
+        urls = {
+            'full': '/api/patients',
+            'page': '/api/patients?limit=100&sort=waiting_time&order=desc',
+            'deep': f'/api/patients?limit=100&sort=waiting_time&order=desc&cursor={cursor}',
+            'filtered': '/api/patients?limit=100&stage=Reception&priority=High&sort=entry_time',
+            'narrow': '/api/patients?limit=100&doctor=7&status=Waiting',
+            'since': f'/api/patients?since={version}',
+        }
+        times = {name: per_request_ms(client, url, max(2, repeat if name != 'full' else repeat * 1000 // n))
+                 for name, url in urls.items()}
+        print(f'{n:9} ' + ' '.join(f'{times[name]:7.2f}ms' for name in urls))
+        if not check_cursor_walk(client):
+            print(f'FAIL cursor walk over {n} patients skipped or repeated patients')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
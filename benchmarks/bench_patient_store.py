@@ -0,0 +1,77 @@
+"""Benchmark PatientRegistry operations against the old linear scans.
+
+Run from the repo root:
+
+    python benchmarks/bench_patient_store.py
+
+Prints per-operation latency (microseconds) for 100 to 100k patients. The
+registry columns should stay roughly flat while the list-scan columns grow
+linearly with the patient count.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patient_store import PatientRegistry  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+SIZES = [100, 1_000, 10_000, 100_000]
+
+
+def make_patients(n, rng):
+    return [{
+        'id': i,
+        'name': f'Patient {i}',
+        'stage': rng.choice(STAGES),
+        'priority': rng.choices(['Low', 'Medium', 'High'], weights=[60, 30, 10])[0],
+        'waiting_time': rng.randint(0, 120),
+    } for i in range(1, n + 1)]
+
+
+def per_call_us(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'patients':>9} {'move':>9} {'lookup':>9} {'longest':>9} {'scan lookup':>12} {'scan longest':>13}")
+    for n in SIZES:
+        patients = make_patients(n, rng)
+        registry = PatientRegistry(STAGES, (p.copy() for p in patients))
+        ids = [rng.randint(1, n) for _ in range(1000)]
+        it = iter(ids * 100)
+
+        def move():
+            pid = next(it)
+            registry.move(pid, rng.choice(STAGES), waiting_time=rng.randint(0, 120))
+
+        def lookup():
+            registry.get(next(it))
+
+        def longest():
+            registry.longest_waiting('Reception', 3)
+
+        def scan_lookup():
+            pid = next(it)
+            for p in patients:
+                if p['id'] == pid:
+                    break
+
+        def scan_longest():
+            c = [p for p in patients if p['stage'] == 'Reception']
+            c.sort(key=lambda x: x['waiting_time'], reverse=True)
+
+        scan_repeat = max(3, 200_000 // n)
+        print(f'{n:>9} {per_call_us(move, 5000):>9.2f} {per_call_us(lookup, 5000):>9.2f} '
+              f'{per_call_us(longest, 5000):>9.2f} {per_call_us(scan_lookup, scan_repeat):>12.2f} '
+              f'{per_call_us(scan_longest, scan_repeat):>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
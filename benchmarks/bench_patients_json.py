@@ -0,0 +1,118 @@
+"""Compare the old /api/patients serialization with pre-encoded fragments.
+
+Run from the repo root:
+
+    python benchmarks/bench_patients_json.py [repeat]
+
+For 1k, 10k and 100k patients, times a full GET through the Flask test
+client for:
+
+* legacy: copy every patient, fill defaults with setdefault, jsonify,
+* body: join the cached per-patient fragments into one buffer,
+* stream: the same fragments yielded in chunks (the body is consumed),
+
+once with orjson (when installed) and once with the standard json module.
+It also reports the cost of re-encoding one moved patient and checks that
+every variant decodes to the same list. Exits non-zero on a mismatch.
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, Response, jsonify  # noqa: E402
+
+import patient_json  # noqa: E402
+from patient_json import PatientJSON  # noqa: E402
+from patient_store import PatientRegistry  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+SIZES = [1_000, 10_000, 100_000]
+
+
+def make_patients(n, rng):
+    return [{
+        'id': i,
+        'name': f'Patient {i}',
+        'status': 'Waiting',
+        'stage': rng.choice(STAGES),
+        'priority': rng.choices(['Low', 'Medium', 'High'], weights=[60, 30, 10])[0],
+        'doctor_id': rng.randint(1, 12),
+        'entry_time': '2024-01-01T08:00:00',
+        'waiting_time': rng.randint(0, 120),
+    } for i in range(1, n + 1)]
+
+
+def build_app(registry, feed):
+    app = Flask(__name__)
+
+    @app.route('/legacy')
+    def legacy():
+        patient_list = [p.copy() for p in registry]
+        for patient in patient_list:
+            patient['waiting_time'] = patient.get('waiting_time', 0)
+            patient.setdefault('stage', patient.get('stage', 'undefined'))
+            patient.setdefault('priority', patient.get('priority', 'undefined'))
+            patient.setdefault('doctor_id', patient.get('doctor_id', 'undefined'))
+            patient.setdefault('entry_time', patient.get('entry_time', 'undefined'))
+        return jsonify(patient_list)
+
+    @app.route('/body')
+    def body():
+        return Response(feed.body(feed.fragments()), mimetype='application/json')
+
+    @app.route('/stream')
+    def stream():
+        return Response(feed.stream(feed.fragments()), mimetype='application/json')
+
+    return app
+
+
+def per_request_ms(client, url, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.get(url).get_data()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(repeat=5):
+    rng = random.Random(42)
+    encoders = [('orjson', patient_json.orjson)] if patient_json.orjson else []
+    encoders.append(('json', None))
+    failed = False
+    print(f"{'patients':>9} {'encoder':>7} {'legacy':>9} {'body':>9} {'stream':>9} {'speed-up':>9} "
+          f"{'re-encode':>10} {'MB':>6}")
+    for n in SIZES:
+        patients = make_patients(n, rng)
+        for name, module in encoders:
+            patient_json.orjson = module
+            registry = PatientRegistry(STAGES, (p.copy() for p in patients))
+            feed = PatientJSON(registry)
+            registry.add_listener(feed.listener)
+            client = build_app(registry, feed).test_client()
+
+            expected = client.get('/legacy').get_json()
+            for url in ('/body', '/stream'):
+                if json.loads(client.get(url).get_data()) != expected:
+                    print(f'FAIL {url} differs from the legacy payload ({n} patients, {name})')
+                    failed = True
+
+            times = {url: per_request_ms(client, url, max(1, repeat * 1000 // n))
+                     for url in ('/legacy', '/body', '/stream')}
+            moves = 2000
+            start = time.perf_counter()
+            for _ in range(moves):
+                registry.move(rng.randint(1, n), rng.choice(STAGES), waiting_time=rng.randint(0, 120))
+            move_us = (time.perf_counter() - start) / moves * 1e6
+            size_mb = len(feed.body()) / 1e6
+            print(f'{n:9} {name:>7} {times["/legacy"]:7.1f}ms {times["/body"]:7.1f}ms {times["/stream"]:7.1f}ms '
+                  f'{times["/legacy"] / times["/body"]:8.1f}x {move_us:8.1f}us {size_mb:6.1f}')
+    patient_json.orjson = encoders[0][1]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
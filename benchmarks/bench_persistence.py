@@ -0,0 +1,109 @@
+"""Write throughput of stage moves persisted to SQLite.
+
+Run from the repo root:
+
+    python benchmarks/bench_persistence.py [patients] [moves] [batch]
+
+Applies the same random stage moves three ways, each to a fresh file in a
+temporary directory:
+
+* legacy:  new connection, UPDATE, commit, close per move (the old get_db
+           pattern, rollback journal)
+* pooled:  one WAL connection, one commit per move
+* batched: PatientStore, moves coalesced and flushed with executemany every
+           `batch` moves (one flush per /api/advance or /api/simulate call)
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import persistence  # noqa: E402
+from patient_store import PatientRegistry  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+
+
+def make_patients(n):
+    rng = random.Random(1)
+    return [{'id': i, 'name': f'Patient {i}', 'age': rng.randint(1, 90), 'condition': 'General',
+             'status': 'Waiting', 'stage': rng.choice(STAGES), 'priority': rng.choice(['Low', 'Medium', 'High']),
+             'doctor_id': None, 'entry_time': 'now', 'waiting_time': rng.randint(0, 60)}
+            for i in range(1, n + 1)]
+
+
+def make_moves(n_patients, n_moves):
+    rng = random.Random(2)
+    return [(rng.randint(1, n_patients), rng.choice(STAGES), rng.randint(0, 60)) for _ in range(n_moves)]
+
+
+def seeded_store(path, patients):
+    store = persistence.PatientStore(persistence.ConnectionPool(path))
+    store.ensure_schema()
+    store.replace_patients(patients)
+    return store
+
+
+def run_legacy(path, patients, moves):
+    seeded_store(path, patients).pool.close_all()
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=DELETE')
+    conn.close()
+    start = time.perf_counter()
+    for pid, stage, wait in moves:
+        conn = sqlite3.connect(path)
+        conn.execute('UPDATE patients SET stage = ?, waiting_time = ? WHERE id = ?', (stage, wait, pid))
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def run_pooled(path, patients, moves):
+    conn = seeded_store(path, patients).pool.connection()
+    start = time.perf_counter()
+    for pid, stage, wait in moves:
+        conn.execute('UPDATE patients SET stage = ?, waiting_time = ? WHERE id = ?', (stage, wait, pid))
+        conn.commit()
+    return time.perf_counter() - start
+
+
+def run_batched(path, patients, moves, batch):
+    store = seeded_store(path, patients)
+    registry = PatientRegistry(STAGES, (p.copy() for p in patients))
+    store.track(registry)
+    start = time.perf_counter()
+    for i, (pid, stage, wait) in enumerate(moves, 1):
+        registry.move(pid, stage, waiting_time=wait)
+        if i % batch == 0:
+            store.flush()
+    store.flush()
+    elapsed = time.perf_counter() - start
+
+    stored = {p['id']: (p['stage'], p['waiting_time']) for p in store.load_patients()}
+    assert stored == {p['id']: (p['stage'], p['waiting_time']) for p in registry}, 'database out of sync'
+    return elapsed, store.stats
+
+
+def main(n_patients=2000, n_moves=20000, batch=200):
+    patients = make_patients(n_patients)
+    moves = make_moves(n_patients, n_moves)
+    legacy_moves = moves[:min(n_moves, 2000)]   # per-move fsyncs are slow; sample them
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = run_legacy(os.path.join(tmp, 'legacy.db'), patients, legacy_moves)
+        pooled = run_pooled(os.path.join(tmp, 'pooled.db'), patients, moves)
+        batched, stats = run_batched(os.path.join(tmp, 'batched.db'), patients, moves, batch)
+
+    print(f'{n_patients} patients, {n_moves} moves, flush every {batch} moves')
+    print(f'legacy   {len(legacy_moves) / legacy:10.0f} moves/s  ({len(legacy_moves)} moves sampled)')
+    print(f'pooled   {n_moves / pooled:10.0f} moves/s')
+    print(f'batched  {n_moves / batched:10.0f} moves/s  ({stats["flushes"]} transactions, '
+          f'{stats["rows_written"]} rows written)')
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:4]))
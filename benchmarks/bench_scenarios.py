@@ -0,0 +1,45 @@
+"""Time a few-hundred-configuration what-if sweep.
+
+Run from the repo root:
+
+    python benchmarks/bench_scenarios.py [workers]
+
+Sweeps 288 configurations x 5 replications of a default clinic day and
+reports wall time, time to first result and configurations per second.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scenarios  # noqa: E402
+from app import sample_resources, sample_staff  # noqa: E402
+
+GRID = {
+    'crowd_threshold': [5, 10, 20, 40],
+    'max_moves_per_stage': [1, 3, 5],
+    'staff': {'RN': [1, 2, 3], 'Surgeon': [1, 2]},
+    'rooms': {'Room': [2, 3]},
+    'arrival_rate': [12, 18],
+}
+
+
+def main(workers=None):
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    first = None
+    results = []
+    for result in scenarios.sweep(GRID, 5, 0, workers, sample_staff, sample_resources):
+        if first is None:
+            first = time.perf_counter() - start
+        results.append(result)
+    elapsed = time.perf_counter() - start
+    best = min(results, key=lambda r: r['p95_wait'])
+    print(f'{len(results)} configurations x 5 replications on {workers} worker(s): '
+          f'{elapsed:.2f}s total, first result after {first:.2f}s, {len(results) / elapsed:.1f} configs/s')
+    print(f"lowest p95 wait {best['p95_wait']} min with {best['settings']}")
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:2]))
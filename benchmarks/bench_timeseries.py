@@ -0,0 +1,85 @@
+"""Memory and query cost of the analytics rollups.
+
+Run from the repo root:
+
+    python benchmarks/bench_timeseries.py [days] [tick_seconds]
+
+Feeds `days` of synthetic per-tick samples (one every `tick_seconds`, 10 s by
+default) for the /api/analytics metrics into a TimeSeriesStore and reports:
+
+* ingest rate,
+* memory held per level and per retained day (fixed, whatever `days` is),
+* points read and time taken by a 30-day trend query,
+* the raw-sample equivalent, and a check of the rollups against a naive
+  recompute over the raw samples.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timeseries import TimeSeriesStore  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+METRICS = (['patients', 'occupancy', 'avg_wait', 'active_staff']
+           + [f'count:{s}' for s in STAGES] + [f'wait:{s}' for s in STAGES])
+START = 1_700_000_000
+
+
+def samples(days, tick):
+    rng = random.Random(5)
+    for i in range(int(days * 86400 / tick)):
+        values = {m: rng.uniform(0, 100) for m in METRICS}
+        yield START + i * tick, values
+
+
+def main(days=31, tick=10):
+    store = TimeSeriesStore(METRICS)
+    # the last 30 days, from an hour boundary so edge buckets are whole
+    check_start = (START + (days - 30) * 86400) // 3600 * 3600
+    raw = []  # patients metric inside the checked range, for the naive recompute
+
+    start = time.perf_counter()
+    for ts, values in samples(days, tick):
+        store.add(ts, values)
+        if ts >= check_start:
+            raw.append((ts, values['patients']))
+    elapsed = time.perf_counter() - start
+    print(f'{store.samples} samples ({days} days, every {tick}s) in {elapsed:.1f}s: '
+          f'{store.samples / elapsed:,.0f} samples/s')
+
+    print('\nlevel   bucket  retained  bytes       bytes/retained day')
+    for level in store.levels:
+        nbytes = sum(a.itemsize * len(a) for a in level.arrays())
+        retained = level.capacity * level.resolution / 86400
+        print(f'{level.name:7} {level.resolution:6}s {retained:6.0f} d  {nbytes:10,}  {nbytes / retained:10,.0f}')
+    print(f'total   {store.nbytes():,} bytes for {len(METRICS)} metrics')
+    raw_bytes = store.samples * len(METRICS) * 8
+    print(f'raw samples would take {raw_bytes:,} bytes ({raw_bytes / days:,.0f} per day)')
+
+    end = START + days * 86400 - 1
+    start = time.perf_counter()
+    for _ in range(20):
+        level, times, values = store.query('patients', check_start, end)
+    query_ms = (time.perf_counter() - start) / 20 * 1000
+    print(f'\n30-day trend: {len(times)} {level.name} points in {query_ms:.2f} ms')
+
+    start = time.perf_counter()
+    by_bucket = {}
+    for ts, v in raw:
+        by_bucket.setdefault(int(ts // level.resolution), []).append(v)
+    naive = [sum(vs) / len(vs) if vs else None
+             for vs in (by_bucket.get(int(t // level.resolution), []) for t in times)]
+    naive_ms = (time.perf_counter() - start) * 1000
+    print(f'naive recompute over {len(raw):,} raw samples: {naive_ms:.0f} ms')
+
+    mismatched = sum(1 for a, b in zip(values, naive) if (a is None) != (b is None)
+                     or (a is not None and abs(a - b) > 1e-6))
+    print('rollups match' if not mismatched else f'{mismatched} buckets differ from the recompute')
+    return 1 if mismatched else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:3])))
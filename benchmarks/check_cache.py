@@ -0,0 +1,153 @@
+"""Behaviour and payoff check for the response cache.
+
+Run from the repo root:
+
+    python benchmarks/check_cache.py
+
+Checks:
+
+* MemoryCache: LRU eviction order, TTL expiry and the hit/miss/eviction
+  counters, on a controlled clock,
+* RedisCache: the same get/set/TTL/clear contract against an in-memory
+  Redis (the `fakeredis` package; skipped if it is not installed),
+* app.py: every cached endpoint returns exactly the uncached body, a repeat
+  request is a hit, and a state write (version bump) makes the next
+  request a miss with fresh data.
+
+It then times cached against uncached responses. Exits non-zero on any
+failed check.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+
+CACHED_ENDPOINTS = ['/api/overview', '/api/patient-distribution', '/api/doctors', '/api/staff',
+                    '/api/resources', '/api/dashboard-snapshot']
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def check_memory():
+    problems = []
+    clock = Clock()
+    c = cache.MemoryCache(max_entries=2, clock=clock)
+    c.set('a', '1')
+    c.set('b', '2', ttl=10)
+    c.get('a')             # a is now the most recently used
+    c.set('c', '3')        # evicts b
+    if c.get('b') is not None or c.get('a') != '1' or c.get('c') != '3':
+        problems.append('memory: LRU evicted the wrong entry')
+    c.set('d', '4', ttl=5)  # evicts a (c was read after it)
+    clock.now = 6
+    if c.get('d') is not None:
+        problems.append('memory: entry served after its TTL')
+    stats = c.stats()
+    expected = {'hits': 3, 'misses': 2, 'sets': 4, 'evictions': 2, 'expirations': 1, 'entries': 1}
+    if {k: stats[k] for k in expected} != expected:
+        problems.append(f'memory: counters {stats}, expected {expected}')
+    return problems
+
+
+def check_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        print('skip redis: fakeredis not installed')
+        return []
+    problems = []
+    client = fakeredis.FakeRedis()
+    c = cache.RedisCache(client, prefix='test:')
+    client.set('other', 'kept')
+    c.set('a', b'1')
+    c.set('b', b'2', ttl=30)
+    if c.get('a') != b'1' or c.get('missing') is not None:
+        problems.append('redis: get/set mismatch')
+    if not 0 < client.ttl('test:b') <= 30:
+        problems.append('redis: TTL not applied')
+    c.clear()
+    if c.get('a') is not None or client.get('other') != b'kept':
+        problems.append('redis: clear() must drop only its own prefix')
+    stats = c.stats()
+    if (stats['hits'], stats['misses'], stats['sets']) != (1, 2, 2):
+        problems.append(f'redis: counters {stats}')
+    return problems
+
+
+def check_app():
+    import app
+    problems = []
+    client = app.app.test_client()
+    for url in CACHED_ENDPOINTS:
+        first, second = client.get(url), client.get(url)
+        if first.data != second.data:
+            problems.append(f'{url}: cached body differs from the first response')
+
+    view = app.read_view
+    uncached = {
+        '/api/overview': view['overview'],
+        '/api/patient-distribution': view['distribution'],
+        '/api/resources': app.sample_resources,
+        '/api/dashboard-snapshot': dict(view, staff=app.sample_staff, resources=app.sample_resources),
+    }
+    for url, payload in uncached.items():
+        if client.get(url).data != app.app.json.dumps(payload).encode():
+            problems.append(f'{url}: body differs from an uncached serialization')
+
+    before = app.response_cache.stats()
+    client.get('/api/overview')
+    if app.response_cache.stats()['hits'] != before['hits'] + 1:
+        problems.append('repeat request was not a cache hit')
+
+    client.get('/api/patient-distribution')
+    client.post('/api/simulate', json={'seed': 3})
+    before = app.response_cache.stats()
+    new = client.get('/api/patient-distribution').get_json()
+    if app.response_cache.stats()['misses'] != before['misses'] + 1:
+        problems.append('request after a state write was served from the cache')
+    if new != app.read_view['distribution']:
+        problems.append('distribution not refreshed after a state write')
+    return problems
+
+
+def timings():
+    import app
+    client = app.app.test_client()
+    print('\nendpoint                     uncached   cached')
+    for url in CACHED_ENDPOINTS:
+        n = 2000
+        client.get(url)
+        start = time.perf_counter()
+        for _ in range(n):
+            client.get(url)
+        cached_us = (time.perf_counter() - start) / n * 1e6
+        start = time.perf_counter()
+        for _ in range(n):
+            app.response_cache.clear()
+            client.get(url)
+        uncached_us = (time.perf_counter() - start) / n * 1e6
+        print(f'{url:28} {uncached_us:7.0f} us {cached_us:6.0f} us')
+    print(app.response_cache.stats())
+
+
+def main():
+    problems = check_memory() + check_redis() + check_app()
+    for problem in problems:
+        print('FAIL', problem)
+    if not problems:
+        print('all cache checks passed')
+    timings()
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Correctness and overhead check for metrics.py and the /metrics endpoint.
+
+Run from the repo root:
+
+    python benchmarks/check_metrics.py [requests]
+
+Checks:
+
+* counters and histograms recorded from many threads add up exactly, and
+  the shards of exited threads are folded into the totals,
+* /metrics is valid Prometheus text (every sample line parses, histogram
+  buckets are cumulative and end in +Inf == _count),
+* the route profiler only profiles the armed route, for the armed number of
+  requests, and admin endpoints refuse requests without the token.
+
+Then reports the cost of recording (per call), of the request hooks (per
+request, called directly `requests` times) and of a full cached request
+through the test client for comparison. Exits non-zero on any failed
+check.
+"""
+import os
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('MEDIFLOW_ADMIN_TOKEN', 'check-metrics')
+
+from metrics import Metrics  # noqa: E402
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? '
+                    r'(-?[0-9.e+-]+|\+Inf|NaN)$')
+
+
+def check_threads():
+    problems = []
+    m = Metrics(prefix='t_')
+    m.counter('hits', 'test')
+    m.histogram('latency', 'test', buckets=(1, 2, 3))
+
+    def work(i):
+        for j in range(10_000):
+            m.inc('hits', (('worker', str(i % 2)),))
+            m.observe('latency', j % 4)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    totals = m.snapshot()
+    if totals[('t_hits', (('worker', '0'),))] != 40_000 or totals[('t_hits', (('worker', '1'),))] != 40_000:
+        problems.append(f'threads: counter totals {totals}')
+    cells = totals[('t_latency', ())]
+    if cells[:-1] != [40_000, 20_000, 20_000, 0] or cells[-1] != 8 * 2500 * 6:
+        problems.append(f'threads: histogram cells {cells}')
+    if len(m._shards) != 0:
+        problems.append(f'threads: {len(m._shards)} shards of exited threads kept')
+    return problems
+
+
+def check_exposition(client):
+    problems = []
+    text = client.get('/metrics').get_data(as_text=True)
+    buckets = {}
+    counts = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        if not SAMPLE.match(line):
+            problems.append(f'exposition: bad line {line!r}')
+            continue
+        name, value = line.rsplit(' ', 1)
+        if '_bucket{' in name:
+            series = re.sub(r',?le="[^"]*"', '', name).replace('_bucket', '')
+            buckets.setdefault(series, []).append((name, float(value)))
+        elif '_count' in name:
+            counts[name.replace('_count', '')] = float(value)
+    for series, values in buckets.items():
+        numbers = [v for _, v in values]
+        if numbers != sorted(numbers) or 'le="+Inf"' not in values[-1][0]:
+            problems.append(f'exposition: buckets of {series} not cumulative')
+        if counts.get(series.replace('{}', '')) != numbers[-1]:
+            problems.append(f'exposition: +Inf bucket of {series} differs from _count')
+    for name in ('mediflow_http_requests_total', 'mediflow_patients', 'mediflow_flow_tick_seconds',
+                 'mediflow_response_cache_hit_ratio', 'mediflow_http_response_bytes'):
+        if f'# TYPE {name} ' not in text:
+            problems.append(f'exposition: {name} missing')
+    return problems
+
+
+def check_profiler(client):
+    problems = []
+    token = {'X-Admin-Token': os.environ['MEDIFLOW_ADMIN_TOKEN']}
+    if client.post('/api/admin/profile', json={'route': '/api/patients'}).status_code != 403:
+        problems.append('profiler: admin endpoint accepted a request without the token')
+    client.post('/api/admin/profile', headers=token, json={'route': '/api/patients', 'requests': 3})
+    for _ in range(5):
+        client.get('/api/patients')
+        client.get('/api/overview')
+    status = client.get('/api/admin/profile', headers=token).get_json()
+    if status['profiled'] != 3 or status['remaining'] != 0:
+        problems.append(f'profiler: {status["profiled"]} requests profiled, {status["remaining"]} remaining')
+    if 'get_patients' not in (status['report'] or '') or 'get_overview' in status['report']:
+        problems.append('profiler: report does not cover exactly the armed route')
+    client.delete('/api/admin/profile', headers=token)
+    return problems
+
+
+def overhead(client, mediflow, requests):
+    m = Metrics()
+    m.counter('c', 'test')
+    m.histogram('h', 'test')
+    labels = (('route', '/api/overview'), ('method', 'GET'))
+    n = 200_000
+    start = time.perf_counter()
+    for _ in range(n):
+        m.inc('c', labels)
+    inc_us = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for i in range(n):
+        m.observe('h', i * 1e-6, labels)
+    observe_us = (time.perf_counter() - start) / n * 1e6
+
+    with mediflow.app.test_request_context('/api/overview'):
+        mediflow.app.preprocess_request()
+        response = mediflow.app.response_class(b'{}')
+        start = time.perf_counter()
+        for _ in range(requests):
+            mediflow._start_request_metrics()
+            mediflow._record_request_metrics(response)
+        hooks_us = (time.perf_counter() - start) / requests * 1e6
+    client.get('/api/overview')
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/api/overview')
+    request_us = (time.perf_counter() - start) / requests * 1e6
+    print(f'recording: inc {inc_us:.2f} us, observe {observe_us:.2f} us per call')
+    print(f'request hooks: {hooks_us:.1f} us per request (a cached /api/overview request takes {request_us:.0f} us)')
+
+
+def main(requests=3000):
+    import app as mediflow
+    client = mediflow.app.test_client()
+    client.post('/api/simulate', json={'seed': 1})
+    problems = check_threads() + check_exposition(client) + check_profiler(client)
+    for problem in problems:
+        print('FAIL', problem)
+    if not problems:
+        print('all metrics checks passed')
+    overhead(client, mediflow, requests)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
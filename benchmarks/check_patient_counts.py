@@ -0,0 +1,67 @@
+"""Randomized consistency check for PatientRegistry stage counts.
+
+Run from the repo root:
+
+    python benchmarks/check_patient_counts.py [rounds] [seed]
+
+Applies random add/move/remove/wait-update sequences and after each round
+verifies that `stage_counts()` equals the real stage membership and that
+`check_consistency()` reports no problems. Exits non-zero on the first
+mismatch and also times the O(stages) count read.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patient_store import PatientRegistry  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+EXTRA_STAGES = ['Registration', 'Triage', 'Diagnosis']
+
+
+def main(rounds=200, seed=1):
+    rng = random.Random(seed)
+    registry = PatientRegistry(STAGES)
+    for _ in range(rounds):
+        for _ in range(rng.randint(1, 200)):
+            op = rng.random()
+            if op < 0.3 or not len(registry):
+                pid = registry.next_id()
+                registry.add({'id': pid, 'name': f'Patient {pid}', 'stage': rng.choice(STAGES),
+                              'priority': rng.choice(['Low', 'Medium', 'High']),
+                              'waiting_time': rng.randint(0, 90)})
+                continue
+            pid = rng.randint(1, registry.next_id())
+            if pid not in registry:
+                continue
+            if op < 0.8:
+                registry.move(pid, rng.choice(STAGES + EXTRA_STAGES), waiting_time=rng.uniform(0, 90))
+            elif op < 0.9:
+                registry.set_waiting_time(pid, rng.randint(0, 90))
+            else:
+                registry.remove(pid)
+
+        counts = registry.stage_counts()
+        actual = {}
+        for p in registry:
+            actual[p['stage']] = actual.get(p['stage'], 0) + 1
+        expected = {stage: actual.get(stage, 0) for stage in STAGES}
+        expected.update({s: c for s, c in actual.items() if s not in expected})
+        problems = registry.check_consistency()
+        if counts != expected or problems:
+            print('MISMATCH', counts, expected, problems)
+            return 1
+
+    start = time.perf_counter()
+    for _ in range(10_000):
+        registry.stage_counts()
+    elapsed = (time.perf_counter() - start) / 10_000 * 1e6
+    print(f'{rounds} rounds consistent, {len(registry)} patients, stage_counts() {elapsed:.2f} us')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:3])))
@@ -0,0 +1,166 @@
+"""EXPLAIN QUERY PLAN regression check for the hot database queries.
+
+Run from the repo root:
+
+    python benchmarks/check_query_plans.py [patients]
+
+Builds a synthetic database in a temporary directory (1,000,000 patients by
+default, plus appointments and notifications at a fifth of that), migrated to
+the version before the indexes. It times every hot query there, applies the
+remaining migrations to the populated database, and then checks that each
+query:
+
+* names its expected index in the plan,
+* never scans a table without an index,
+* (where marked) needs no temporary B-tree for GROUP BY / ORDER BY.
+
+Exits non-zero if any plan regresses.
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+START = 1_700_000_000  # unix time the synthetic history starts at
+DAYS = 90
+INDEX_MIGRATION = 3  # first migration that adds the bucket columns and indexes
+
+# Before INDEX_MIGRATION the buckets have to be computed per row, as the old
+# queries did
+BUCKET_EXPRESSIONS = {
+    'created_hour': "strftime('%Y-%m-%d %H', created_at, 'unixepoch')",
+    'created_day': "strftime('%Y-%m-%d', created_at, 'unixepoch')",
+}
+
+# (name, sql, params, expected index, must avoid a temp B-tree)
+HOT_QUERIES = [
+    ('patients by stage',
+     'SELECT id, name, priority FROM patients WHERE stage = ?', ('Surgery',),
+     'idx_patients_stage', False),
+    ('patients by doctor',
+     'SELECT id, name, stage FROM patients WHERE doctor_id = ?', (17,),
+     'idx_patients_doctor', False),
+    ('patients in one hour',
+     'SELECT COUNT(*) FROM patients WHERE created_hour = ?', ('2023-12-01 10',),
+     'idx_patients_created_hour', False),
+    ('patients per day (last week)',
+     'SELECT created_day, COUNT(*) FROM patients WHERE created_day >= ? GROUP BY created_day', ('2024-02-01',),
+     'idx_patients_created_day', True),
+    # mirrors app_clean.train_ml_model
+    ('hourly training rollup',
+     """SELECT strftime('%H', MIN(created_at), 'unixepoch') AS hour,
+               strftime('%w', MIN(created_at), 'unixepoch') AS day_of_week,
+               COUNT(*) AS patient_count,
+               AVG((entry_time - created_at) / 60) AS avg_waiting_time
+        FROM patients GROUP BY created_hour ORDER BY created_hour DESC LIMIT 1000""", (),
+     'idx_patients_created_hour', True),
+    ('appointments for doctor and day',
+     'SELECT id, patient_id, appointment_time FROM appointments WHERE doctor_id = ? AND appointment_date = ?',
+     (17, '2023-12-01'),
+     'idx_appointments_doctor_date', False),
+    ('appointments on a day',
+     'SELECT id, doctor_id, appointment_time FROM appointments WHERE appointment_date = ?', ('2023-12-01',),
+     'idx_appointments_date', False),
+    ('unread notifications for user',
+     'SELECT id, message FROM notifications WHERE user_id = ? AND is_read = 0 ORDER BY created_at DESC',
+     (42,),
+     'idx_notifications_unread', True),
+]
+
+
+def populate(conn, n_patients):
+    rng = random.Random(3)
+    span = DAYS * 86400
+
+    def patients():
+        for i in range(1, n_patients + 1):
+            created = START + rng.random() * span
+            yield (i, f'Patient {i}', rng.choice(STAGES), created + rng.uniform(0, 3600),
+                   rng.randint(1, 50), created, rng.choice(['Low', 'Medium', 'High']))
+
+    def appointments():
+        for i in range(1, n_patients // 5 + 1):
+            day = time.strftime('%Y-%m-%d', time.gmtime(START + rng.random() * span))
+            yield (i, rng.randint(1, n_patients), rng.randint(1, 50), day,
+                   f'{rng.randint(8, 17):02d}:{rng.choice(["00", "30"])}', 'Scheduled', START)
+
+    def notifications():
+        for i in range(1, n_patients // 5 + 1):
+            yield (i, rng.randint(1, 500), f'Message {i}', 'info', int(rng.random() < 0.1),
+                   START + rng.random() * span)
+
+    with conn:
+        conn.executemany('INSERT INTO patients (id, name, stage, entry_time, doctor_id, created_at, priority) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)', patients())
+        conn.executemany('INSERT INTO appointments (id, patient_id, doctor_id, appointment_date, appointment_time, '
+                         'status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)', appointments())
+        conn.executemany('INSERT INTO notifications (id, user_id, message, type, is_read, created_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', notifications())
+
+
+def unindexed(sql):
+    for column, expression in BUCKET_EXPRESSIONS.items():
+        sql = sql.replace(column, expression)
+    return sql
+
+
+def timed(conn, sql, params, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def plan_problems(conn, sql, params, index, no_temp_btree):
+    details = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    plan = ' | '.join(details)
+    problems = []
+    if not any(index in d for d in details):
+        problems.append(f'does not use {index}')
+    if any(d.startswith('SCAN') and 'USING' not in d for d in details):
+        problems.append('full table scan')
+    if no_temp_btree and any('TEMP B-TREE' in d for d in details):
+        problems.append('needs a temporary B-tree')
+    return plan, problems
+
+
+def main(n_patients=1_000_000):
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'plans.db'))
+        migrations.migrate(conn, target=INDEX_MIGRATION - 1)
+
+        start = time.perf_counter()
+        populate(conn, n_patients)
+        print(f'{n_patients} patients loaded in {time.perf_counter() - start:.1f}s')
+
+        before = [timed(conn, unindexed(sql), params, repeat=1) for _, sql, params, _, _ in HOT_QUERIES]
+
+        start = time.perf_counter()
+        migrations.migrate(conn)
+        conn.execute('ANALYZE')
+        print(f'migrated to v{migrations.schema_version(conn)} in {time.perf_counter() - start:.1f}s\n')
+
+        for (name, sql, params, index, no_temp), old in zip(HOT_QUERIES, before):
+            plan, problems = plan_problems(conn, sql, params, index, no_temp)
+            new = timed(conn, sql, params)
+            status = 'FAIL' if problems else 'ok'
+            failed |= bool(problems)
+            print(f'{status:4} {name:34} {old * 1000:9.1f} ms -> {new * 1000:7.2f} ms   {plan}')
+            for problem in problems:
+                print(f'       {problem}')
+        conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
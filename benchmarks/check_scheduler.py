@@ -0,0 +1,164 @@
+"""Behaviour check for the server-side auto-flow scheduler.
+
+Run from the repo root:
+
+    python benchmarks/check_scheduler.py [patients]
+
+Checks, on real time with short intervals:
+
+* cadence: ticks follow the interval without drift, with little lateness,
+* overruns: a tick slower than the interval is counted as an overrun, the
+  slots it covered are skipped and ticks never start closer together than
+  one interval (no catch-up burst),
+* pausing: nothing runs while disabled and ticks resume on wake(),
+* errors: a failing tick is counted and the loop keeps going,
+* app.py: /api/advance and /api/check-balance no longer move patients, no
+  matter how often they are called; only the scheduler does.
+
+Then reports the duration of app ticks with `patients` in the registry
+(10000 by default). Exits non-zero on any failed check.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flow_scheduler import TickScheduler  # noqa: E402
+
+INTERVAL = 0.05
+
+
+def run_for(seconds, tick, **kwargs):
+    scheduler = TickScheduler(tick, interval=lambda: INTERVAL, **kwargs)
+    scheduler.start()
+    time.sleep(seconds)
+    scheduler.stop(1)
+    return scheduler.stats()
+
+
+def check_cadence():
+    stats = run_for(1.0, lambda: None)
+    problems = []
+    if not 17 <= stats['ticks'] <= 20:
+        problems.append(f'cadence: {stats["ticks"]} ticks in 1s at {INTERVAL}s')
+    if stats['overruns']:
+        problems.append(f'cadence: {stats["overruns"]} overruns for an instant tick')
+    print(f'cadence   {stats["ticks"]} ticks, lateness p95 {stats["lateness_p95_ms"]} ms, '
+          f'max {stats["lateness_max_ms"]} ms')
+    return problems
+
+
+def check_overruns():
+    starts = []
+
+    def slow():
+        starts.append(time.monotonic())
+        time.sleep(INTERVAL * 2.4)
+
+    stats = run_for(1.0, slow)
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    problems = []
+    if stats['overruns'] < stats['ticks'] - 1 or stats['skipped'] < 2 * (stats['ticks'] - 1):
+        problems.append(f'overruns: {stats["overruns"]} overruns / {stats["skipped"]} skipped '
+                        f'for {stats["ticks"]} slow ticks')
+    if gaps and min(gaps) < INTERVAL * 0.9:
+        problems.append(f'overruns: ticks {min(gaps) * 1000:.0f} ms apart after an overrun')
+    print(f'overruns  {stats["ticks"]} ticks, {stats["overruns"]} overruns, {stats["skipped"]} slots skipped, '
+          f'tick p95 {stats["p95_ms"]} ms')
+    return problems
+
+
+def check_pausing():
+    state = {'on': False, 'ticks': 0}
+
+    def tick():
+        state['ticks'] += 1
+
+    scheduler = TickScheduler(tick, interval=lambda: INTERVAL, enabled=lambda: state['on'])
+    scheduler.start()
+    time.sleep(0.3)
+    paused = state['ticks']
+    state['on'] = True
+    scheduler.wake()
+    time.sleep(0.3)
+    scheduler.stop(1)
+    problems = []
+    if paused:
+        problems.append(f'pausing: {paused} ticks while disabled')
+    if state['ticks'] < 4:
+        problems.append(f'pausing: only {state["ticks"]} ticks after enabling')
+    return problems
+
+
+def check_errors():
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError('boom')
+
+    original = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        stats = run_for(0.3, failing)
+    finally:
+        sys.stdout.close()
+        sys.stdout = original
+    if stats['errors'] != stats['ticks'] or stats['ticks'] < 4 or 'boom' not in (stats['last_error'] or ''):
+        return [f'errors: {stats["errors"]} errors for {stats["ticks"]} failing ticks']
+    return []
+
+
+def check_app(patients):
+    import app as mediflow
+    problems = []
+    client = mediflow.app.test_client()
+    rng = random.Random(5)
+    with mediflow.state_lock:
+        while len(mediflow.patient_registry) < patients:
+            pid = mediflow.patient_registry.next_id()
+            mediflow.patient_registry.add({
+                'id': pid, 'name': f'Patient {pid}', 'status': 'Waiting',
+                'stage': rng.choice(mediflow.STAGE_ORDER[:-1]),
+                'priority': rng.choices(['Low', 'Medium', 'High'], weights=[60, 30, 10])[0],
+                'waiting_time': rng.randint(0, 60),
+            })
+        mediflow.publish_changes()
+
+    mediflow.flow_mode['auto'] = True
+    version = mediflow.read_view['version']
+    for _ in range(20):
+        client.post('/api/advance')
+        client.get('/api/check-balance')
+    if mediflow.read_view['version'] != version:
+        problems.append('app: /api/advance or /api/check-balance changed the state')
+
+    mediflow.auto_config['tick_seconds'] = 0.2
+    client.post('/api/flow-mode', json={'auto': True})
+    time.sleep(1.1)
+    client.post('/api/flow-mode', json={'auto': False})
+    stats = client.get('/api/flow-scheduler').get_json()
+    advance = client.get('/api/advance').get_json()
+    if not 4 <= stats['ticks'] <= 6:
+        problems.append(f'app: {stats["ticks"]} scheduler ticks in 1.1s at 0.2s')
+    if mediflow.read_view['version'] == version or advance['tick'] != stats['ticks']:
+        problems.append('app: scheduler ticks did not move patients')
+    print(f'app       {stats["ticks"]} ticks over {patients} patients, tick mean {stats["mean_ms"]} ms, '
+          f'p95 {stats["p95_ms"]} ms, max {stats["max_ms"]} ms, {stats["overruns"]} overruns')
+    mediflow.flow_scheduler.stop(1)
+    return problems
+
+
+def main(patients=10_000):
+    problems = check_cadence() + check_overruns() + check_pausing() + check_errors() + check_app(patients)
+    for problem in problems:
+        print('FAIL', problem)
+    if not problems:
+        print('all scheduler checks passed')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
@@ -0,0 +1,257 @@
+"""Correctness and isolation check for site_router.py.
+
+Run from the repo root:
+
+    python benchmarks/check_sites.py [patients] [requests]
+
+Checks, with two sites (north, south) loaded in this process:
+
+* `/api/<site>/...` reaches that site only: writes at north leave south's
+  patients, state version and scheduler alone, unprefixed routes go to the
+  default site, and ids that would shadow an API route are refused,
+* `/api/sites/overview` equals the figures computed by scanning every
+  patient of both sites (counts, distribution, mean wait, and percentiles
+  overall and per stage / priority),
+* the rollup a site sends stays small when it holds `patients` patients
+  (20000 by default).
+
+Then runs both sites as child processes behind the router and checks the
+overview and a site's event stream through it. For both modes it reports
+the latency of south's patient list (`requests` requests, 300 by default)
+while idle and while north runs a burst of simulate calls; on a single CPU
+the processes still compete for the core. Exits non-zero on any failed
+check.
+"""
+import logging
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server  # noqa: E402
+from werkzeug.test import Client  # noqa: E402
+
+import site_router  # noqa: E402
+from wait_stats import WaitHistogram  # noqa: E402
+
+SITES = ['north', 'south']
+
+
+def grow(mediflow, n):
+    """Admit `n` patients spread over the stages (with waits of 0-90 min)."""
+    with mediflow.state_lock:
+        added = []
+        with mediflow.movement_log.cause('arrival'):
+            for i in range(n):
+                pid = mediflow.patient_registry.next_id()
+                added.append(mediflow.patient_registry.add(dict(
+                    mediflow.sample_patients[i % len(mediflow.sample_patients)], id=pid, name=f'Patient {pid}',
+                    stage=mediflow.STAGE_ORDER[i % len(mediflow.STAGE_ORDER)],
+                    priority=('Low', 'Medium', 'High')[i % 3], waiting_time=(i * 7) % 91)))
+        mediflow.publish_changes(added=added)
+
+
+def expected_overview(modules):
+    """Overview figures from scanning every patient of every site."""
+    waits = {}
+    distribution = {}
+    for module in modules.values():
+        for patient in list(module.patient_registry):
+            distribution[patient['stage']] = distribution.get(patient['stage'], 0) + 1
+            if patient['stage'] in module.wait_stats.exclude:
+                continue
+            for key in ('all', f'stage:{patient["stage"]}', f'priority:{patient["priority"]}'):
+                waits.setdefault(key, WaitHistogram()).add(patient.get('waiting_time') or 0)
+    return distribution, waits
+
+
+def check_local(modules, router):
+    problems = []
+    client = Client(router)
+    north, south = modules['north'], modules['south']
+    if north.state_lock is south.state_lock or north.response_cache is south.response_cache \
+            or north.flow_scheduler is south.flow_scheduler:
+        problems.append('isolation: sites share a lock, cache or scheduler')
+
+    south_before = client.get('/api/south/patients').get_json()
+    south_version = south.read_view['version']
+    for seed in range(3):
+        client.post('/api/north/simulate', json={'seed': seed})
+    client.post('/api/north/flow-mode', json={'auto': True})
+    if south.read_view['version'] != south_version or client.get('/api/south/patients').get_json() != south_before:
+        problems.append('isolation: writes at north changed south')
+    if client.get('/api/south/flow-mode').get_json()['auto']:
+        problems.append('isolation: auto flow switched on at south')
+    threads = {t.name for t in threading.enumerate()}
+    if 'flow-scheduler:north' not in threads or 'flow-scheduler:south' in threads:
+        problems.append(f'isolation: scheduler threads {sorted(t for t in threads if "flow" in t)}')
+    client.post('/api/north/flow-mode', json={'auto': False})
+    if client.get('/api/overview').get_json() != client.get('/api/north/overview').get_json():
+        problems.append('routing: unprefixed /api/overview is not the default site')
+    if client.get('/api/sites').get_json()['sites'] != SITES:
+        problems.append('routing: /api/sites does not list the sites')
+    for bad in ('patients', 'sites', 'North', 'a/b'):
+        try:
+            site_router.check_sites([bad], site_router.api_names(north.app))
+            problems.append(f'routing: site id {bad!r} accepted')
+        except ValueError:
+            pass
+
+    client.post('/api/south/simulate', json={'seed': 9})
+    problems += check_overview(client, modules)
+    return problems
+
+
+def check_overview(client, modules):
+    problems = []
+    overview = client.get('/api/sites/overview').get_json()
+    distribution, waits = expected_overview(modules)
+    if overview['unavailable']:
+        problems.append(f'overview: unavailable sites {overview["unavailable"]}')
+    if overview['patient_distribution'] != {s: distribution.get(s, 0) for s in overview['patient_distribution']} \
+            or sum(overview['patient_distribution'].values()) != sum(distribution.values()):
+        problems.append('overview: distribution differs from a scan of all patients')
+    if overview['total_patients'] != sum(len(m.patient_registry) for m in modules.values()):
+        problems.append('overview: total_patients is not the sum over sites')
+    if overview['avg_wait_time'] != round(waits['all'].mean() or 0, 1):
+        problems.append(f'overview: mean wait {overview["avg_wait_time"]} != {round(waits["all"].mean(), 1)}')
+    expected = {'all': waits['all'].summary(),
+                'by_stage': {k[6:]: h.summary() for k, h in waits.items() if k.startswith('stage:')},
+                'by_priority': {k[9:]: h.summary() for k, h in waits.items() if k.startswith('priority:')}}
+    got = overview['wait_times']
+    if got['all'] != expected['all']:
+        problems.append(f'overview: wait summary {got["all"]} != {expected["all"]}')
+    for kind in ('by_stage', 'by_priority'):
+        nonempty = {k: v for k, v in got[kind].items() if v['count']}
+        if nonempty != expected[kind]:
+            problems.append(f'overview: {kind} wait summaries differ from a scan')
+    return problems
+
+
+def check_rollup_size(modules, client, patients):
+    before = len(client.get('/api/north/rollup').get_data())
+    grow(modules['north'], patients)
+    after = len(client.get('/api/north/rollup').get_data())
+    print(f'rollup of north: {before} bytes, {after} bytes with {patients} more patients')
+    problems = check_overview(client, modules)
+    if after > max(4 * before, 20_000):
+        problems.append(f'rollup: grew from {before} to {after} bytes with the patient count')
+    return problems
+
+
+def latency(client, requests, burst=None):
+    """p50/p95 ms of south's patient list, optionally while `burst()` runs."""
+    stop = threading.Event()
+    thread = None
+
+    def run_burst():
+        i = 0
+        while not stop.is_set():
+            burst(i)
+            i += 1
+
+    if burst is not None:
+        thread = threading.Thread(target=run_burst)
+        thread.start()
+    times = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get('/api/south/patients?limit=50').get_data()
+        times.append((time.perf_counter() - start) * 1000)
+    stop.set()
+    if thread is not None:
+        thread.join()
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95)]
+
+
+def report_latency(mode, client, requests):
+    client.get('/api/south/patients?limit=50')
+    idle = latency(client, requests)
+    busy = latency(client, requests, lambda i: client.post('/api/north/simulate', json={'seed': i}))
+    print(f'{mode:>9}: south p50/p95 {idle[0]:.2f}/{idle[1]:.2f} ms idle, '
+          f'{busy[0]:.2f}/{busy[1]:.2f} ms during a north simulate burst')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def read_event(port, path, trigger, timeout=10):
+    """Open the SSE stream at `path`, call `trigger()` and return the first
+    event name received after it (None on timeout)."""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    try:
+        sock.sendall(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        data = b''
+        while b'\r\n\r\n' not in data:
+            data += sock.recv(4096)
+        trigger()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for line in data.split(b'\n'):
+                if line.startswith(b'event: ') and line != b'event: hello':
+                    return line[7:].decode().strip()
+            data = data.split(b'\r\n\r\n', 1)[-1] + sock.recv(4096)
+        return None
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+
+def check_processes(requests):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    problems = []
+    children = {}
+    try:
+        router, children = site_router.process_router(SITES, '127.0.0.1', free_port(), quiet=True)
+        ports = [port for _, port in children.values()]
+        if len(set(ports)) != len(ports):
+            problems.append('processes: sites share a port')
+        server = make_server('127.0.0.1', 0, router, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = Client(router)
+        client.post('/api/north/simulate', json={'seed': 1})
+        direct = {site: site_router.fetch_json(proxy, '/api/rollup') for site, proxy in router.sites.items()}
+        overview = client.get('/api/sites/overview').get_json()
+        expected = site_router.merge_rollups(direct)
+        if {k: v for k, v in overview.items() if k != 'unavailable'} != expected:
+            problems.append('processes: overview through the router differs from the merged rollups')
+        if direct['north']['site'] != 'north' or direct['south']['site'] != 'south':
+            problems.append('processes: a site answered for another')
+        event = read_event(server.server_port, '/api/south/stream',
+                           lambda: client.post('/api/south/simulate', json={'seed': 2}))
+        if event is None:
+            problems.append('processes: no event from the south stream through the router')
+        report_latency('processes', client, requests)
+        server.shutdown()
+    except RuntimeError as e:
+        problems.append(f'processes: {e}')
+    finally:
+        site_router.stop_site_processes(children)
+    return problems
+
+
+def main(patients=20000, requests=300):
+    router, modules = site_router.local_router(SITES)
+    client = Client(router)
+    problems = check_local(modules, router)
+    problems += check_rollup_size(modules, client, patients)
+    report_latency('local', client, requests)
+    problems += check_processes(requests)
+    for problem in problems:
+        print('FAIL', problem)
+    if not problems:
+        print('all site checks passed')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:3])))
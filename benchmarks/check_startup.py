@@ -0,0 +1,99 @@
+"""Import-time and memory budget check for the app modules.
+
+Run from the repo root:
+
+    python benchmarks/check_startup.py [runs]
+
+Imports each app module in a fresh interpreter under `python -X importtime`
+(best of `runs`, 3 by default) and checks that:
+
+* the import finishes within its time budget,
+* peak RSS stays within its memory budget,
+* none of the modules that must load lazily has been executed.
+
+It also prints the slowest imports by cumulative time. A module whose own
+dependencies are not installed is reported and skipped. Exits non-zero if
+any budget is exceeded.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module: (seconds, peak RSS in MB, modules that must not be loaded at import)
+BUDGETS = {
+    'app': (0.5, 48, ('numpy',)),
+    'app_clean': (0.6, 64, ('numpy', 'pandas', 'sklearn', 'reportlab.platypus', 'openpyxl')),
+}
+
+PROBE = '''
+import json, resource, sys, time, types
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [m for m in {lazy!r} if type(sys.modules.get(m)) is types.ModuleType]
+try:
+    # peak RSS of this program only; on Linux ru_maxrss also counts the
+    # parent's memory from before exec
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'rss_mb': rss_kb / 1024, 'loaded': loaded}}))
+'''
+
+
+def probe(module, lazy):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module, lazy=lazy)],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode:
+        return None, result.stderr.strip().splitlines()[-1]
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                depth = (len(name) - len(name.lstrip()) - 1) // 2
+                imports.append((int(cumulative), depth, name.strip()))
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats['imports'] = imports
+    return stats, None
+
+
+def main(runs=3):
+    failed = False
+    for module, (seconds, rss_mb, lazy) in BUDGETS.items():
+        best = None
+        for _ in range(runs):
+            stats, error = probe(module, lazy)
+            if error:
+                break
+            if best is None or stats['seconds'] < best['seconds']:
+                best = stats
+        if best is None:
+            print(f'skip {module}: {error}')
+            continue
+
+        problems = []
+        if best['seconds'] > seconds:
+            problems.append(f'import took {best["seconds"]:.2f}s (budget {seconds}s)')
+        if best['rss_mb'] > rss_mb:
+            problems.append(f'peak RSS {best["rss_mb"]:.0f} MB (budget {rss_mb} MB)')
+        if best['loaded']:
+            problems.append(f'loaded at import: {", ".join(best["loaded"])}')
+        failed |= bool(problems)
+
+        print(f'{"FAIL" if problems else "ok":4} {module:10} {best["seconds"] * 1000:6.0f} ms  '
+              f'{best["rss_mb"]:5.0f} MB peak RSS')
+        for problem in problems:
+            print(f'       {problem}')
+        # the module's direct imports (one level of indent in -X importtime)
+        slowest = sorted((us, name) for us, depth, name in best['imports'] if depth == 1)[::-1][:6]
+        print('       slowest: ' + ', '.join(f'{name} {us / 1000:.0f} ms' for us, name in slowest))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
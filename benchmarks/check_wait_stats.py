@@ -0,0 +1,176 @@
+"""Accuracy check of the streaming wait-time histograms against exact stats.
+
+Run from the repo root:
+
+    python benchmarks/check_wait_stats.py [samples] [seed]
+
+Checks, each against exact nearest-rank percentiles of the raw values:
+
+* WaitHistogram on several wait distributions (mean, min, max, p50, p90,
+  p99, p99.9), before and after removing a random half of the values,
+* WaitStats fed by a PatientRegistry under random adds/moves/removals,
+  overall and per stage and priority,
+* SlidingHistogram windows against the completed waits in the window.
+
+Every value must be within the histogram's stated precision (relative
+2**-(precision_bits - 1), or one unit). Exits non-zero on any miss and also
+times updates and percentile reads against sorting the values.
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patient_store import PatientRegistry  # noqa: E402
+from wait_stats import SlidingHistogram, WaitHistogram, WaitStats  # noqa: E402
+
+STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+PERCENTILES = (50, 90, 99, 99.9)
+
+DISTRIBUTIONS = {
+    'whole minutes 0-120': lambda rng: rng.randint(0, 120),
+    'exponential mean 20': lambda rng: rng.expovariate(1 / 20),
+    'lognormal': lambda rng: rng.lognormvariate(2.5, 1.0),
+    'pareto tail': lambda rng: 5 * rng.paretovariate(1.5),
+}
+
+
+def exact(values, qs=PERCENTILES):
+    ordered = sorted(values)
+    result = {q: ordered[max(1, math.ceil(q * len(ordered) / 100)) - 1] for q in qs}
+    result.update(min=ordered[0], max=ordered[-1], mean=sum(ordered) / len(ordered))
+    return result
+
+
+def estimated(histogram, qs=PERCENTILES):
+    result = histogram.percentiles(qs)
+    result.update(min=histogram.min(), max=histogram.max(), mean=histogram.mean())
+    return result
+
+
+def misses(name, histogram, values):
+    tolerance = 2.0 ** -(histogram.precision_bits - 1)
+    want, got = exact(values), estimated(histogram)
+    problems = []
+    for key, value in want.items():
+        if abs(got[key] - value) > max(tolerance * abs(value), histogram.unit):
+            problems.append(f'{name} {key}: exact {value:.4f}, histogram {got[key]:.4f}')
+    return problems
+
+
+def worst_error(histogram, values):
+    # relative error of the stats of at least a minute (below that the
+    # one-unit absolute bound is what applies)
+    want, got = exact(values), estimated(histogram)
+    return max(abs(got[k] - v) / v for k, v in want.items() if v >= 1)
+
+
+def check_distributions(n, rng):
+    problems = []
+    for name, draw in DISTRIBUTIONS.items():
+        values = [draw(rng) for _ in range(n)]
+        histogram = WaitHistogram()
+        for v in values:
+            histogram.add(v)
+        problems += misses(name, histogram, values)
+        error = worst_error(histogram, values)
+
+        rng.shuffle(values)
+        for v in values[n // 2:]:
+            histogram.remove(v)
+        problems += misses(f'{name} (half removed)', histogram, values[:n // 2])
+        print(f'{name:22} {len(histogram.buckets):5} buckets, worst relative error {error:.3%} (>= 1 min)')
+    return problems
+
+
+def check_registry(rounds, rng):
+    registry = PatientRegistry(STAGES)
+    stats = WaitStats(exclude=('Discharge',))
+    registry.add_listener(stats.listener)
+    problems = []
+    for _ in range(rounds):
+        for _ in range(rng.randint(1, 300)):
+            op = rng.random()
+            if op < 0.4 or not len(registry):
+                pid = registry.next_id()
+                registry.add({'id': pid, 'stage': rng.choice(STAGES), 'priority': rng.choice(['Low', 'Medium', 'High']),
+                              'waiting_time': rng.randint(0, 90)})
+                continue
+            pid = rng.randint(1, registry.next_id())
+            if pid not in registry:
+                continue
+            if op < 0.8:
+                registry.move(pid, rng.choice(STAGES), waiting_time=rng.uniform(0, 90))
+            elif op < 0.9:
+                registry.set_waiting_time(pid, rng.randint(0, 90))
+            else:
+                registry.remove(pid)
+
+        groups = {}
+        for p in registry:
+            if p['stage'] in stats.exclude:
+                continue
+            for key in ('all', f'stage:{p["stage"]}', f'priority:{p["priority"]}'):
+                groups.setdefault(key, []).append(p['waiting_time'])
+        for key, values in groups.items():
+            problems += misses(key, stats.current[key], values)
+        if problems:
+            break
+    print(f'registry: {len(registry)} patients, {len(groups)} groups consistent' if not problems else 'registry: MISMATCH')
+    return problems
+
+
+def check_windows(n, rng):
+    now = [1_700_000_000.0]
+    window = SlidingHistogram(span=4 * 3600, clock=lambda: now[0])
+    completed = []
+    for _ in range(n):
+        now[0] += rng.expovariate(1 / 0.5)  # a completed wait every ~0.5 s
+        wait = rng.expovariate(1 / 15)
+        window.add(wait)
+        completed.append((now[0], wait))
+    problems = []
+    for minutes in (1, 15, 60, 240):
+        start = (int(now[0] // 60) - minutes + 1) * 60  # whole one-minute slots
+        values = [w for ts, w in completed if ts >= start]
+        merged = window.window(minutes * 60)
+        if merged.count != len(values):
+            problems.append(f'{minutes} min window holds {merged.count} waits, expected {len(values)}')
+        else:
+            problems += misses(f'{minutes} min window', merged, values)
+    print(f'windows: {n} completed waits over {(completed[-1][0] - completed[0][0]) / 3600:.1f} h checked')
+    return problems
+
+
+def timings(n, rng):
+    values = [rng.expovariate(1 / 20) for _ in range(n)]
+    histogram = WaitHistogram()
+    start = time.perf_counter()
+    for v in values:
+        histogram.add(v)
+    add_us = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for _ in range(100):
+        histogram.summary()
+    summary_ms = (time.perf_counter() - start) / 100 * 1000
+    start = time.perf_counter()
+    for _ in range(10):
+        exact(values)
+    exact_ms = (time.perf_counter() - start) / 10 * 1000
+    print(f'\n{n} waits: add {add_us:.2f} us, summary {summary_ms:.2f} ms, exact sort {exact_ms:.1f} ms')
+
+
+def main(n=100_000, seed=1):
+    rng = random.Random(seed)
+    problems = check_distributions(n, rng) + check_registry(100, rng) + check_windows(n, rng)
+    for problem in problems:
+        print('MISS', problem)
+    timings(n, rng)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:3])))
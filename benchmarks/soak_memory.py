@@ -0,0 +1,117 @@
+"""Soak test: memory of a long-running app.py over a simulated week.
+
+Run from the repo root:
+
+    python benchmarks/soak_memory.py [days] [retention_hours] [arrivals]
+
+Runs app.py's state on a simulated clock in 30-minute slots. Each slot
+calls /api/simulate and admits `arrivals` more patients (200 by default),
+moves every patient in care one stage forward (so a patient reaches
+Discharge after 7 slots), runs one auto-flow tick, and reads the patient
+list and dashboard the way the pages do. Discharged patients are archived
+after `retention_hours` (4 by default; 0 keeps them, to show the growth
+without eviction).
+
+Prints patients, discharged patients awaiting archiving, archived patients,
+movement log size and RSS at the end of every simulated day. The movement
+log is capped by event count (`max_events`), not by time, so it may still
+be filling up within a week; it is reported on its own and left out of the
+RSS comparison. Exits non-zero if, after the first day, the patient count
+or the RSS excluding the log grows by more than 10% (and 8 MB).
+"""
+import gc
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as mediflow  # noqa: E402
+
+SLOT_SECONDS = 30 * 60
+STAGES = mediflow.STAGE_ORDER
+
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def admit(n, rng):
+    with mediflow.state_lock:
+        added = []
+        with mediflow.movement_log.cause('arrival'):
+            for _ in range(n):
+                pid = mediflow.patient_registry.next_id()
+                added.append(mediflow.patient_registry.add(dict(
+                    rng.choice(mediflow.sample_patients), id=pid, name=f'Patient {pid}', stage='Reception',
+                    status='Waiting', priority=rng.choices(['Low', 'Medium', 'High'], weights=[60, 30, 10])[0],
+                    waiting_time=rng.randint(0, 60))))
+        mediflow.publish_changes(added=added)
+
+
+def move_everyone(rng):
+    """Move every patient in care one stage forward, downstream first."""
+    with mediflow.state_lock:
+        moved = []
+        with mediflow.movement_log.cause('advance'):
+            for i in range(len(STAGES) - 2, -1, -1):
+                for patient in mediflow.patient_registry.in_stage(STAGES[i]):
+                    mediflow.patient_registry.move(patient['id'], STAGES[i + 1], waiting_time=rng.randint(0, 60))
+                    moved.append({'id': patient['id'], 'from': STAGES[i], 'to': STAGES[i + 1]})
+        mediflow.publish_changes(moved=moved)
+
+
+def main(days=7, retention_hours=4, arrivals=200):
+    rng = random.Random(3)
+    client = mediflow.app.test_client()
+    now = [time.time()]
+    clock = lambda: now[0]  # noqa: E731
+    for component in (mediflow.lifecycle, mediflow.movement_log, mediflow.wait_stats, mediflow.alert_engine):
+        component.clock = clock
+    mediflow.lifecycle.retention = retention_hours * 3600
+    mediflow.lifecycle.sync(mediflow.patient_registry)
+    mediflow.flow_mode['auto'] = True
+
+    print(f"{'day':>4} {'patients':>9} {'retained':>9} {'archived':>9} {'log MB':>8} {'RSS MB':>8} "
+          f"{'RSS-log':>8} {'slot ms':>8}")
+    rows = []
+    version = mediflow.read_view['version']
+    started = time.perf_counter()
+    for day in range(1, days + 1):
+        slot_start = time.perf_counter()
+        for _ in range(24 * 3600 // SLOT_SECONDS):
+            now[0] += SLOT_SECONDS
+            client.post('/api/simulate', json={'seed': rng.randrange(1 << 30)})
+            admit(arrivals, rng)
+            move_everyone(rng)
+            mediflow.flow_tick()
+            version = client.get(f'/api/patients?since={version}').get_json()['version']
+            client.get('/api/dashboard-snapshot').get_data()
+        slot_ms = (time.perf_counter() - slot_start) / (24 * 3600 // SLOT_SECONDS) * 1000
+        gc.collect()
+        log_bytes = mediflow.movement_log.nbytes()
+        row = (day, len(mediflow.patient_registry), len(mediflow.lifecycle), mediflow.lifecycle.stats['archived'],
+               log_bytes, rss(), rss() - log_bytes)
+        rows.append(row)
+        print(f'{day:4} {row[1]:9} {row[2]:9} {row[3]:9} {log_bytes / 1e6:8.1f} {row[5] / 1e6:8.1f} '
+              f'{row[6] / 1e6:8.1f} {slot_ms:8.1f}')
+    print(f'{days} simulated days in {time.perf_counter() - started:.1f}s')
+
+    problems = []
+    if retention_hours and len(rows) > 1:
+        first, last = rows[0], rows[-1]
+        max_patients = max(r[1] for r in rows)
+        if max_patients > first[1] * 1.1 + 100:
+            problems.append(f'patients grew from {first[1]} to {max_patients}')
+        if last[6] > first[6] * 1.1 + 8e6:
+            problems.append(f'RSS excluding the movement log grew from {first[6] / 1e6:.1f} MB '
+                            f'to {last[6] / 1e6:.1f} MB')
+    for problem in problems:
+        print('FAIL', problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:4])))
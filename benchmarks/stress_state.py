@@ -0,0 +1,142 @@
+"""Concurrent stress test for the shared in-memory state.
+
+Run from the repo root:
+
+    python benchmarks/stress_state.py [requests] [threads]
+
+Fires a mix of reads and writes (manual moves, simulate, reset, config and
+flow-mode changes, reads of the advance/balance results) from many threads
+through Flask test clients while the auto-flow scheduler ticks every few
+milliseconds, with a tiny GIL switch interval to force interleavings, then
+checks:
+
+* no request failed with a 5xx,
+* the registry indexes agree with the patient records,
+* the published distribution matches the registry,
+* the active alerts equal a from-scratch re-evaluation of the rules,
+* replaying the movement log gives the same stages as the registry,
+* with MEDIFLOW_DB set, the database rows match the in-memory patients and
+  every archived patient has an archive row.
+
+Discharged patients are archived after 50 ms instead of hours, so removals
+race with the reads and moves as well.
+
+Exits non-zero on any violation.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as mediflow  # noqa: E402
+
+READS = ['/api/overview', '/api/patient-distribution', '/api/patients', '/api/alerts',
+         '/api/dashboard-snapshot', '/api/wait-times', '/api/doctors', '/api/flow-mode']
+STAGES = mediflow.STAGE_ORDER
+
+
+def one_request(client, rng):
+    op = rng.random()
+    if op < 0.55:
+        return client.get(rng.choice(READS))
+    if op < 0.70:
+        return client.post('/api/advance')
+    if op < 0.82:
+        return client.post('/api/move-patient', json={'id': rng.randint(1, 400), 'to_stage': rng.choice(STAGES)})
+    if op < 0.92:
+        return client.post('/api/simulate', json={'seed': rng.randint(0, 10_000)})
+    if op < 0.97:
+        return client.get('/api/check-balance')
+    if op < 0.985:
+        return client.post('/api/auto-config', json={'crowd_threshold': rng.randint(3, 20)})
+    if op < 0.995:
+        return client.post('/api/flow-mode', json={'auto': rng.random() < 0.8})
+    return client.post('/api/reset')
+
+
+def worker(seed, count, failures):
+    rng = random.Random(seed)
+    client = mediflow.app.test_client()
+    for _ in range(count):
+        try:
+            response = one_request(client, rng)
+            if response.status_code >= 500:
+                failures.append(f'{response.request.path}: {response.status_code}')
+            response.close()
+        except Exception as e:  # noqa: BLE001 - any crash is a finding
+            failures.append(repr(e))
+
+
+def archived_rows():
+    conn = mediflow.patient_db.pool.connection()
+    return conn.execute('SELECT COUNT(*) FROM archived_patients').fetchone()[0]
+
+
+def check_invariants(archived_before):
+    problems = list(mediflow.patient_registry.check_consistency())
+
+    distribution = mediflow.app.test_client().get('/api/patient-distribution').json
+    if sum(distribution['data']) != len(mediflow.patient_registry):
+        problems.append(f'distribution sums to {sum(distribution["data"])}, '
+                        f'registry holds {len(mediflow.patient_registry)}')
+
+    logged = mediflow.movement_log.state_at()
+    if logged != {p['id']: p['stage'] for p in mediflow.patient_registry}:
+        problems.append('movement log replay does not match the registry')
+
+    if mediflow.patient_db is not None:
+        stored = {p['id']: (p['stage'], p['waiting_time']) for p in mediflow.patient_db.load_patients()}
+        memory = {p['id']: (p['stage'], p['waiting_time']) for p in mediflow.patient_registry}
+        if stored != memory:
+            problems.append(f'database out of sync: {len(set(stored.items()) ^ set(memory.items()))} rows differ')
+        if archived_rows() - archived_before != mediflow.lifecycle.stats['archived']:
+            problems.append(f'{archived_rows() - archived_before} archive rows written for '
+                            f'{mediflow.lifecycle.stats["archived"]} archived patients')
+
+    live = {a['id']: a['message'] for a in mediflow.alert_engine.top(len(mediflow.alert_engine))}
+    mediflow.rebuild_alerts()
+    rebuilt = {a['id']: a['message'] for a in mediflow.alert_engine.top(len(mediflow.alert_engine))}
+    if live != rebuilt:
+        problems.append(f'alerts drifted: {sorted(set(live.items()) ^ set(rebuilt.items()))[:5]}')
+    return problems
+
+
+def main(total=4000, threads=16):
+    mediflow.flow_mode['auto'] = True
+    mediflow.auto_config['tick_seconds'] = 0.005
+    mediflow.flow_scheduler.ensure_started()
+    mediflow.lifecycle.retention = 0.05
+    archived_before = archived_rows() if mediflow.patient_db is not None else 0
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    failures = []
+    start = time.perf_counter()
+    try:
+        per_thread = total // threads
+        with ThreadPoolExecutor(threads) as pool:
+            for i in range(threads):
+                pool.submit(worker, i, per_thread, failures)
+    finally:
+        sys.setswitchinterval(old_interval)
+        mediflow.flow_scheduler.stop()
+    elapsed = time.perf_counter() - start
+    ticks = mediflow.flow_scheduler.stats()
+
+    problems = check_invariants(archived_before)
+    print(f'{per_thread * threads} requests on {threads} threads in {elapsed:.1f}s, '
+          f'{len(mediflow.patient_registry)} patients ({mediflow.lifecycle.stats["archived"]} archived), '
+          f'{threading.active_count()} threads alive, '
+          f'{ticks["ticks"]} scheduler ticks ({ticks["errors"]} failed)')
+    if ticks['errors']:
+        problems.append(f'scheduler tick failed: {ticks["last_error"]}')
+    for line in (failures[:10] + problems):
+        print('FAIL', line)
+    return 1 if failures or problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(a) for a in sys.argv[1:3])))
@@ -0,0 +1,563 @@
+"""Benchmark suite for the API: per-route and per-function timings at scale,
+a concurrent load generator, and a regression check against a baseline.
+
+Run from the repo root:
+
+    python benchmarks/suite.py run [--sizes 100,10000,100000] [--budget 0.5] [--out FILE]
+    python benchmarks/suite.py load [--patients 10000] [--seconds 20] [--tabs 20] [--writers 2] [--out FILE]
+    python benchmarks/suite.py compare BASELINE RESULTS [--threshold 0.25] [--min-ms 0.05]
+
+run: resets app.py's state and grows it from `sample_patients` to each
+size. At each size it times every /api route through the Flask test client
+and the flow functions (`advance_patients`, `auto_balance`, `flow_tick`,
+`generate_alerts`, `publish_changes`) under the state lock. Each case is
+repeated for about `--budget` seconds. Cached routes are timed warm and,
+as "(cold)", with the response cache cleared before every request. Any
+/api route without a case (and not in SKIPPED) is reported, so a new route
+cannot go unmeasured.
+
+load: serves app.py from a threaded werkzeug server on a local port. Virtual
+browser tabs poll it the way the pages do: the dashboard revalidates
+/api/dashboard-snapshot with its ETag, the patients page pages through the
+list once and then asks for `since=` changes, the analytics page reloads
+/api/analytics. The polling intervals are divided by `--speedup`. Writers
+move patients, simulate, and save the auto-flow config. Live-stream
+subscribers stay connected the whole time, and the auto-flow scheduler ticks
+every second. Reports latency percentiles per request kind and the overall
+throughput.
+
+compare: flags entries whose median (or, for load runs, throughput) got
+worse by more than `--threshold` (a fraction), and any new errors. Changes
+smaller than `--min-ms` are ignored. Exits 1 on any regression.
+
+Results are JSON: {"meta": {...}, "results": {"<mode>/<size>/<case>":
+{...}}}. By default `run` and `load` write them to benchmarks/results/.
+Keep one baseline per machine. Timings from different machines, or from
+runs with different `--budget`, are not comparable.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.client import HTTPConnection
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# /api routes the suite does not time, with the reason
+SKIPPED = {
+    '/api/stream': 'long-lived event stream; held open by the load generator',
+    '/api/admin/profile': 'admin only; arms the profiler',
+    '/api/simulation/run': 'independent of the live patients; see bench_flow_sim.py',
+    '/api/scenarios/sweep': 'process pool sweep; see bench_scenarios.py',
+}
+
+# Page scripts' polling intervals in seconds (dashboard.js, patients.js, analytics.js)
+POLL_SECONDS = {'dashboard': 30, 'patients': 10, 'analytics': 300}
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples):
+    """Timing stats in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'median_ms': round(_percentile(ordered, 0.5) * 1000, 4),
+        'p95_ms': round(_percentile(ordered, 0.95) * 1000, 4),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4),
+    }
+
+
+def measure(fn, budget, min_runs=3, max_runs=2000):
+    """Call `fn` repeatedly for about `budget` seconds."""
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < min_runs or (len(samples) < max_runs and time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def meta(mode, args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        import orjson  # noqa: F401
+        encoder = 'orjson'
+    except ImportError:
+        encoder = 'json'
+    return {
+        'mode': mode,
+        'args': {k: v for k, v in vars(args).items() if k not in ('func', 'out')},
+        'commit': commit,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'encoder': encoder,
+    }
+
+
+def write_results(path, mode, args, results):
+    data = {'meta': meta(mode, args), 'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    print(f'results written to {path}')
+
+
+# -- run ----------------------------------------------------------------------
+
+def seed(mediflow, client, n, rng):
+    """Reset the app, then grow it to `n` patients modelled on `sample_patients`."""
+    client.post('/api/reset')
+    with mediflow.state_lock:
+        while len(mediflow.patient_registry) < n:
+            pid = mediflow.patient_registry.next_id()
+            patient = dict(rng.choice(mediflow.sample_patients), id=pid, name=f'Patient {pid}')
+            patient.update({
+                'stage': rng.choice(mediflow.STAGE_ORDER),
+                'priority': rng.choices(['Low', 'Medium', 'High'], weights=[60, 30, 10])[0],
+                'doctor_id': rng.randint(1, 6),
+                'entry_time': f'{rng.randint(7, 18):02}:{rng.randint(0, 59):02}',
+                'waiting_time': rng.randint(0, 120),
+            })
+            with mediflow.movement_log.cause('arrival'):
+                mediflow.patient_registry.add(patient)
+        mediflow.publish_changes()
+
+
+def case(name, url, method='GET', body=None, headers=None, cold=False):
+    """One timed request. `url`, `body` and `headers` may be callables,
+    evaluated before every request. `cold` adds a run with the response
+    cache cleared before every request."""
+    return {'name': name, 'url': url, 'method': method, 'body': body, 'headers': headers, 'cold': cold}
+
+
+def route_cases(mediflow, n, rng):
+    version = mediflow.read_view['version']
+    first = mediflow.app.test_client().get('/api/patients?limit=100&sort=waiting_time&order=desc').get_json()
+    cursor = quote(first['next_cursor'] or '')
+    return [
+        case('GET /api/overview', '/api/overview', cold=True),
+        case('GET /api/patient-distribution', '/api/patient-distribution', cold=True),
+        case('GET /api/dashboard-snapshot', '/api/dashboard-snapshot', cold=True),
+        case('GET /api/dashboard-snapshot (304)', '/api/dashboard-snapshot',
+             headers=lambda: {'If-None-Match': f'"v{mediflow.read_view["version"]}"'}),
+        case('GET /api/patients', '/api/patients'),
+        case('GET /api/patients?limit=100', '/api/patients?limit=100&sort=waiting_time&order=desc'),
+        case('GET /api/patients?cursor', f'/api/patients?limit=100&sort=waiting_time&order=desc&cursor={cursor}'),
+        case('GET /api/patients?stage&priority', '/api/patients?limit=100&stage=Reception&priority=High&sort=entry_time'),
+        case('GET /api/patients?since', f'/api/patients?since={version}'),
+        case('GET /api/alerts', '/api/alerts'),
+        case('GET /api/alert-config', '/api/alert-config'),
+        case('GET /api/wait-times', '/api/wait-times'),
+        case('GET /api/rollup', '/api/rollup', cold=True),
+        case('GET /api/analytics', '/api/analytics'),
+        case('GET /api/staff', '/api/staff', cold=True),
+        case('GET /api/doctors', '/api/doctors'),
+        case('GET /api/resources', '/api/resources'),
+        case('GET /api/flow-mode', '/api/flow-mode'),
+        case('GET /api/auto-config', '/api/auto-config'),
+        case('GET /api/advance', '/api/advance'),
+        case('GET /api/check-balance', '/api/check-balance'),
+        case('GET /api/flow-scheduler', '/api/flow-scheduler'),
+        case('GET /api/cache-stats', '/api/cache-stats'),
+        case('GET /api/history/distribution', '/api/history/distribution?minutes=60&step=5'),
+        case('GET /api/history/flow', '/api/history/flow?minutes=60&step=5'),
+        case('GET /api/history/events', '/api/history/events?limit=500'),
+        case('GET /metrics', '/metrics'),
+        case('POST /api/move-patient', '/api/move-patient', 'POST',
+             lambda: {'id': rng.randint(1, n), 'to_stage': rng.choice(mediflow.STAGE_ORDER)}),
+        case('POST /api/simulate', '/api/simulate', 'POST', lambda: {'seed': rng.randrange(1 << 30)}),
+        case('POST /api/flow-mode', '/api/flow-mode', 'POST', {'auto': False}),
+        case('POST /api/advance', '/api/advance', 'POST'),
+        case('POST /api/auto-config', '/api/auto-config', 'POST', {'crowd_threshold': 40}),
+        case('POST /api/alert-config', '/api/alert-config', 'POST', {}),
+    ]
+
+
+def case_routes(cases):
+    """URL rules the cases exercise."""
+    return {c['url'].split('?')[0] for c in cases if isinstance(c['url'], str)}
+
+
+def _value(v):
+    return v() if callable(v) else v
+
+
+def time_route(mediflow, client, c, budget, cold=False):
+    sizes, errors = [], []
+
+    def one():
+        if cold:
+            mediflow.response_cache.clear()
+        response = client.open(_value(c['url']), method=c['method'], json=_value(c['body']),
+                               headers=_value(c['headers']))
+        sizes.append(len(response.get_data()))
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+
+    stats = measure(one, budget)
+    stats['bytes'] = sizes[-1]
+    if errors:
+        stats['errors'] = len(errors)
+    return stats
+
+
+def time_functions(mediflow, budget):
+    def locked(fn):
+        def call():
+            with mediflow.state_lock:
+                fn()
+        return call
+
+    def tick():
+        mediflow.flow_mode['auto'] = True
+        try:
+            mediflow.flow_tick()
+        finally:
+            mediflow.flow_mode['auto'] = False
+
+    functions = {
+        'advance_patients': mediflow.advance_patients,
+        'auto_balance': mediflow.auto_balance,
+        'flow_tick': tick,
+        'generate_alerts': mediflow.generate_alerts,
+        'publish_changes': mediflow.publish_changes,
+    }
+    results = {name: measure(locked(fn), budget, max_runs=200) for name, fn in functions.items()}
+    with mediflow.state_lock:
+        mediflow.publish_changes()
+    return results
+
+
+def run(args):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    import app as mediflow
+    client = mediflow.app.test_client()
+    rng = random.Random(args.seed)
+    results, problems = {}, []
+
+    api_routes = {r.rule for r in mediflow.app.url_map.iter_rules() if r.rule.startswith('/api/')}
+    mediflow.flow_mode['auto'] = False
+    print(f"{'case':<40} " + ' '.join(f'{n:>12}' for n in args.sizes))
+    rows = {}
+    for n in args.sizes:
+        start = time.perf_counter()
+        seed(mediflow, client, n, rng)
+        rows.setdefault('(seed)', {})[n] = time.perf_counter() - start
+        cases = route_cases(mediflow, n, rng)
+        for c in cases:
+            for cold in (False, True) if c['cold'] else (False,):
+                name = c['name'] + (' (cold)' if cold else '')
+                stats = time_route(mediflow, client, c, args.budget, cold)
+                results[f'routes/{n}/{name}'] = stats
+                rows.setdefault(name, {})[n] = stats['median_ms'] / 1000
+                if stats.get('errors'):
+                    problems.append(f'{name} at {n} patients: {stats["errors"]} error responses')
+        for name, stats in time_functions(mediflow, args.budget).items():
+            results[f'functions/{n}/{name}'] = stats
+            rows.setdefault(name + '()', {})[n] = stats['median_ms'] / 1000
+        start = time.perf_counter()
+        client.post('/api/reset')
+        results[f'routes/{n}/POST /api/reset'] = summarize([time.perf_counter() - start])
+        rows.setdefault('POST /api/reset', {})[n] = time.perf_counter() - start
+    for name, by_size in rows.items():
+        print(f'{name:<40} ' + ' '.join(f'{by_size[n] * 1000:10.3f}ms' for n in args.sizes))
+
+    uncovered = sorted(api_routes - case_routes(cases) - {'/api/reset'} - set(SKIPPED))
+    for rule in uncovered:
+        problems.append(f'{rule} has no benchmark case (add one to route_cases or SKIPPED)')
+    for problem in problems:
+        print('FAIL', problem)
+    write_results(args.out or os.path.join(RESULTS_DIR, 'run.json'), 'run', args, results)
+    return 1 if problems else 0
+
+
+# -- load ---------------------------------------------------------------------
+
+class Client:
+    """One virtual browser tab: a keep-nothing HTTP client that records the
+    latency of each request under a name."""
+
+    def __init__(self, port, timings, errors):
+        self.port = port
+        self.timings = timings
+        self.errors = errors
+
+    def request(self, name, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            conn = HTTPConnection('127.0.0.1', self.port, timeout=30)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            finally:
+                conn.close()
+        except OSError:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return None, {}, None
+        self.timings.setdefault(name, []).append(time.perf_counter() - start)
+        if response.status >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response.status, response.headers, data
+
+    def get_json(self, name, path, headers=None):
+        status, response_headers, data = self.request(name, 'GET', path, headers=headers)
+        return (json.loads(data) if status == 200 else None), response_headers
+
+
+def dashboard_tab(client, state, rng):
+    """dashboard.js: the batched snapshot, revalidated with its ETag."""
+    headers = {'If-None-Match': state['etag']} if state.get('etag') else None
+    status, response_headers, _ = client.request('dashboard-snapshot', 'GET', '/api/dashboard-snapshot',
+                                                 headers=headers)
+    if status == 200:
+        state['etag'] = response_headers.get('ETag')
+
+
+def patients_tab(client, state, rng):
+    """patients.js: the whole list page by page once, then changes `since`."""
+    if 'version' not in state:
+        cursor = ''
+        while True:
+            data, _ = client.get_json('patients page', f'/api/patients?limit=500{cursor}')
+            if data is None:
+                return
+            state.setdefault('version', data['version'])
+            if not data['next_cursor']:
+                break
+            cursor = '&cursor=' + quote(data['next_cursor'])
+        client.get_json('flow-mode', '/api/flow-mode')
+        client.get_json('auto-config', '/api/auto-config')
+        return
+    data, _ = client.get_json('patients since', f'/api/patients?since={state["version"]}')
+    if data is not None:
+        state['version'] = data['version']
+
+
+def analytics_tab(client, state, rng):
+    client.get_json('analytics', '/api/analytics')
+
+
+TABS = [('dashboard', dashboard_tab), ('patients', patients_tab), ('dashboard', dashboard_tab),
+        ('patients', patients_tab), ('analytics', analytics_tab)]
+
+
+def writer(client, state, rng):
+    """An operator on the patients and dashboard pages."""
+    op = rng.random()
+    if op < 0.75:
+        client.request('move-patient', 'POST', '/api/move-patient',
+                       {'id': rng.randint(1, state['patients']), 'to_stage': rng.choice(state['stages'])})
+    elif op < 0.9:
+        client.request('simulate', 'POST', '/api/simulate', {})
+    elif op < 0.95:
+        client.request('auto-config save', 'POST', '/api/auto-config', {'crowd_threshold': rng.randint(30, 50)})
+    else:
+        client.request('flow-mode save', 'POST', '/api/flow-mode', {'auto': True})
+
+
+def drive(client, action, interval, stop, rng, state):
+    """Run `action` at once, then every `interval` seconds until `stop`."""
+    action(client, state, rng)
+    next_at = time.monotonic() + rng.uniform(0, interval)
+    while not stop.wait(max(0.0, next_at - time.monotonic())):
+        action(client, state, rng)
+        next_at += interval
+
+
+def subscribe(port, stop, counts, sockets):
+    """Hold one /api/stream connection open, counting the events received."""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=60)
+    sockets.append(sock)
+    try:
+        sock.sendall(b'GET /api/stream HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n')
+        for line in sock.makefile('rb'):
+            if stop.is_set():
+                break
+            if line.startswith(b'event:'):
+                counts['events'] += 1
+    except OSError:
+        pass  # closed at shutdown
+    finally:
+        sock.close()
+
+
+def load(args):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    import app as mediflow
+    rng = random.Random(args.seed)
+    seed(mediflow, mediflow.app.test_client(), args.patients, rng)
+    server = make_server('127.0.0.1', 0, mediflow.app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stop = threading.Event()
+    threads, clients = [], []
+    stream_counts, streams = {'events': 0}, []
+    for _ in range(args.streams):
+        threads.append(threading.Thread(target=subscribe, args=(port, stop, stream_counts, streams), daemon=True))
+    for i in range(args.tabs):
+        kind, action = TABS[i % len(TABS)]
+        clients.append(Client(port, {}, {}))
+        threads.append(threading.Thread(
+            target=drive, daemon=True,
+            args=(clients[-1], action, POLL_SECONDS[kind] / args.speedup, stop, random.Random(rng.random()), {})))
+    for _ in range(args.writers):
+        clients.append(Client(port, {}, {}))
+        state = {'patients': args.patients, 'stages': mediflow.STAGE_ORDER}
+        threads.append(threading.Thread(
+            target=drive, daemon=True,
+            args=(clients[-1], writer, args.write_every, stop, random.Random(rng.random()), state)))
+
+    control = Client(port, {}, {})
+    control.request('auto-config', 'POST', '/api/auto-config', {'tick_seconds': 1})
+    control.request('flow-mode', 'POST', '/api/flow-mode', {'auto': True})
+    print(f'{args.tabs} tabs, {args.writers} writers and {args.streams} stream subscribers against '
+          f'{args.patients} patients for {args.seconds}s (polling {args.speedup}x faster than the pages)')
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    for sock in streams:
+        sock.shutdown(socket.SHUT_RDWR)  # wakes the blocked reader
+    for thread in threads:
+        thread.join(5)
+    control.request('flow-mode', 'POST', '/api/flow-mode', {'auto': False})
+    scheduler = mediflow.flow_scheduler.stats()
+    server.shutdown()
+    mediflow.flow_scheduler.stop(1)
+
+    timings, errors = {}, {}
+    for client in clients:
+        for name, samples in client.timings.items():
+            timings.setdefault(name, []).extend(samples)
+        for name, count in client.errors.items():
+            errors[name] = errors.get(name, 0) + count
+    results = {}
+    prefix = f'load/{args.patients}'
+    print(f"{'request':<22} {'count':>7} {'errors':>7} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10}")
+    for name in sorted(timings):
+        ordered = sorted(timings[name])
+        stats = summarize(ordered)
+        stats.update(p99_ms=round(_percentile(ordered, 0.99) * 1000, 4), max_ms=round(ordered[-1] * 1000, 4),
+                     errors=errors.get(name, 0))
+        results[f'{prefix}/{name}'] = stats
+        print(f'{name:<22} {stats["n"]:7} {stats["errors"]:7} {stats["median_ms"]:8.2f}ms {stats["p95_ms"]:8.2f}ms '
+              f'{stats["p99_ms"]:8.2f}ms {stats["max_ms"]:8.2f}ms')
+    total = sum(len(s) for s in timings.values())
+    results[f'{prefix}/total'] = {
+        'n': total, 'rps': round(total / elapsed, 2), 'errors': sum(errors.values()),
+        'stream_events': stream_counts['events'], 'ticks': scheduler['ticks'],
+        'tick_p95_ms': scheduler['p95_ms'], 'tick_overruns': scheduler['overruns'],
+    }
+    print(f'{total} requests in {elapsed:.1f}s ({total / elapsed:.0f}/s), {sum(errors.values())} errors; '
+          f'{stream_counts["events"]} stream events; {scheduler["ticks"]} scheduler ticks '
+          f'(p95 {scheduler["p95_ms"]} ms, {scheduler["overruns"]} overruns)')
+    write_results(args.out or os.path.join(RESULTS_DIR, 'load.json'), 'load', args, results)
+    return 1 if errors else 0
+
+
+# -- compare ------------------------------------------------------------------
+
+def regressions(baseline, current, threshold, min_ms):
+    """(key, message) for every entry of `current` worse than `baseline`."""
+    found = []
+    for key, now in sorted(current.items()):
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if 'median_ms' in now and 'median_ms' in before:
+            old, new = before['median_ms'], now['median_ms']
+            if new - old > min_ms and new > old * (1 + threshold):
+                found.append((key, f'median {old:.3f} -> {new:.3f} ms ({(new / old - 1) * 100 if old else 0:+.0f}%)'))
+        if 'rps' in now and 'rps' in before:
+            old, new = before['rps'], now['rps']
+            if new < old * (1 - threshold):
+                found.append((key, f'throughput {old:.0f} -> {new:.0f}/s ({(new / old - 1) * 100:+.0f}%)'))
+        if now.get('errors', 0) > before.get('errors', 0):
+            found.append((key, f'errors {before.get("errors", 0)} -> {now["errors"]}'))
+    return found
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.results) as f:
+        current = json.load(f)
+    found = regressions(baseline['results'], current['results'], args.threshold, args.min_ms)
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    shared = len(set(baseline['results']) & set(current['results']))
+    for key, message in found:
+        print(f'REGRESSION {key}: {message}')
+    for key in missing:
+        print(f'missing    {key}')
+    print(f'{shared} entries compared against {baseline["meta"].get("commit")}, {len(found)} regressions '
+          f'(threshold {args.threshold:.0%})')
+    return 1 if found else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the API and compare against a baseline.')
+    modes = parser.add_subparsers(dest='mode', required=True)
+
+    p = modes.add_parser('run', help='time every /api route and the flow functions at several sizes')
+    p.add_argument('--sizes', type=lambda s: [int(n) for n in s.split(',')], default=[100, 10_000, 100_000])
+    p.add_argument('--budget', type=float, default=0.5, help='seconds spent timing each case')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--out', help='results file (default: benchmarks/results/run.json)')
+    p.set_defaults(func=run)
+
+    p = modes.add_parser('load', help='concurrent polling and writes over HTTP')
+    p.add_argument('--patients', type=int, default=10_000)
+    p.add_argument('--seconds', type=float, default=20)
+    p.add_argument('--tabs', type=int, default=20)
+    p.add_argument('--writers', type=int, default=2)
+    p.add_argument('--streams', type=int, default=4, help='live stream subscribers')
+    p.add_argument('--speedup', type=float, default=50, help='poll this many times faster than the pages')
+    p.add_argument('--write-every', type=float, default=0.5, help='seconds between one writer\'s requests')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--out', help='results file (default: benchmarks/results/load.json)')
+    p.set_defaults(func=load)
+
+    p = modes.add_parser('compare', help='flag regressions of RESULTS against BASELINE')
+    p.add_argument('baseline')
+    p.add_argument('results')
+    p.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown as a fraction')
+    p.add_argument('--min-ms', type=float, default=0.05, help='ignore smaller changes of the median')
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
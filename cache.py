@@ -0,0 +1,140 @@
+"""Key-value cache with a Redis backend and an in-process fallback.
+
+Both backends share one interface: `get(key)`, `set(key, value, ttl=None)`,
+`delete(key)`, `clear()` and `stats()`, with values stored as str or bytes.
+`connect(url)` returns a RedisCache when a server answers at `url` and a
+MemoryCache otherwise, so the app runs unchanged without Redis. The redis
+package itself is only imported when a URL is given.
+
+MemoryCache is bounded: past `max_entries` the least recently used entry
+is evicted, and entries past their TTL are dropped when next read. Both
+backends count hits, misses and sets. MemoryCache also counts evictions
+and expirations. RedisCache counts server errors, which it treats as
+misses so a failing Redis only costs the cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """LRU cache with per-entry TTL for a single process."""
+
+    backend = 'memory'
+
+    def __init__(self, max_entries=1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, expires at or None), oldest use first
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expirations': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+                del self._entries[key]
+                self._counts['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._counts['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counts['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, None if ttl is None else self.clock() + ttl)
+            self._entries.move_to_end(key)
+            self._counts['sets'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return _with_hit_rate(dict(self._counts, backend=self.backend, entries=len(self._entries),
+                                       max_entries=self.max_entries))
+
+
+class RedisCache:
+    """Cache in a Redis server; expiry and eviction are left to Redis
+    (`ttl` and its maxmemory policy)."""
+
+    backend = 'redis'
+
+    def __init__(self, client, prefix='mediflow:'):
+        self.client = client
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, key):
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception:
+            self._count('errors')
+            value = None
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.client.set(self.prefix + key, value, ex=None if ttl is None else max(1, int(ttl)))
+        except Exception:
+            self._count('errors')
+            return
+        self._count('sets')
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        with self._lock:
+            return _with_hit_rate(dict(self._counts, backend=self.backend, prefix=self.prefix))
+
+
+def _with_hit_rate(stats):
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+    return stats
+
+
+def connect(url=None, timeout=0.5, prefix='mediflow:', max_entries=1024):
+    """RedisCache for `url` if the server answers a PING within `timeout`
+    seconds, else a MemoryCache holding up to `max_entries`."""
+    if not url:
+        return MemoryCache(max_entries)
+    try:
+        import redis
+    except ImportError:
+        print('Cache: redis package not installed, using in-process cache')
+        return MemoryCache(max_entries)
+    client = redis.Redis.from_url(url, socket_connect_timeout=timeout, socket_timeout=timeout)
+    try:
+        client.ping()
+    except (redis.RedisError, OSError) as e:
+        print(f'Cache: Redis unavailable at {url} ({e}), using in-process cache')
+        return MemoryCache(max_entries)
+    return RedisCache(client, prefix)
@@ -0,0 +1,44 @@
+"""Age bands of the patients in care, kept up to date from registry changes.
+
+The analytics page charts how many patients in care fall in each age band.
+`AgeBands` listens to the registry and keeps one count per band, so the
+chart is read from the counts instead of scanning every patient. Patients in
+`exclude` stages (e.g. Discharge) and patients without an integer age are
+not counted.
+"""
+from bisect import bisect_right
+
+
+class AgeBands:
+    def __init__(self, bounds=(18, 40, 65), exclude=()):
+        self.bounds = tuple(bounds)
+        self.exclude = set(exclude)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self._counted = {}  # patient id -> band index as counted
+
+    def labels(self):
+        """'0-17', '18-39', ... '65+' for the default bounds."""
+        lows = (0,) + self.bounds
+        return [f'{low}-{high - 1}' for low, high in zip(lows, self.bounds)] + [f'{self.bounds[-1]}+']
+
+    def listener(self, patient, old_stage, removed):
+        """Registry listener (see PatientRegistry.add_listener)."""
+        band = self._counted.pop(patient['id'], None)
+        if band is not None:
+            self.counts[band] -= 1
+        age = patient.get('age')
+        if removed or patient.get('stage') in self.exclude or not isinstance(age, int) or isinstance(age, bool):
+            return
+        band = bisect_right(self.bounds, age)
+        self._counted[patient['id']] = band
+        self.counts[band] += 1
+
+    def sync(self, patients):
+        """Count every patient in `patients` from scratch (startup, reset)."""
+        self.clear()
+        for patient in patients:
+            self.listener(patient, None, False)
+
+    def clear(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self._counted.clear()
@@ -0,0 +1,332 @@
+"""Append-only log of patient stage transitions.
+
+Every arrival, move and removal is recorded as one compact event
+(sequence number, timestamp, patient id, from stage, to stage, cause). Events
+are kept column-wise in `array`s with stage and cause names interned to small
+integer codes, 17 bytes per event.
+
+Every `snapshot_every` events (or every N events once N patients are in the
+clinic, so snapshots stay small next to the events) the log stores a compact
+snapshot of who is in which stage. The state at any time T is then the
+nearest snapshot at or before T plus the events after it, so history queries
+and restarts replay a bounded number of events instead of the whole log:
+
+* `state_at(ts)` / `stage_counts_at(ts)` reconstruct past occupancy,
+* `counts_over_time()` and `flow()` feed the historical charts without
+  touching the live patient registry,
+* with a connection pool attached, `flush()` appends new events and
+  the latest snapshot to SQLite (`patient_events`, `event_snapshots`) and
+  `restore()` reloads that snapshot and the events after it on startup.
+
+Writers append under the app's state lock; readers take no lock. Appends
+only ever grow the columns, and trimming swaps in new columns wholesale.
+"""
+import bisect
+import json
+import time
+from array import array
+from contextlib import contextmanager
+
+
+class MovementLog:
+    def __init__(self, snapshot_every=1000, max_events=1_000_000, clock=time.time):
+        self.snapshot_every = snapshot_every
+        self.max_events = max_events
+        self.clock = clock
+        # code 0 is "no stage" (arrival from / removal to)
+        self._stage_names = [None]
+        self._stage_codes = {None: 0}
+        self._cause_names = []
+        self._cause_codes = {}
+        self._cause = 'other'
+        # (first seq, ts, patient id, from code, to code, cause code)
+        self._columns = (1, array('d'), array('I'), array('H'), array('H'), array('B'))
+        self._last_ts = 0.0
+        self._state = {}               # patient id -> stage code, as of the last event
+        # ([(seq, ts, patient ids, stage codes)], [ts]); seq = last event included
+        self._snapshots = ([], [])
+        self._next_snapshot = snapshot_every
+        self._pool = None
+        self._persisted_seq = 0
+        self._persisted_snapshot_seq = 0
+
+    # -- writing --------------------------------------------------------------
+
+    @contextmanager
+    def cause(self, cause):
+        """Attribute events recorded inside the block to `cause`."""
+        previous, self._cause = self._cause, cause
+        try:
+            yield
+        finally:
+            self._cause = previous
+
+    def record(self, patient_id, from_stage, to_stage, cause=None, ts=None):
+        """Append one transition and return its sequence number."""
+        first, ts_col, pid_col, from_col, to_col, cause_col = self._columns
+        # timestamps are kept non-decreasing so time ranges can be bisected
+        ts = max(self._last_ts, self.clock() if ts is None else ts)
+        self._last_ts = ts
+        to_code = self._code(to_stage)
+        ts_col.append(ts)
+        pid_col.append(patient_id)
+        from_col.append(self._code(from_stage))
+        to_col.append(to_code)
+        # appended last: readers size their view on this column
+        cause_col.append(self._cause_code(cause or self._cause))
+
+        if to_code:
+            self._state[patient_id] = to_code
+        else:
+            self._state.pop(patient_id, None)
+        seq = first + len(cause_col) - 1
+        if seq >= self._next_snapshot:
+            self.snapshot()
+        if len(cause_col) > self.max_events:
+            self._trim()
+        return seq
+
+    def listener(self, patient, old_stage, removed):
+        """PatientRegistry listener: log stage changes, arrivals and removals."""
+        if removed:
+            self.record(patient['id'], old_stage, None)
+        elif patient.get('stage') != old_stage:
+            self.record(patient['id'], old_stage, patient.get('stage'))
+
+    def sync(self, patients, cause='sync'):
+        """Record whatever it takes for the logged state to match `patients`
+        (e.g. after loading them from elsewhere, or after a bulk reset)."""
+        current = {p['id']: p.get('stage') for p in patients}
+        with self.cause(cause):
+            for pid, code in list(self._state.items()):
+                if pid not in current:
+                    self.record(pid, self._stage_names[code], None)
+            for pid, stage in current.items():
+                logged = self._stage_names[self._state.get(pid, 0)]
+                if logged != stage:
+                    self.record(pid, logged, stage)
+
+    def snapshot(self):
+        seq = self.last_seq
+        self._next_snapshot = seq + max(self.snapshot_every, len(self._state))
+        snapshots, snapshot_ts = self._snapshots
+        if snapshots and snapshots[-1][0] == seq:
+            return
+        state = dict(self._state)
+        snapshots.append((seq, self._last_ts, array('I', state.keys()), array('H', state.values())))
+        snapshot_ts.append(self._last_ts)
+
+    def _trim(self):
+        """Drop the oldest half of the in-memory events, cutting at a snapshot
+        so that every remaining event can still be replayed."""
+        first, *columns = self._columns
+        snapshots, snapshot_ts = self._snapshots
+        keep_from = first + len(columns[0]) // 2
+        i = bisect.bisect_right([snap[0] for snap in snapshots], keep_from) - 1
+        if i < 0:
+            return
+        cut = snapshots[i][0] + 1 - first
+        self._columns = (first + cut, *(array(c.typecode, c[cut:]) for c in columns))
+        self._snapshots = (snapshots[i:], snapshot_ts[i:])
+
+    def _code(self, stage):
+        code = self._stage_codes.get(stage)
+        if code is None:
+            code = self._stage_codes[stage] = len(self._stage_names)
+            self._stage_names.append(stage)
+        return code
+
+    def _cause_code(self, cause):
+        code = self._cause_codes.get(cause)
+        if code is None:
+            code = self._cause_codes[cause] = len(self._cause_names)
+            self._cause_names.append(cause)
+        return code
+
+    # -- reading --------------------------------------------------------------
+
+    @property
+    def first_seq(self):
+        return self._columns[0]
+
+    @property
+    def last_seq(self):
+        return self._columns[0] + len(self._columns[5]) - 1
+
+    def __len__(self):
+        return len(self._columns[5])
+
+    def nbytes(self):
+        """Memory held by the event columns and snapshots, in bytes."""
+        _, *columns = self._columns
+        snapshots = self._snapshots[0]
+        return (sum(c.itemsize * len(c) for c in columns)
+                + sum(ids.itemsize * len(ids) + codes.itemsize * len(codes) for _, _, ids, codes in snapshots))
+
+    @property
+    def history_start(self):
+        """Earliest time `state_at` can reconstruct, or None if unbounded."""
+        if self._columns[0] == 1:
+            return None
+        snapshot_ts = self._snapshots[1]
+        return snapshot_ts[0] if snapshot_ts else self._last_ts
+
+    def _view(self):
+        columns = self._columns
+        return columns, len(columns[5])
+
+    def events(self, since_seq=0, start=None, end=None, limit=None):
+        """Events after `since_seq`, optionally within [start, end)."""
+        (first, ts, pid, frm, to, cause), n = self._view()
+        lo = max(0, since_seq + 1 - first)
+        if start is not None:
+            lo = max(lo, bisect.bisect_left(ts, start, 0, n))
+        hi = n if end is None else bisect.bisect_left(ts, end, lo, n)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        names, causes = self._stage_names, self._cause_names
+        return [{'seq': first + i, 'ts': ts[i], 'patient_id': pid[i], 'from': names[frm[i]],
+                 'to': names[to[i]], 'cause': causes[cause[i]]} for i in range(lo, hi)]
+
+    def state_at(self, when=None):
+        """{patient id: stage} as of time `when` (default: now)."""
+        if when is None:
+            names = self._stage_names
+            return {pid: names[code] for pid, code in dict(self._state).items()}
+        state, i, (first, ts, pid, frm, to, cause), n = self._replay_start(when)
+        names = self._stage_names
+        while i < n and ts[i] <= when:
+            if to[i]:
+                state[pid[i]] = to[i]
+            else:
+                state.pop(pid[i], None)
+            i += 1
+        return {p: names[code] for p, code in state.items()}
+
+    def stage_counts_at(self, when=None):
+        counts = {}
+        for stage in self.state_at(when).values():
+            counts[stage] = counts.get(stage, 0) + 1
+        return counts
+
+    def counts_over_time(self, start, end, step):
+        """Stage occupancy sampled every `step` seconds in [start, end].
+
+        Returns (sample times, {stage: [count per sample]}). One replay from
+        the snapshot before `start`, then a single pass over the events.
+        """
+        samples = []
+        t = start
+        while t <= end:
+            samples.append(t)
+            t += step
+        state, i, (first, ts, pid, frm, to, cause), n = self._replay_start(start)
+        counts = {}
+        for code in state.values():
+            counts[code] = counts.get(code, 0) + 1
+
+        series = {}
+        for k, sample in enumerate(samples):
+            while i < n and ts[i] <= sample:
+                if frm[i]:
+                    counts[frm[i]] = counts.get(frm[i], 0) - 1
+                if to[i]:
+                    counts[to[i]] = counts.get(to[i], 0) + 1
+                i += 1
+            for code, count in counts.items():
+                series.setdefault(self._stage_names[code], [0] * len(samples))[k] = count
+        return samples, series
+
+    def flow(self, start, end, step):
+        """Event counts per `step`-second bucket in [start, end): arrivals,
+        removals, moves into each stage (`into:<stage>`) and events by cause
+        (`cause:<cause>`). Returns (bucket start times, {name: [counts]})."""
+        (first, ts, pid, frm, to, cause), n = self._view()
+        n_buckets = max(1, int((end - start) // step) + (1 if (end - start) % step else 0))
+        buckets = [start + k * step for k in range(n_buckets)]
+        series = {'arrivals': [0] * n_buckets, 'removals': [0] * n_buckets}
+        lo = bisect.bisect_left(ts, start, 0, n)
+        hi = bisect.bisect_left(ts, end, lo, n)
+        names, causes = self._stage_names, self._cause_names
+        for i in range(lo, hi):
+            k = min(n_buckets - 1, int((ts[i] - start) // step))
+            if not frm[i]:
+                series['arrivals'][k] += 1
+            elif not to[i]:
+                series['removals'][k] += 1
+            else:
+                key = f'into:{names[to[i]]}'
+                series.setdefault(key, [0] * n_buckets)[k] += 1
+            key = f'cause:{causes[cause[i]]}'
+            series.setdefault(key, [0] * n_buckets)[k] += 1
+        return buckets, series
+
+    def _replay_start(self, when):
+        """(state copy, event index, columns, n) to replay forward from."""
+        columns, n = self._view()
+        first = columns[0]
+        snapshots, snapshot_ts = self._snapshots
+        k = bisect.bisect_right(snapshot_ts, when) - 1
+        if k >= 0:
+            seq, _, pids, codes = snapshots[k]
+            return dict(zip(pids, codes)), seq + 1 - first, columns, n
+        if first != 1:
+            raise LookupError('History before the oldest retained snapshot is not in memory')
+        return {}, 0, columns, n
+
+    # -- persistence ------------------------------------------------------------
+
+    def attach(self, pool):
+        """Mirror the log into the SQLite database behind `pool`."""
+        self._pool = pool
+
+    def flush(self):
+        """Append events and snapshots not yet in the database, in one
+        transaction. Returns the number of events written."""
+        if self._pool is None:
+            return 0
+        (first, ts, pid, frm, to, cause), n = self._view()
+        start = max(0, self._persisted_seq + 1 - first)
+        names, causes = self._stage_names, self._cause_names
+        rows = [(first + i, ts[i], pid[i], names[frm[i]], names[to[i]], causes[cause[i]]) for i in range(start, n)]
+        snapshots = self._snapshots[0]
+        latest = snapshots[-1] if snapshots and snapshots[-1][0] > self._persisted_snapshot_seq else None
+        if not rows and latest is None:
+            return 0
+        conn = self._pool.connection()
+        with conn:
+            conn.executemany('INSERT INTO patient_events (seq, ts, patient_id, from_stage, to_stage, cause) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            if latest is not None:
+                # a restart only needs the newest snapshot
+                seq, snap_ts, pids, codes = latest
+                state = json.dumps({pid: names[code] for pid, code in zip(pids, codes)}, separators=(',', ':'))
+                conn.execute('INSERT OR REPLACE INTO event_snapshots (seq, ts, state) VALUES (?, ?, ?)',
+                             (seq, snap_ts, state))
+                conn.execute('DELETE FROM event_snapshots WHERE seq < ?', (seq,))
+                self._persisted_snapshot_seq = seq
+        self._persisted_seq = first + n - 1
+        return len(rows)
+
+    def restore(self):
+        """Load the latest snapshot and the events after it from the
+        database. Returns the number of events replayed."""
+        conn = self._pool.connection()
+        row = conn.execute('SELECT seq, ts, state FROM event_snapshots ORDER BY seq DESC LIMIT 1').fetchone()
+        seq, snap_ts = (row[0], row[1]) if row else (0, 0.0)
+        state = {int(pid): self._code(stage) for pid, stage in json.loads(row[2]).items()} if row else {}
+        rows = conn.execute('SELECT ts, patient_id, from_stage, to_stage, cause FROM patient_events '
+                            'WHERE seq > ? ORDER BY seq', (seq,)).fetchall()
+
+        self._columns = (seq + 1, array('d'), array('I'), array('H'), array('H'), array('B'))
+        self._state = state
+        self._last_ts = snap_ts
+        self._snapshots = ([], [])
+        if row:
+            self._snapshots = ([(seq, snap_ts, array('I', state.keys()), array('H', state.values()))], [snap_ts])
+        self._next_snapshot = seq + max(self.snapshot_every, len(state))
+        for ts, pid, from_stage, to_stage, cause in rows:
+            self.record(pid, from_stage, to_stage, cause, ts=ts)
+        self._persisted_seq = self.last_seq
+        self._persisted_snapshot_seq = self._snapshots[0][-1][0] if self._snapshots[0] else 0
+        return len(rows)
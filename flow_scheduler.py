@@ -0,0 +1,127 @@
+"""Fixed-cadence background ticks for the auto flow.
+
+`TickScheduler` runs one `tick()` per interval on a daemon thread, for as
+long as `enabled()` is true, no matter how many browser tabs are open (or
+none). Ticks are scheduled against absolute monotonic deadlines, so a late
+wake-up or a slow tick does not push later ticks back, and the cadence does
+not drift. A tick that runs past the next deadline is counted as an overrun
+and the slots it covered are skipped, rather than being made up in a burst.
+
+`stats()` reports tick counts, overruns, skipped slots, errors, and the
+duration and lateness (start behind its deadline) of recent ticks.
+"""
+import threading
+import time
+import traceback
+from collections import deque
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class TickScheduler(threading.Thread):
+    """Calls `tick()` every `interval()` seconds while `enabled()`."""
+
+    def __init__(self, tick, interval, enabled=lambda: True, clock=time.monotonic, history=256,
+                 name='flow-scheduler'):
+        super().__init__(name=name, daemon=True)
+        self.tick = tick
+        self.interval = interval
+        self.enabled = enabled
+        self.clock = clock
+        self._durations = deque(maxlen=history)
+        self._lateness = deque(maxlen=history)
+        self._counts = {'ticks': 0, 'overruns': 0, 'skipped': 0, 'errors': 0}
+        self._last = {'started': None, 'error': None}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self):
+        """Re-read `enabled()` and `interval()` now (after a mode or config
+        change) instead of at the next deadline."""
+        self._wake.set()
+
+    def ensure_started(self):
+        if not self.is_alive() and not self._stopped.is_set():
+            try:
+                self.start()
+            except RuntimeError:  # started by another thread meanwhile
+                pass
+        self.wake()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wake.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def run(self):
+        deadline = None
+        while not self._stopped.is_set():
+            if not self.enabled():
+                deadline = None
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            now = self.clock()
+            interval = self.interval()
+            # first tick one interval after enabling; a shorter interval
+            # takes effect from now
+            if deadline is None or deadline > now + interval:
+                deadline = now + interval
+            if now < deadline:
+                if self._wake.wait(deadline - now):
+                    self._wake.clear()
+                continue
+            self._run_tick(deadline, now)
+            deadline += interval
+            now = self.clock()
+            if now > deadline:
+                missed = int((now - deadline) // interval) + 1
+                with self._lock:
+                    self._counts['overruns'] += 1
+                    self._counts['skipped'] += missed
+                deadline += missed * interval
+
+    def _run_tick(self, deadline, started):
+        wall_start = time.time()
+        error = None
+        try:
+            self.tick()
+        except Exception:
+            error = traceback.format_exc(limit=3)
+            print(f'{self.name}: tick failed\n{error}')
+        duration = self.clock() - started
+        with self._lock:
+            self._counts['ticks'] += 1
+            if error is not None:
+                self._counts['errors'] += 1
+            self._last = {'started': wall_start, 'error': error}
+            self._durations.append(duration)
+            self._lateness.append(started - deadline)
+
+    def stats(self):
+        with self._lock:
+            durations, lateness = list(self._durations), list(self._lateness)
+            result = dict(self._counts, last_started=self._last['started'], last_error=self._last['error'])
+        result.update({
+            'running': self.is_alive(),
+            'enabled': bool(self.enabled()),
+            'interval_seconds': self.interval(),
+            'last_ms': _ms(durations[-1] if durations else None),
+            'mean_ms': _ms(sum(durations) / len(durations) if durations else None),
+            'p95_ms': _ms(_percentile(durations, 0.95)),
+            'max_ms': _ms(max(durations, default=None)),
+            'lateness_p95_ms': _ms(_percentile(lateness, 0.95)),
+            'lateness_max_ms': _ms(max(lateness, default=None)),
+        })
+        return result
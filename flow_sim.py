@@ -0,0 +1,346 @@
+"""Discrete-event simulation of patient flow through the clinic stages.
+
+Patients arrive as a Poisson process, queue FIFO at each stage in
+`STAGE_ORDER` and are served by a fixed number of parallel servers whose
+count comes from staff and room availability. A single heap holds all future
+events (arrivals and service completions), so the cost is O(events * log
+pending) regardless of how long the simulated day is.
+
+Use `run_simulation()` in-process, or POST a config to `/api/simulation/run`.
+Times are in minutes.
+"""
+import heapq
+import math
+import random
+from collections import deque
+
+DEFAULT_STAGES = ['Reception', 'Screening', 'Imaging', 'Consultation', 'Surgery', 'Treatment', 'Pharmacy', 'Discharge']
+
+# Service-time distributions per stage, in minutes. Each spec is
+# (kind, *params); see `_sampler` for the supported kinds.
+DEFAULT_SERVICE = {
+    'Reception': ('exponential', 3),
+    'Screening': ('lognormal', 8, 0.4),
+    'Imaging': ('lognormal', 12, 0.5),
+    'Consultation': ('lognormal', 15, 0.5),
+    'Surgery': ('triangular', 30, 45, 90),
+    'Treatment': ('lognormal', 20, 0.6),
+    'Pharmacy': ('exponential', 4),
+    'Discharge': ('uniform', 1, 3),
+}
+
+# Probability that a patient visits the stage at all (default 1.0)
+DEFAULT_ROUTING = {
+    'Imaging': 0.7,
+    'Surgery': 0.15,
+    'Treatment': 0.5,
+    'Pharmacy': 0.8,
+}
+
+# Which staff roles and which resources can serve each stage. Capacity is the
+# number of matching staff, capped by matching rooms/equipment when the stage
+# needs one; stages with neither fall back to DEFAULT_CAPACITY.
+STAGE_STAFFING = {
+    'Screening': {'roles': ['RN', 'LPN']},
+    'Imaging': {'resources': ['Imaging', 'Scanner']},
+    'Consultation': {'roles': ['Ophthalmologist', 'Optometrist'], 'resources': ['Room']},
+    'Surgery': {'roles': ['Surgeon'], 'resources': ['Surgical']},
+    'Treatment': {'roles': ['RN', 'LPN']},
+}
+DEFAULT_CAPACITY = {'Reception': 2, 'Pharmacy': 1, 'Discharge': 2}
+
+DEFAULT_CONFIG = {
+    'arrival_rate': 12.0,      # patients per hour
+    'duration': 600.0,         # minutes during which patients arrive
+    'drain': True,             # keep serving after arrivals stop until empty
+    'service': DEFAULT_SERVICE,
+    'routing': DEFAULT_ROUTING,
+    'capacities': None,        # {stage: servers}; None derives from staff/resources
+    'initial_queues': None,    # {stage: patients already waiting at t=0}
+    'balance': None,           # {'interval', 'crowd_threshold', 'max_moves_per_stage'}
+}
+
+# Bounds on configs that come from API requests (see check_limits); the
+# simulator itself runs whatever it is given, e.g. the live queues
+REQUEST_LIMITS = {
+    'duration': 7 * 24 * 60,        # a simulated week, in minutes
+    'arrival_rate': 1000.0,         # patients per hour
+    'arrivals': 100_000,            # expected arrivals, arrival_rate * duration
+    'initial_queues': 10_000,       # preloaded patients, all stages together
+    'balance_interval': 1.0,        # minimum minutes between balance events
+}
+
+
+def check_limits(config):
+    """Raise ValueError if `config` (flow_sim config keys) asks for more
+    simulated time, arrivals or preloaded patients than REQUEST_LIMITS allow,
+    so one request cannot hold a worker or its memory indefinitely."""
+    limits = REQUEST_LIMITS
+    cfg = dict(DEFAULT_CONFIG)
+    cfg.update(config or {})
+    duration = float(cfg['duration'])
+    arrival_rate = float(cfg['arrival_rate'])
+    # written so that NaN fails too
+    if not 0 <= duration <= limits['duration']:
+        raise ValueError(f'duration must be between 0 and {limits["duration"]} minutes')
+    if not 0 <= arrival_rate <= limits['arrival_rate']:
+        raise ValueError(f'arrival_rate must be between 0 and {limits["arrival_rate"]:g} per hour')
+    if not arrival_rate * duration / 60 <= limits['arrivals']:
+        raise ValueError(f'arrival_rate * duration allows at most {limits["arrivals"]} expected arrivals')
+    queued = cfg.get('initial_queues') or {}
+    if not isinstance(queued, dict):
+        raise ValueError('initial_queues must map stages to patient counts')
+    counts = [float(count) for count in queued.values()]
+    if not all(count >= 0 for count in counts) or not sum(counts) <= limits['initial_queues']:
+        raise ValueError(f'initial_queues may hold at most {limits["initial_queues"]} patients')
+    balance = cfg.get('balance')
+    if balance and not float(balance.get('interval', 10)) >= limits['balance_interval']:
+        raise ValueError(f'balance interval must be at least {limits["balance_interval"]:g} minutes')
+
+
+# Pseudo stage indexes used as event kinds in the heap
+_ARRIVAL = -1
+_BALANCE = -2
+
+
+def capacities_from_staff(staff, resources, stages=DEFAULT_STAGES):
+    """Derive servers per stage from the staff list and resources list."""
+    capacities = {}
+    for stage in stages:
+        rule = STAGE_STAFFING.get(stage)
+        if rule is None:
+            capacities[stage] = DEFAULT_CAPACITY.get(stage, 1)
+            continue
+        counts = []
+        if 'roles' in rule:
+            counts.append(sum(1 for s in staff if s.get('role') in rule['roles']))
+        if 'resources' in rule:
+            counts.append(sum(1 for r in resources if any(k in r.get('name', '') for k in rule['resources'])))
+        capacities[stage] = max(1, min(counts))
+    return capacities
+
+
+def _sampler(spec, rng):
+    kind, *params = spec
+    if kind == 'exponential':
+        rate = 1.0 / params[0]
+        return lambda: rng.expovariate(rate)
+    if kind == 'lognormal':
+        # parameterised by the mean and sigma of the underlying normal
+        mean, sigma = params
+        mu = math.log(mean) - sigma * sigma / 2
+        gauss, exp = rng.gauss, math.exp
+        return lambda: exp(gauss(mu, sigma))
+    if kind == 'triangular':
+        low, mode, high = params
+        return lambda: rng.triangular(low, high, mode)
+    if kind == 'uniform':
+        low, high = params
+        return lambda: rng.uniform(low, high)
+    if kind == 'fixed':
+        value = float(params[0])
+        return lambda: value
+    raise ValueError(f'Unknown service distribution {kind!r}')
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def _summary(values):
+    values = sorted(values)
+    n = len(values)
+    if not n:
+        return {'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0, 'p50': 0.0, 'p90': 0.0, 'p95': 0.0, 'p99': 0.0}
+    return {
+        'count': n,
+        'mean': round(sum(values) / n, 2),
+        'min': round(values[0], 2),
+        'max': round(values[-1], 2),
+        'p50': round(_percentile(values, 50), 2),
+        'p90': round(_percentile(values, 90), 2),
+        'p95': round(_percentile(values, 95), 2),
+        'p99': round(_percentile(values, 99), 2),
+    }
+
+
+class ClinicSimulation:
+    """One reproducible simulation run. Call `run()` once."""
+
+    def __init__(self, config=None, seed=None, stages=DEFAULT_STAGES, staff=(), resources=()):
+        cfg = dict(DEFAULT_CONFIG)
+        cfg.update(config or {})
+        self.config = cfg
+        self.seed = seed
+        self.stages = list(stages)
+        self.capacities = dict(capacities_from_staff(staff, resources, self.stages))
+        self.capacities.update(cfg.get('capacities') or {})
+        for stage in self.stages:
+            if self.capacities.get(stage, 0) < 1:
+                raise ValueError(f'Capacity for {stage} must be at least 1')
+
+    def run(self):
+        cfg = self.config
+        # Independent random streams for arrivals, routing and each stage's
+        # service times, so scenarios run with the same seed see the same
+        # patients (common random numbers) even when capacities differ.
+        seed = self.seed
+
+        def stream(name):
+            return random.Random(None if seed is None else f'{seed}:{name}')
+        stages = self.stages
+        n_stages = len(stages)
+        service_specs = dict(DEFAULT_SERVICE)
+        service_specs.update(cfg.get('service') or {})
+        routing_cfg = dict(DEFAULT_ROUTING)
+        routing_cfg.update(cfg.get('routing') or {})
+
+        sample = [_sampler(service_specs.get(s, ('exponential', 5)), stream(f'service:{s}')) for s in stages]
+        visit_prob = [float(routing_cfg.get(s, 1.0)) for s in stages]
+        capacity = [int(self.capacities[s]) for s in stages]
+        rand = stream('routing').random
+
+        arrival_rate = float(cfg['arrival_rate']) / 60.0
+        duration = float(cfg['duration'])
+        drain = bool(cfg['drain'])
+
+        queues = [deque() for _ in stages]
+        busy = [0] * n_stages
+        busy_time = [0.0] * n_stages
+        max_queue = [0] * n_stages
+        served = [0] * n_stages
+        stage_waits = [[] for _ in stages]
+        system_times = []
+        entry_times = []       # indexed by patient id
+        done = 0
+
+        # Event heap of (time, stage index or -1 for the next arrival, patient id).
+        # The loop below is deliberately inlined: it runs once per event.
+        events = []
+        push, pop = heapq.heappush, heapq.heappop
+        expovariate = stream('arrivals').expovariate
+
+        def admit(now, stage, pid):
+            if busy[stage] < capacity[stage]:
+                busy[stage] += 1
+                service = sample[stage]()
+                busy_time[stage] += service
+                served[stage] += 1
+                stage_waits[stage].append(0.0)
+                push(events, (now + service, stage, pid))
+            else:
+                q = queues[stage]
+                q.append((pid, now))
+                if len(q) > max_queue[stage]:
+                    max_queue[stage] = len(q)
+
+        for stage_name, count in (cfg.get('initial_queues') or {}).items():
+            if stage_name not in stages:
+                continue
+            stage = stages.index(stage_name)
+            for _ in range(int(count)):
+                entry_times.append(0.0)
+                admit(0.0, stage, len(entry_times) - 1)
+        preloaded = len(entry_times)
+
+        # Optional periodic auto-balance, mirroring app.auto_balance: a stage
+        # whose queue reaches the crowd threshold sends its longest-waiting
+        # patients straight on to the next stage.
+        balance = cfg.get('balance')
+        balanced_moves = 0
+        if balance:
+            balance_interval = float(balance.get('interval', 10))
+            crowd_threshold = max(1, int(balance.get('crowd_threshold', 40)))
+            max_moves = max(1, int(balance.get('max_moves_per_stage', 3)))
+            if balance_interval <= 0:
+                raise ValueError('Balance interval must be positive')
+            push(events, (balance_interval, _BALANCE, -1))
+
+        def rebalance(now):
+            moves = 0
+            excess = [len(q) - crowd_threshold + 1 for q in queues]
+            for stage in range(n_stages - 1):
+                q = queues[stage]
+                for _ in range(min(max_moves, excess[stage], len(q))):
+                    pid, queued_at = q.popleft()
+                    stage_waits[stage].append(now - queued_at)
+                    admit(now, stage + 1, pid)
+                    moves += 1
+            return moves
+
+        if arrival_rate > 0:
+            push(events, (expovariate(arrival_rate), _ARRIVAL, -1))
+
+        now = 0.0
+        while events:
+            now, stage, pid = pop(events)
+            if not drain and now > duration:
+                now = duration
+                break
+            if stage == _BALANCE:
+                balanced_moves += rebalance(now)
+                if now < duration or any(busy):
+                    push(events, (now + balance_interval, _BALANCE, -1))
+                continue
+            if stage == _ARRIVAL:
+                if now > duration:
+                    continue
+                pid = len(entry_times)
+                entry_times.append(now)
+                push(events, (now + expovariate(arrival_rate), _ARRIVAL, -1))
+            else:
+                # service completion: pull the next patient from this queue
+                q = queues[stage]
+                if q:
+                    waiting_pid, queued_at = q.popleft()
+                    service = sample[stage]()
+                    busy_time[stage] += service
+                    served[stage] += 1
+                    stage_waits[stage].append(now - queued_at)
+                    push(events, (now + service, stage, waiting_pid))
+                else:
+                    busy[stage] -= 1
+
+            # route the patient to the next stage they visit
+            stage += 1
+            while stage < n_stages and visit_prob[stage] < 1.0 and rand() >= visit_prob[stage]:
+                stage += 1
+            if stage < n_stages:
+                admit(now, stage, pid)
+            else:
+                system_times.append(now - entry_times[pid])
+                done += 1
+
+        arrivals = len(entry_times) - preloaded
+        horizon = max(now, duration) or 1.0
+        all_waits = [w for waits in stage_waits for w in waits]
+        per_stage = {}
+        for i, stage in enumerate(stages):
+            per_stage[stage] = {
+                'capacity': capacity[i],
+                'served': served[i],
+                'max_queue': max_queue[i],
+                'still_queued': len(queues[i]),
+                'utilization': round(min(1.0, busy_time[i] / (capacity[i] * horizon)), 3),
+                'wait': _summary(stage_waits[i]),
+            }
+        return {
+            'seed': self.seed,
+            'arrivals': arrivals,
+            'completed': done,
+            'in_system': len(entry_times) - done,
+            'simulated_minutes': round(horizon, 2),
+            'throughput_per_hour': round(len(system_times) / horizon * 60, 2),
+            'balanced_moves': balanced_moves,
+            'wait': _summary(all_waits),
+            'time_in_system': _summary(system_times),
+            'stages': per_stage,
+        }
+
+
+def run_simulation(config=None, seed=None, staff=(), resources=(), stages=DEFAULT_STAGES):
+    """Run one simulation and return its statistics dict."""
+    return ClinicSimulation(config, seed=seed, stages=stages, staff=staff, resources=resources).run()
@@ -0,0 +1,27 @@
+"""Modules that are imported on first use instead of at startup.
+
+`lazy_import('openpyxl')` returns the module object straight away but
+defers executing it until an attribute is first read, so heavy optional
+subsystems (ML, report export, HTTP clients) cost nothing when a worker
+never touches them. Parent packages of a dotted name are imported eagerly,
+as `importlib.util.find_spec` requires.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Return module `name`, executed on first attribute access. Raises
+    ModuleNotFoundError straight away if it is not installed."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,93 @@
+"""Retention of discharged patients.
+
+Patients stay in the registry after reaching the discharge stage, so the
+dashboard keeps showing them for a while. Without eviction a long-running
+process would keep every patient it ever admitted, and every index, encoded
+record and snapshot would grow with them.
+
+`PatientLifecycle` listens to the registry and remembers when each patient
+entered the discharge stage. `sweep()` hands the patients discharged longer
+than `retention` seconds ago to an archive, then removes them through the
+registry, so the indexes, the movement log, alerts and the pre-encoded JSON
+all drop them the usual way. Discharge times are kept oldest first, so a
+sweep only looks at the patients that are due.
+
+`JsonlArchive` appends archived patients to a JSON-lines file;
+`persistence.PatientStore.archive_patients` moves them to the
+`archived_patients` table.
+"""
+import json
+import time
+from collections import OrderedDict
+
+
+class JsonlArchive:
+    """Archive sink appending one JSON object per patient to `path`."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, patients, archived_at):
+        with open(self.path, 'a') as f:
+            for p in patients:
+                f.write(json.dumps(dict(p, archived_at=archived_at)) + '\n')
+
+
+class PatientLifecycle:
+    def __init__(self, registry, stage='Discharge', retention=4 * 3600, archive=None, clock=time.time):
+        self.registry = registry
+        self.stage = stage
+        self.retention = retention
+        self.archive = archive
+        self.clock = clock
+        self._discharged = OrderedDict()  # patient id -> discharge time, oldest first
+        self.stats = {'archived': 0, 'sweeps': 0, 'last_archived_at': None}
+        self.sync(registry)
+
+    def __len__(self):
+        return len(self._discharged)
+
+    def listener(self, patient, old_stage, removed):
+        """Registry listener (see PatientRegistry.add_listener)."""
+        pid = patient['id']
+        if removed or patient.get('stage') != self.stage:
+            self._discharged.pop(pid, None)
+        elif old_stage != self.stage:
+            self._discharged[pid] = self.clock()
+
+    def sync(self, patients):
+        """Start over from `patients` (startup, reset); patients already
+        discharged are timed from now."""
+        now = self.clock()
+        self._discharged = OrderedDict((p['id'], now) for p in patients if p.get('stage') == self.stage)
+
+    def due(self, now=None):
+        """Ids of the patients whose retention has run out, oldest first."""
+        if not self.retention:
+            return []
+        cutoff = (self.clock() if now is None else now) - self.retention
+        ids = []
+        for pid, discharged_at in self._discharged.items():
+            if discharged_at > cutoff:
+                break
+            ids.append(pid)
+        return ids
+
+    def sweep(self, now=None):
+        """Archive and remove the patients past retention (caller holds the
+        writer lock). Returns the removed patients."""
+        now = self.clock() if now is None else now
+        ids = self.due(now)
+        if not ids:
+            return []
+        patients = [p for p in map(self.registry.get, ids) if p is not None]
+        # archived before removal: if the archive fails nobody is lost
+        if self.archive is not None:
+            self.archive(patients, now)
+        for pid in ids:
+            self._discharged.pop(pid, None)
+            self.registry.remove(pid)
+        self.stats['archived'] += len(patients)
+        self.stats['sweeps'] += 1
+        self.stats['last_archived_at'] = now
+        return patients
@@ -0,0 +1,100 @@
+"""Server-Sent Events broker for pushing dashboard deltas to open browser tabs.
+
+Handlers call `broker.publish(event, data)` when something actually changed
+(a patient moved, the alert list changed, a simulation tick ran). Each
+connected client gets its own bounded queue; `broker.stream()` turns that
+queue into a `text/event-stream` body. Recent events are kept in a small
+backlog so a client that reconnects with `Last-Event-ID` only receives what
+it missed.
+"""
+import json
+import queue
+import threading
+from collections import deque
+
+
+class EventBroker:
+    def __init__(self, backlog=256, client_queue_size=512, heartbeat=15.0):
+        self.heartbeat = heartbeat
+        self.client_queue_size = client_queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._backlog = deque(maxlen=backlog)
+        self._last_id = 0
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        """Encode `data` once and fan it out to every connected client."""
+        with self._lock:
+            self._last_id += 1
+            message = _format(self._last_id, event, data)
+            self._backlog.append((self._last_id, message))
+            dropped = []
+            for q in self._subscribers:
+                try:
+                    q.put_nowait(message)
+                except queue.Full:
+                    # Slow client: disconnect it, EventSource will reconnect
+                    # and replay from the backlog.
+                    dropped.append(q)
+            for q in dropped:
+                self._subscribers.discard(q)
+                _close(q)
+            return self._last_id
+
+    def subscribe(self, last_event_id=None):
+        q = queue.Queue(maxsize=self.client_queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                missed = [m for i, m in self._backlog if i > last_event_id]
+                if self._backlog and self._backlog[0][0] > last_event_id + 1:
+                    # Gap larger than the backlog: ask the client to resync.
+                    missed = [_format(self._last_id, 'resync', {})]
+                for message in missed[-self.client_queue_size:]:
+                    q.put_nowait(message)
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def stream(self, last_event_id=None):
+        """Generator yielding SSE-formatted chunks until the client goes away."""
+        q = self.subscribe(last_event_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    message = q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(q)
+
+
+def _format(event_id, event, data):
+    payload = json.dumps(data, separators=(',', ':'), default=str)
+    return f'id: {event_id}\nevent: {event}\ndata: {payload}\n\n'
+
+
+def _close(q):
+    try:
+        q.put_nowait(None)
+    except queue.Full:
+        try:
+            q.get_nowait()
+            q.put_nowait(None)
+        except (queue.Empty, queue.Full):
+            pass
@@ -0,0 +1,232 @@
+"""Prometheus-style metrics with per-thread recording, and a route profiler.
+
+`Metrics` holds counters and histograms. Each thread records into its own
+dict, so `inc`, `observe` and `timer` take no lock and never contend with
+other request threads; a scrape (`render`) sums the per-thread values, and
+folds the values of threads that have exited into a retired total so
+thread-per-request servers do not accumulate shards. Values that already
+live elsewhere (patients per stage, cache counters) are read at scrape time
+through `register` callbacks. `render()` returns the Prometheus text
+exposition format.
+
+`RouteProfiler` is off by default. Armed for one route, it runs cProfile
+around the next N requests to it (one at a time) and accumulates the
+stats into a single report.
+"""
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _merge(into, shard):
+    for key, value in list(shard.items()):
+        if isinstance(value, list):
+            cells = into.get(key)
+            if cells is None:
+                into[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    cells[i] += v
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+class Metrics:
+    def __init__(self, prefix='mediflow_'):
+        self.prefix = prefix
+        self._meta = {}  # name -> (type, help, buckets or None)
+        self._callbacks = []  # (name, type, help, fn returning [(labels, value)])
+        self._local = threading.local()
+        self._shards = []  # (thread, {(name, labels): value or bucket cells})
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    # -- declaration ----------------------------------------------------------
+
+    def counter(self, name, help):
+        self._meta[self.prefix + name] = ('counter', help, None)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        self._meta[self.prefix + name] = ('histogram', help, tuple(buckets))
+
+    def register(self, name, kind, help, collect):
+        """Add a metric read at scrape time: `collect()` returns a list of
+        (labels, value), labels being a tuple of (name, value) pairs."""
+        self._callbacks.append((self.prefix + name, kind, help, collect))
+
+    # -- recording (no locks) -------------------------------------------------
+
+    def _shard(self):
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            shard = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        shard = self._shard()
+        key = (self.prefix + name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        name = self.prefix + name
+        buckets = self._meta[name][2]
+        shard = self._shard()
+        cells = shard.get((name, labels))
+        if cells is None:
+            # one count per bucket plus +Inf, then the sum
+            cells = shard[(name, labels)] = [0] * (len(buckets) + 1) + [0.0]
+        cells[bisect_left(buckets, value)] += 1
+        cells[-1] += value
+
+    @contextmanager
+    def timer(self, name, labels=()):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def timed(self, name):
+        """Decorator recording each call's duration in histogram `name`."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # -- scraping -------------------------------------------------------------
+
+    def snapshot(self):
+        """{(name, labels): counter value or histogram cells} over all threads."""
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    _merge(self._retired, shard)
+            self._shards = alive
+            totals = {}
+            _merge(totals, self._retired)
+        for _, shard in alive:
+            _merge(totals, shard)
+        return totals
+
+    def render(self):
+        by_name = {}
+        for (name, labels), value in self.snapshot().items():
+            by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, (kind, help, buckets) in self._meta.items():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(by_name.get(name, ()), key=lambda s: s[0]):
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float('inf'),), value):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_label_str(labels + (("le", _number(bound)),))} {cumulative}')
+                    lines.append(f'{name}_sum{_label_str(labels)} {_number(value[-1])}')
+                    lines.append(f'{name}_count{_label_str(labels)} {cumulative}')
+                else:
+                    lines.append(f'{name}{_label_str(labels)} {_number(value)}')
+        for name, kind, help, collect in self._callbacks:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in collect():
+                if value is not None:
+                    lines.append(f'{name}{_label_str(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class RouteProfiler:
+    """cProfile for the next `requests` requests to one route (opt-in)."""
+
+    def __init__(self):
+        self.route = None
+        self.remaining = 0
+        self.profiled = 0
+        self._stats = None
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()  # one profiled request at a time
+
+    def arm(self, route, requests):
+        with self._lock:
+            self.route = route
+            self.remaining = requests
+            self.profiled = 0
+            self._stats = None
+
+    def disarm(self):
+        with self._lock:
+            self.route = None
+            self.remaining = 0
+
+    def start(self, route):
+        """A running profile if this request to `route` should be profiled,
+        else None. Cheap when the profiler is off or armed for another route."""
+        if route != self.route or self.remaining <= 0:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        with self._lock:
+            if route != self.route or self.remaining <= 0:
+                self._busy.release()
+                return None
+            self.remaining -= 1
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile):
+        profile.disable()
+        try:
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+                self.profiled += 1
+        finally:
+            self._busy.release()
+
+    def report(self, limit=40, sort='cumulative'):
+        """Text report of the profiled requests so far, or None."""
+        with self._lock:
+            if self._stats is None:
+                return None
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+    def status(self):
+        return {'route': self.route, 'remaining': self.remaining, 'profiled': self.profiled}
@@ -0,0 +1,238 @@
+"""Versioned schema migrations for the SQLite database.
+
+Each migration is a function registered with `@migration(version, ...)`.
+`migrate(conn)` applies, in order, every migration newer than the database's
+`PRAGMA user_version`, each in its own transaction together with the version
+bump, so a database is never left half-migrated. Existing databases created
+by `app_clean.init_db()` or older builds start at version 0 and are brought
+up to date in place.
+
+Never edit a migration that has shipped; add a new one.
+"""
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Decorator registering `fn(conn)` as schema migration `version`."""
+    def register(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f'Migration {version} registered out of order')
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate(conn, target=None):
+    """Apply pending migrations up to `target` (default: all). Returns the
+    list of versions applied."""
+    target = latest_version() if target is None else target
+    current = schema_version(conn)
+    applied = []
+    for version, _, fn in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        conn.commit()
+        conn.execute('BEGIN')
+        try:
+            fn(conn)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        applied.append(version)
+    return applied
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _add_missing_columns(conn, table, columns):
+    existing = _columns(conn, table)
+    for column, kind in columns.items():
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {kind}')
+
+
+@migration(1, 'base tables')
+def _base_tables(conn):
+    # The tables as app_clean.init_db() has always created them
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT UNIQUE,
+            email TEXT UNIQUE,
+            password_hash TEXT,
+            role TEXT,
+            full_name TEXT,
+            department TEXT,
+            created_at REAL,
+            is_active BOOLEAN DEFAULT 1
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patients (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            stage TEXT,
+            entry_time REAL,
+            doctor_id INTEGER,
+            resource_id INTEGER,
+            created_at REAL,
+            priority TEXT,
+            medical_history TEXT,
+            phone TEXT,
+            address TEXT,
+            emergency_contact TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS doctors (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            status TEXT,
+            specialization TEXT,
+            user_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS resources (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            status TEXT,
+            type TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY,
+            patient_id INTEGER,
+            doctor_id INTEGER,
+            appointment_date TEXT,
+            appointment_time TEXT,
+            status TEXT,
+            notes TEXT,
+            created_at REAL,
+            FOREIGN KEY (patient_id) REFERENCES patients (id),
+            FOREIGN KEY (doctor_id) REFERENCES doctors (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            message TEXT,
+            type TEXT,
+            is_read BOOLEAN DEFAULT 0,
+            created_at REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+@migration(2, 'live dashboard columns')
+def _dashboard_columns(conn):
+    # Older databases predate some init_db() columns; the dashboard also needs
+    # the per-patient queue fields and staff roles
+    _add_missing_columns(conn, 'patients', {
+        'resource_id': 'INTEGER', 'priority': 'TEXT', 'medical_history': 'TEXT', 'phone': 'TEXT',
+        'address': 'TEXT', 'emergency_contact': 'TEXT',
+        'age': 'INTEGER', 'condition': 'TEXT', 'status': 'TEXT', 'waiting_time': 'REAL', 'updated_at': 'REAL',
+    })
+    _add_missing_columns(conn, 'doctors', {
+        'specialization': 'TEXT', 'user_id': 'INTEGER', 'role': 'TEXT', 'patients_today': 'INTEGER',
+    })
+    _add_missing_columns(conn, 'resources', {'type': 'TEXT'})
+
+
+@migration(3, 'hour/day buckets and secondary indexes')
+def _indexes(conn):
+    # Virtual generated columns cost no storage; indexing them lets hourly and
+    # daily rollups group and filter without evaluating strftime per row
+    _add_missing_columns(conn, 'patients', {
+        'created_hour': "TEXT GENERATED ALWAYS AS (strftime('%Y-%m-%d %H', created_at, 'unixepoch')) VIRTUAL",
+        'created_day': "TEXT GENERATED ALWAYS AS (strftime('%Y-%m-%d', created_at, 'unixepoch')) VIRTUAL",
+    })
+    for statement in (
+        'CREATE INDEX IF NOT EXISTS idx_patients_stage ON patients (stage)',
+        'CREATE INDEX IF NOT EXISTS idx_patients_doctor ON patients (doctor_id)',
+        # covers the hourly rollup in app_clean.train_ml_model
+        'CREATE INDEX IF NOT EXISTS idx_patients_created_hour ON patients (created_hour, created_at, entry_time)',
+        'CREATE INDEX IF NOT EXISTS idx_patients_created_day ON patients (created_day)',
+        'CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date ON appointments (doctor_id, appointment_date)',
+        'CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments (appointment_date)',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications (user_id, created_at) WHERE is_read = 0',
+    ):
+        conn.execute(statement)
+
+
+@migration(4, 'patient movement event log')
+def _event_log(conn):
+    # Append-only: rows are only ever inserted (see event_log.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patient_events (
+            seq INTEGER PRIMARY KEY,
+            ts REAL NOT NULL,
+            patient_id INTEGER NOT NULL,
+            from_stage TEXT,
+            to_stage TEXT,
+            cause TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_patient_events_ts ON patient_events (ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_patient_events_patient ON patient_events (patient_id, seq)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS event_snapshots (
+            seq INTEGER PRIMARY KEY,
+            ts REAL NOT NULL,
+            state TEXT NOT NULL
+        )
+    ''')
+
+
+@migration(5, 'archived patients')
+def _archived_patients(conn):
+    # Discharged patients moved out of `patients` after the retention window
+    # (see lifecycle.py). Ids can repeat after a reset, so rows get their own key.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_patients (
+            archive_id INTEGER PRIMARY KEY,
+            id INTEGER NOT NULL,
+            name TEXT,
+            age INTEGER,
+            condition TEXT,
+            status TEXT,
+            stage TEXT,
+            priority TEXT,
+            doctor_id INTEGER,
+            entry_time TEXT,
+            waiting_time REAL,
+            archived_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_archived_patients_id ON archived_patients (id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_archived_patients_archived_at ON archived_patients (archived_at)')
+
+
+@migration(6, 'entry time labels')
+def _entry_labels(conn):
+    # patients.entry_time is a unix time (app_clean reads entry_time -
+    # created_at as the wait); the dashboard's 'HH:MM' labels live beside it.
+    # Rows written with the label in entry_time are moved over.
+    _add_missing_columns(conn, 'patients', {'entry_label': 'TEXT'})
+    conn.execute('''
+        UPDATE patients
+        SET entry_label = entry_time, entry_time = created_at + COALESCE(waiting_time, 0) * 60
+        WHERE typeof(entry_time) = 'text'
+    ''')
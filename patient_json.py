@@ -0,0 +1,143 @@
+"""Pre-encoded JSON for the patient list.
+
+`PatientJSON` listens to the patient registry and keeps one encoded JSON
+object per patient, re-encoded only when that patient changes. Serving the
+list is then a join of ready-made byte strings: no per-request copies,
+defaults or encoding. Large lists can be streamed in chunks instead of being
+assembled in one buffer.
+
+Every change is also logged with the version it will be published under, so
+`changes_since(version)` can answer "what changed since my last fetch" with
+the changed patients and the ids of removed ones. The log is compacted as it
+grows; a client whose version predates the compacted removals is told to
+reload everything instead.
+
+Encoding uses orjson when it is installed and the standard json module
+otherwise; both produce compact output. Kept fragments are right-sized
+copies, since orjson's output buffers are much larger than the record.
+"""
+import json
+from bisect import bisect_right
+from operator import itemgetter
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+# Fields the frontend expects on every patient, with the value sent when the
+# record lacks them
+PATIENT_DEFAULTS = {
+    'stage': 'undefined',
+    'priority': 'undefined',
+    'doctor_id': 'undefined',
+    'entry_time': 'undefined',
+    'waiting_time': 0,
+}
+
+
+def dumps(obj):
+    """Compact JSON bytes for `obj`."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def encode_patient(patient):
+    encoded = dumps({**PATIENT_DEFAULTS, **patient})
+    if orjson is not None:
+        # orjson returns its output in a 1 KiB buffer; fragments are kept for
+        # the patient's lifetime, so keep a right-sized copy (~200 bytes)
+        encoded = bytes(memoryview(encoded))
+    return encoded
+
+
+class PatientJSON:
+    def __init__(self, registry=(), version=lambda: 0):
+        self._fragments = {}  # patient id -> encoded patient, in registry order
+        # version a change made now will be published under
+        self._version = version
+        self._changes = []  # (version, patient id) in version order
+        # changes_since() answers only for versions at or after this one
+        self.floor = 0
+        self.sync(registry)
+
+    def __len__(self):
+        return len(self._fragments)
+
+    def listener(self, patient, old_stage, removed):
+        """Registry listener (see PatientRegistry.add_listener)."""
+        if removed:
+            self._fragments.pop(patient['id'], None)
+        else:
+            self._fragments[patient['id']] = encode_patient(patient)
+        self._changes.append((self._version(), patient['id']))
+        if len(self._changes) > 2 * len(self._fragments) + 1024:
+            self._compact()
+
+    def _compact(self):
+        """Keep only the latest change per present patient. Removals are
+        dropped, so versions before the newest of them can no longer be
+        answered incrementally."""
+        latest = {}
+        for version, pid in self._changes:
+            latest[pid] = version
+        removed = [v for pid, v in latest.items() if pid not in self._fragments]
+        if removed:
+            self.floor = max(self.floor, max(removed))
+        # swapped in whole: readers keep iterating the list they took
+        self._changes = sorted((v, pid) for pid, v in latest.items() if pid in self._fragments)
+
+    def sync(self, patients):
+        """Re-encode every patient in `patients` (startup, reset). Clients
+        must reload everything afterwards."""
+        self._fragments.clear()
+        self._changes = []
+        self.floor = self._version()
+        for patient in patients:
+            self._fragments[patient['id']] = encode_patient(patient)
+
+    def changes_since(self, version):
+        """Return (encoded patients changed after `version`, ids of patients
+        removed after it), or None if `version` is older than the log."""
+        if version < self.floor:
+            return None
+        changes = self._changes
+        start = bisect_right(changes, version, key=itemgetter(0))
+        changed, removed = [], []
+        for pid in dict.fromkeys(pid for _, pid in changes[start:]):
+            fragment = self._fragments.get(pid)
+            if fragment is None:
+                removed.append(pid)
+            else:
+                changed.append(fragment)
+        return changed, removed
+
+    def fragment(self, patient_id):
+        return self._fragments.get(patient_id)
+
+    def fragments(self, patient_ids=None):
+        """Encoded patients, all of them (a consistent copy that is safe to
+        take while the writer updates the store) or those in `patient_ids`."""
+        if patient_ids is None:
+            return list(self._fragments.values())
+        found = (self._fragments.get(pid) for pid in patient_ids)
+        return [f for f in found if f is not None]
+
+    def body(self, fragments=None):
+        """The patients as one JSON array."""
+        return b'[' + b','.join(self.fragments() if fragments is None else fragments) + b']'
+
+    def envelope(self, fragments, key='patients', **fields):
+        """A JSON object of `fields` with the encoded patients as an array
+        under `key`."""
+        head = dumps(fields)[:-1] + (b',' if fields else b'')
+        return head + dumps(key) + b':' + self.body(fragments) + b'}'
+
+    def stream(self, fragments=None, chunk=1000):
+        """The same array as `body`, yielded in pieces of `chunk` patients."""
+        fragments = self.fragments() if fragments is None else fragments
+        yield b'['
+        for i in range(0, len(fragments), chunk):
+            yield (b',' if i else b'') + b','.join(fragments[i:i + chunk])
+        yield b']'
@@ -0,0 +1,596 @@
+"""In-memory patient registry with id, stage, priority and waiting-time indexes.
+
+Patients are kept as plain dicts (the shape the API already returns) but every
+lookup the app needs is served from an index instead of a scan of the full
+patient list:
+
+* id -> patient
+* stage -> {id: patient} membership
+* priority, status and doctor -> {id: patient} membership
+* stage -> waiting-time buckets (whole minutes), with the bucket keys kept
+  sorted so "longest waiting in stage X" and "waiting at least N minutes"
+  only walk the distinct minute values, not the patients.
+* stage -> priority -> lazy max-heap on waiting time, used to pick the next
+  patients to advance in (priority, waiting time) order.
+* stage -> total waiting minutes, so per-stage mean waits cost O(stages).
+* id, waiting time and entry time -> sorted keys, so `page` can return
+  filtered, sorted slices of the list from a cursor without sorting it.
+
+All mutations must go through the registry so the indexes stay in sync.
+Listeners registered with `add_listener` are called after every change with
+`(patient, old_stage, removed)` so derived state (alerts, logs) can update
+incrementally instead of rescanning.
+"""
+import heapq
+import time
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from math import floor
+
+# Order in which priorities are served; unknown priorities go last
+PRIORITY_RANK = {'High': 0, 'Medium': 1, 'Low': 2}
+
+# Fields with an equality index, usable as `page` filters along with stage
+VALUE_FIELDS = ('priority', 'status', 'doctor_id')
+
+# Orders `page` can return, as the value each patient is sorted by (ties are
+# broken by id)
+SORT_FIELDS = {
+    'id': lambda p: p['id'],
+    'waiting_time': lambda p: p.get('waiting_time') or 0,
+    'entry_time': lambda p: str(p.get('entry_time') or ''),
+}
+
+
+def _wait_key(patient):
+    return floor(patient.get('waiting_time') or 0)
+
+
+class SortedKeys:
+    """Sorted set of keys kept in chunks of at most 2 * `chunk`, so an
+    insert or delete shifts one chunk rather than the whole list."""
+
+    def __init__(self, chunk=512):
+        self.chunk = chunk
+        self._chunks = []  # sorted, non-empty lists
+        self._maxes = []   # last key of each chunk
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def add(self, key):
+        self._len += 1
+        if not self._chunks:
+            self._chunks.append([key])
+            self._maxes.append(key)
+            return
+        i = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+        chunk = self._chunks[i]
+        insort(chunk, key)
+        self._maxes[i] = chunk[-1]
+        if len(chunk) > 2 * self.chunk:
+            self._chunks[i:i + 1] = [chunk[:self.chunk], chunk[self.chunk:]]
+            self._maxes[i:i + 1] = [chunk[self.chunk - 1], chunk[-1]]
+
+    def remove(self, key):
+        i = bisect_left(self._maxes, key)
+        chunk = self._chunks[i] if i < len(self._chunks) else ()
+        j = bisect_left(chunk, key)
+        if j == len(chunk) or chunk[j] != key:
+            raise KeyError(key)
+        del chunk[j]
+        self._len -= 1
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i]
+            del self._maxes[i]
+
+    def clear(self):
+        self._chunks.clear()
+        self._maxes.clear()
+        self._len = 0
+
+    def after(self, key=None, reverse=False):
+        """Yield keys strictly after `key` in sort order (strictly before it
+        when `reverse`), or all of them when `key` is None."""
+        chunks, maxes = self._chunks, self._maxes
+        if not reverse:
+            i = 0 if key is None else bisect_right(maxes, key)
+            if i < len(chunks):
+                chunk = chunks[i]
+                yield from chunk[0 if key is None else bisect_right(chunk, key):]
+            for chunk in chunks[i + 1:]:
+                yield from chunk
+        else:
+            i = len(chunks) - 1 if key is None else min(bisect_left(maxes, key), len(chunks) - 1)
+            if i >= 0:
+                chunk = chunks[i]
+                yield from reversed(chunk[:len(chunk) if key is None else bisect_left(chunk, key)])
+            for chunk in reversed(chunks[:max(i, 0)]):
+                yield from reversed(chunk)
+
+
+class PatientRegistry:
+    def __init__(self, stages=(), patients=()):
+        self.stages = list(stages)
+        self._by_id = {}
+        self._by_stage = {stage: {} for stage in self.stages}
+        self._by_value = {field: {} for field in VALUE_FIELDS}
+        # field -> SortedKeys of (sort value, id), and id -> the keys a patient
+        # is currently filed under, so only changed sort values are re-filed
+        self._sorted = {field: SortedKeys() for field in SORT_FIELDS}
+        self._sort_keys = {}
+        # stage -> {minute: {id: patient}} and stage -> sorted list of minutes
+        self._wait_buckets = {stage: {} for stage in self.stages}
+        self._wait_keys = {stage: [] for stage in self.stages}
+        self._wait_totals = {stage: 0 for stage in self.stages}
+        # stage -> {priority rank: [(-waiting_time, id, stamp)]}. Entries are
+        # never removed eagerly; an entry is live only while its stamp matches
+        # the patient's current stamp, which changes on every re-index.
+        self._ready_heaps = {stage: {} for stage in self.stages}
+        self._stamps = {}
+        self._stamp_counter = 0
+        self._max_id = 0
+        self._listeners = []
+        # odd while a mutation (and its listeners) runs, bumped twice per
+        # mutation; lets `read` run queries without the writer lock
+        self._seq = 0
+        for patient in patients:
+            self.add(patient)
+
+    # -- basic container protocol -------------------------------------------
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def __contains__(self, patient_id):
+        return patient_id in self._by_id
+
+    def get(self, patient_id):
+        return self._by_id.get(patient_id)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, patient, old_stage, removed=False):
+        for listener in self._listeners:
+            listener(patient, old_stage, removed)
+
+    def next_id(self):
+        """Return a fresh patient id without scanning existing patients. Ids
+        only grow: removed, cleared or archived patients' ids are not reused."""
+        self._max_id += 1
+        return self._max_id
+
+    def reserve_ids(self, last_id):
+        """Make `next_id` return ids above `last_id` (e.g. ids already used
+        by archived patients)."""
+        self._max_id = max(self._max_id, last_id)
+
+    def read(self, query, lock, attempts=10):
+        """Return `query()`, a read of the indexes, without taking the
+        writer lock: the query is run again if a mutation overlapped it (an
+        error it hit meanwhile is discarded too). Only if every attempt
+        overlapped a write is it run under `lock`."""
+        for _ in range(attempts):
+            seq = self._seq
+            if not seq & 1:
+                try:
+                    result = query()
+                except Exception:
+                    if self._seq == seq:
+                        raise
+                else:
+                    if self._seq == seq:
+                        return result
+            time.sleep(0)  # let the writer finish
+        with lock:
+            return query()
+
+    @contextmanager
+    def _writing(self):
+        self._seq += 1
+        try:
+            yield
+        finally:
+            self._seq += 1
+
+    # -- mutations ------------------------------------------------------------
+
+    def add(self, patient):
+        pid = patient['id']
+        if pid in self._by_id:
+            raise ValueError(f'Patient {pid} already registered')
+        self._check(patient)
+        with self._writing():
+            self._by_id[pid] = patient
+            self._max_id = max(self._max_id, pid)
+            self._index(patient)
+            self._notify(patient, None)
+        return patient
+
+    def remove(self, patient_id):
+        if patient_id not in self._by_id:
+            return None
+        with self._writing():
+            patient = self._by_id.pop(patient_id)
+            self._unindex(patient)
+            for field, key in zip(SORT_FIELDS, self._sort_keys.pop(patient_id)):
+                self._sorted[field].remove(key)
+            self._notify(patient, patient.get('stage'), removed=True)
+        return patient
+
+    def clear(self):
+        """Drop every patient (the id counter keeps counting). Listeners are
+        not notified per patient; owners of derived state should reset it
+        alongside."""
+        with self._writing():
+            self._clear()
+
+    def _clear(self):
+        self._by_id.clear()
+        for index in self._by_value.values():
+            index.clear()
+        for keys in self._sorted.values():
+            keys.clear()
+        self._sort_keys.clear()
+        self._stamps.clear()
+        for stage in list(self._by_stage):
+            if stage in self.stages:
+                self._by_stage[stage].clear()
+                self._wait_buckets[stage].clear()
+                self._wait_keys[stage].clear()
+                self._ready_heaps[stage].clear()
+                self._wait_totals[stage] = 0
+            else:
+                del self._by_stage[stage]
+                del self._wait_buckets[stage]
+                del self._wait_keys[stage]
+                del self._ready_heaps[stage]
+                del self._wait_totals[stage]
+
+    def move(self, patient_id, to_stage, waiting_time=None):
+        """Move a patient to `to_stage`, optionally updating their waiting time.
+
+        Returns the stage the patient came from. Raises KeyError for an
+        unknown id and ValueError (leaving the patient as it was) for a stage
+        or waiting time that cannot be indexed.
+        """
+        patient = self._by_id[patient_id]
+        changes = {'stage': to_stage} if waiting_time is None else {'stage': to_stage, 'waiting_time': waiting_time}
+        self._check(dict(patient, **changes))
+        from_stage = patient.get('stage')
+        with self._writing():
+            self._unindex(patient)
+            patient.update(changes)
+            self._index(patient)
+            self._notify(patient, from_stage)
+        return from_stage
+
+    def update(self, patient_id, **fields):
+        """Update indexed or plain fields of a patient in place."""
+        patient = self._by_id[patient_id]
+        self._check(dict(patient, **fields))
+        old_stage = patient.get('stage')
+        with self._writing():
+            self._unindex(patient)
+            patient.update(fields)
+            self._index(patient)
+            self._notify(patient, old_stage)
+        return patient
+
+    def set_waiting_time(self, patient_id, minutes):
+        return self.update(patient_id, waiting_time=minutes)
+
+    # -- queries --------------------------------------------------------------
+
+    def stage_count(self, stage):
+        return len(self._by_stage.get(stage, ()))
+
+    def stage_counts(self):
+        """Return {stage: count} for every configured stage plus any other
+        stage that currently holds patients. O(number of stages)."""
+        counts = {stage: len(self._by_stage[stage]) for stage in self.stages}
+        for stage, members in self._by_stage.items():
+            if stage not in counts and members:
+                counts[stage] = len(members)
+        return counts
+
+    def stage_wait_totals(self):
+        """Return {stage: (patients, total waiting minutes)} for the same
+        stages as `stage_counts`. O(number of stages)."""
+        return {stage: (count, self._wait_totals.get(stage, 0)) for stage, count in self.stage_counts().items()}
+
+    def in_stage(self, stage):
+        return list(self._by_stage.get(stage, {}).values())
+
+    def with_priority(self, priority):
+        return list(self._by_value['priority'].get(priority, {}).values())
+
+    def known_stages(self):
+        return list(self._by_stage)
+
+    def longest_waiting(self, stage, limit=1):
+        """Return up to `limit` patients in `stage`, longest waiting first."""
+        result = []
+        buckets = self._wait_buckets.get(stage)
+        if not buckets:
+            return result
+        for minute in reversed(self._wait_keys[stage]):
+            for patient in buckets[minute].values():
+                result.append(patient)
+                if len(result) >= limit:
+                    return result
+        return result
+
+    def next_ready(self, stage, limit, min_wait, always=('High',)):
+        """Return up to `limit` patients in `stage` eligible to advance.
+
+        Patients whose priority is in `always` are eligible regardless of
+        waiting time; everyone else needs `min_wait` minutes. Results are in
+        (priority, longest waiting first) order. Cost is O(limit * log n)
+        plus amortised cleanup of stale heap entries.
+        """
+        heaps = self._ready_heaps.get(stage)
+        if not heaps or limit <= 0:
+            return []
+        self._maybe_compact(stage)
+        stamps = self._stamps
+        by_id = self._by_id
+        result = []
+        for rank in sorted(heaps):
+            heap = heaps[rank]
+            taken = []
+            while heap and len(result) < limit:
+                entry = heap[0]
+                neg_wait, pid, stamp = entry
+                if stamps.get(pid) != stamp:
+                    heapq.heappop(heap)
+                    continue
+                patient = by_id[pid]
+                if patient.get('priority') not in always and -neg_wait < min_wait:
+                    break
+                taken.append(heapq.heappop(heap))
+                result.append(patient)
+            # still indexed until the caller actually moves them
+            for entry in taken:
+                heapq.heappush(heap, entry)
+            if len(result) >= limit:
+                break
+        return result
+
+    def waiting_at_least(self, minutes, stages=None):
+        """Yield patients whose waiting time is at least `minutes`.
+
+        Only the minute buckets at or above the threshold are visited.
+        """
+        for stage in (self._by_stage if stages is None else stages):
+            keys = self._wait_keys.get(stage)
+            if not keys:
+                continue
+            buckets = self._wait_buckets[stage]
+            for minute in keys[bisect_left(keys, floor(minutes)):]:
+                for patient in list(buckets[minute].values()):
+                    if (patient.get('waiting_time') or 0) >= minutes:
+                        yield patient
+
+    def page(self, sort='id', after=None, limit=50, descending=False, **filters):
+        """Return up to `limit` patients matching `filters`, in `sort` order
+        (a SORT_FIELDS name), starting after the cursor key `after`.
+
+        `filters` maps 'stage' or a VALUE_FIELDS name to the required value.
+        Returns (patients, key of the last one or None when the list is
+        exhausted); pass that key back as `after` for the next page.
+
+        The matching ids are the intersection of the equality indexes' sets.
+        When they are few next to the walk through the sorted keys needed to
+        fill the page, only they are sorted; otherwise the sorted keys are
+        walked and tested against them. Raises ValueError for an unknown
+        sort or filter field.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'cannot sort by {sort!r}')
+        sets = []
+        for field, value in filters.items():
+            if field == 'stage':
+                index = self._by_stage
+            elif field in self._by_value:
+                index = self._by_value[field]
+            else:
+                raise ValueError(f'cannot filter by {field!r}')
+            members = index.get(value)
+            if not members:
+                return [], None
+            sets.append(members)
+        if limit <= 0:
+            return [], after
+
+        ids = None
+        for members in sorted(sets, key=len):
+            ids = members.keys() if ids is None else ids & members.keys()
+        if ids is not None and not ids:
+            return [], None
+        # a walk visits about limit * n / len(ids) keys to fill the page
+        if ids is not None and len(ids) ** 2 <= limit * len(self._by_id):
+            value, by_id = SORT_FIELDS[sort], self._by_id
+            keys = sorted((value(by_id[pid]), pid) for pid in ids)
+            if descending:
+                keys = keys[:len(keys) if after is None else bisect_left(keys, after)][::-1]
+            else:
+                keys = keys[0 if after is None else bisect_right(keys, after):]
+            keys = keys[:limit + 1]
+        else:
+            keys = []
+            for key in self._sorted[sort].after(after, descending):
+                if ids is None or key[1] in ids:
+                    keys.append(key)
+                    if len(keys) > limit:
+                        break
+        more = len(keys) > limit
+        keys = keys[:limit]
+        return [self._by_id[pid] for _, pid in keys], keys[-1] if more else None
+
+    def check_consistency(self):
+        """Rebuild every index from the id map and compare with the live ones.
+
+        Returns a list of human-readable problems; an empty list means the
+        indexes agree with the patient records. This is a full scan and is
+        meant for tests and debugging, not request handling.
+        """
+        problems = []
+        expected_stage = {}
+        expected_value = {field: {} for field in VALUE_FIELDS}
+        expected_wait = {}
+        expected_total = {}
+        for pid, patient in self._by_id.items():
+            if patient.get('id') != pid:
+                problems.append(f'patient keyed {pid} has id {patient.get("id")}')
+            stage = patient.get('stage')
+            expected_stage.setdefault(stage, set()).add(pid)
+            for field, expected in expected_value.items():
+                expected.setdefault(patient.get(field), set()).add(pid)
+            expected_wait.setdefault(stage, {}).setdefault(_wait_key(patient), set()).add(pid)
+            expected_total[stage] = expected_total.get(stage, 0) + (patient.get('waiting_time') or 0)
+
+        for stage, members in self._by_stage.items():
+            if set(members) != expected_stage.get(stage, set()):
+                problems.append(f'stage index for {stage!r} does not match patient records')
+            buckets = self._wait_buckets[stage]
+            actual = {minute: set(bucket) for minute, bucket in buckets.items()}
+            if actual != expected_wait.get(stage, {}):
+                problems.append(f'waiting-time buckets for {stage!r} do not match patient records')
+            if self._wait_keys[stage] != sorted(buckets):
+                problems.append(f'waiting-time keys for {stage!r} are out of order')
+            if abs(self._wait_totals[stage] - expected_total.get(stage, 0)) > 1e-6:
+                problems.append(f'waiting-time total for {stage!r} does not match patient records')
+        for stage in expected_stage:
+            if stage not in self._by_stage:
+                problems.append(f'stage {stage!r} missing from stage index')
+        for field, index in self._by_value.items():
+            actual = {value: set(members) for value, members in index.items()}
+            if actual != expected_value[field]:
+                problems.append(f'{field} index does not match patient records')
+        for field, keys in self._sorted.items():
+            expected = sorted((SORT_FIELDS[field](p), pid) for pid, p in self._by_id.items())
+            if list(keys) != expected or len(keys) != len(expected):
+                problems.append(f'sorted {field} keys do not match patient records')
+
+        for stage, heaps in self._ready_heaps.items():
+            live = [e[1] for h in heaps.values() for e in h if self._stamps.get(e[1]) == e[2]]
+            if sorted(live) != sorted(expected_stage.get(stage, ())):
+                problems.append(f'ready heap for {stage!r} does not match patient records')
+
+        counts = self.stage_counts()
+        for stage in self.stages:
+            if counts[stage] != len(expected_stage.get(stage, ())):
+                problems.append(f'count for {stage!r} is {counts[stage]}, expected {len(expected_stage.get(stage, ()))}')
+        if self._by_id and self._max_id < max(self._by_id):
+            problems.append('next_id counter is behind the largest patient id')
+        return problems
+
+    # -- index maintenance ----------------------------------------------------
+
+    @staticmethod
+    def _check(patient):
+        """Raise ValueError if `patient` could not be indexed. Mutations call
+        this before touching any index, so a bad value never leaves a
+        patient half-indexed."""
+        pid = patient.get('id')
+        if isinstance(pid, bool) or not isinstance(pid, int):
+            raise ValueError(f'Patient id must be an integer, not {pid!r}')
+        wait = patient.get('waiting_time') or 0
+        if isinstance(wait, bool) or not isinstance(wait, (int, float)):
+            raise ValueError(f'waiting_time must be a number, not {wait!r}')
+        for field in ('stage',) + VALUE_FIELDS:
+            try:
+                hash(patient.get(field))
+            except TypeError:
+                raise ValueError(f'{field} must be a plain value, not {patient.get(field)!r}') from None
+
+    def _ensure_stage(self, stage):
+        if stage not in self._by_stage:
+            self._by_stage[stage] = {}
+            self._wait_buckets[stage] = {}
+            self._wait_keys[stage] = []
+            self._ready_heaps[stage] = {}
+            self._wait_totals[stage] = 0
+
+    def _maybe_compact(self, stage):
+        heaps = self._ready_heaps[stage]
+        if sum(len(h) for h in heaps.values()) <= 2 * len(self._by_stage[stage]) + 64:
+            return
+        heaps.clear()
+        for patient in self._by_stage[stage].values():
+            self._push_ready(stage, patient)
+
+    def _push_ready(self, stage, patient):
+        rank = PRIORITY_RANK.get(patient.get('priority'), len(PRIORITY_RANK))
+        heap = self._ready_heaps[stage].setdefault(rank, [])
+        heapq.heappush(heap, (-(patient.get('waiting_time') or 0), patient['id'], self._stamps[patient['id']]))
+
+    def _index(self, patient):
+        pid = patient['id']
+        stage = patient.get('stage')
+        self._ensure_stage(stage)
+        self._by_stage[stage][pid] = patient
+        for field, index in self._by_value.items():
+            index.setdefault(patient.get(field), {})[pid] = patient
+        old = self._sort_keys.get(pid)
+        new = self._sort_keys[pid] = tuple((value(patient), pid) for value in SORT_FIELDS.values())
+        for i, field in enumerate(SORT_FIELDS):
+            if old is None or old[i] != new[i]:
+                if old is not None:
+                    self._sorted[field].remove(old[i])
+                self._sorted[field].add(new[i])
+        self._stamp_counter += 1
+        self._stamps[pid] = self._stamp_counter
+        self._push_ready(stage, patient)
+        # also here, not only in next_ready: stages nobody advances from
+        # (Discharge, or any stage while the flow is manual) would otherwise
+        # keep every stale entry
+        self._maybe_compact(stage)
+        self._wait_totals[stage] += patient.get('waiting_time') or 0
+
+        minute = _wait_key(patient)
+        buckets = self._wait_buckets[stage]
+        bucket = buckets.get(minute)
+        if bucket is None:
+            bucket = buckets[minute] = {}
+            insort(self._wait_keys[stage], minute)
+        bucket[pid] = patient
+
+    def _unindex(self, patient):
+        pid = patient['id']
+        stage = patient.get('stage')
+        self._by_stage[stage].pop(pid, None)
+        self._stamps.pop(pid, None)
+        for field, index in self._by_value.items():
+            members = index.get(patient.get(field))
+            if members is not None:
+                members.pop(pid, None)
+                if not members:
+                    del index[patient.get(field)]
+        # reset on empty so float waits cannot accumulate rounding drift
+        if self._by_stage[stage]:
+            self._wait_totals[stage] -= patient.get('waiting_time') or 0
+        else:
+            self._wait_totals[stage] = 0
+
+        minute = _wait_key(patient)
+        buckets = self._wait_buckets[stage]
+        bucket = buckets.get(minute)
+        if bucket is not None:
+            bucket.pop(pid, None)
+            if not bucket:
+                del buckets[minute]
+                keys = self._wait_keys[stage]
+                del keys[bisect_left(keys, minute)]
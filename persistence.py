@@ -0,0 +1,243 @@
+"""SQLite persistence for the live patient, staff and resource state.
+
+The in-memory `PatientRegistry` stays the cache every read is served from;
+this module keeps a SQLite file (normally `database.db`) in sync with it so
+the state survives a restart:
+
+* `ConnectionPool` gives each thread one long-lived connection, opened in WAL
+  mode so readers never wait for the writer, with `synchronous=NORMAL`.
+* `PatientStore` listens to the registry and only remembers which patients
+  changed. `flush()` then writes them in a single transaction with
+  `executemany`, so an /api/advance or /api/simulate call that moves or
+  admits hundreds of patients costs one commit, and a patient touched several
+  times in one call is written once.
+* `archive_patients` keeps discharged patients evicted from memory (see
+  lifecycle.py) in `archived_patients`.
+
+Writes are expected to happen under the app's single-writer lock.
+"""
+import sqlite3
+import threading
+import time
+
+import migrations
+
+PATIENT_COLUMNS = ('id', 'name', 'age', 'condition', 'status', 'stage', 'priority',
+                   'doctor_id', 'entry_time', 'waiting_time')
+# Columns of the patients table holding PATIENT_COLUMNS. The table is shared
+# with app_clean, whose entry_time is a unix time: the dashboard's entry time
+# label goes to entry_label, and entry_time is kept as registration time plus
+# the current wait (see _UPSERT_PATIENT).
+_TABLE_COLUMNS = tuple('entry_label' if c == 'entry_time' else c for c in PATIENT_COLUMNS)
+_WAIT = PATIENT_COLUMNS.index('waiting_time')
+STAFF_COLUMNS = ('id', 'name', 'role', 'status', 'patients_today')
+RESOURCE_COLUMNS = ('id', 'name', 'status')
+
+_PATIENT_DEFAULTS = {'status': 'Waiting', 'priority': 'Medium', 'condition': 'General', 'waiting_time': 0}
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection owned by a `ConnectionPool`.
+
+    `close()` only rolls back whatever the caller left uncommitted, so code
+    written for open/close-per-call keeps working while the connection is
+    reused by the next caller on the same thread.
+    """
+
+    def close(self):
+        self.rollback()
+
+    def _close(self):
+        super().close()
+
+
+class ConnectionPool:
+    """One SQLite connection per thread, opened lazily and kept open."""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+
+    def connection(self):
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is None or local.generation != self._generation:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, factory=PooledConnection,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            local.conn, local.generation = conn, self._generation
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_all(self):
+        """Close every pooled connection; threads reconnect on next use."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for conn in connections:
+            conn._close()
+
+
+class PatientStore:
+    """Write-behind mirror of the patient registry (plus staff/resources)."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._registry = None
+        self._dirty = set()
+        self._deleted = set()
+        self.stats = {'flushes': 0, 'rows_written': 0, 'rows_deleted': 0}
+
+    def ensure_schema(self):
+        """Bring the database up to the latest schema version."""
+        migrations.migrate(self.pool.connection())
+
+    # -- patients -------------------------------------------------------------
+
+    def load_patients(self):
+        rows = self.pool.connection().execute(
+            f'SELECT {", ".join(_TABLE_COLUMNS)}, entry_time FROM patients ORDER BY id')
+        return [_patient_from_row(row) for row in rows]
+
+    def track(self, registry):
+        """Start recording changes made to `registry`."""
+        self._registry = registry
+        registry.add_listener(self._on_change)
+
+    def _on_change(self, patient, old_stage, removed):
+        pid = patient['id']
+        if removed:
+            self._dirty.discard(pid)
+            self._deleted.add(pid)
+        else:
+            self._deleted.discard(pid)
+            self._dirty.add(pid)
+
+    @property
+    def pending(self):
+        return len(self._dirty) + len(self._deleted)
+
+    def flush(self):
+        """Write every patient changed since the last flush in one
+        transaction. Returns the number of rows written or deleted."""
+        if not self._dirty and not self._deleted:
+            return 0
+        registry = self._registry
+        rows = [_patient_row(registry.get(pid)) for pid in self._dirty if pid in registry]
+        deleted = [(pid,) for pid in self._deleted]
+        conn = self.pool.connection()
+        now = time.time()
+        with conn:
+            if deleted:
+                conn.executemany('DELETE FROM patients WHERE id = ?', deleted)
+            if rows:
+                conn.executemany(_UPSERT_PATIENT, [_upsert_row(row, now) for row in rows])
+        self._dirty.clear()
+        self._deleted.clear()
+        self.stats['flushes'] += 1
+        self.stats['rows_written'] += len(rows)
+        self.stats['rows_deleted'] += len(deleted)
+        return len(rows) + len(deleted)
+
+    def replace_patients(self, patients):
+        """Replace the whole patients table (initial seeding, reset)."""
+        now = time.time()
+        rows = [_upsert_row(_patient_row(p), now) for p in patients]
+        conn = self.pool.connection()
+        with conn:
+            conn.execute('DELETE FROM patients')
+            conn.executemany(_UPSERT_PATIENT, rows)
+        self._dirty.clear()
+        self._deleted.clear()
+
+    def archive_patients(self, patients, archived_at):
+        """Copy `patients` to `archived_patients`. The registry removes them
+        afterwards, and the next flush deletes their live rows."""
+        rows = [_patient_row(p) + (archived_at,) for p in patients]
+        conn = self.pool.connection()
+        with conn:
+            conn.executemany(_INSERT_ARCHIVED, rows)
+
+    def last_archived_id(self):
+        """Largest patient id ever archived (0 if none), so ids keep growing
+        across restarts."""
+        row = self.pool.connection().execute('SELECT MAX(id) FROM archived_patients').fetchone()
+        return row[0] or 0
+
+    # -- staff and resources ----------------------------------------------------
+
+    def load_staff(self):
+        # rows written by other tools may lack a role; they are not usable staff
+        rows = self.pool.connection().execute(
+            f'SELECT {", ".join(STAFF_COLUMNS)} FROM doctors WHERE role IS NOT NULL ORDER BY id')
+        return [dict(row) for row in rows]
+
+    def save_staff(self, staff):
+        self._upsert('doctors', STAFF_COLUMNS, staff)
+
+    def load_resources(self):
+        rows = self.pool.connection().execute(
+            f'SELECT {", ".join(RESOURCE_COLUMNS)} FROM resources ORDER BY id')
+        return [dict(row) for row in rows]
+
+    def save_resources(self, resources):
+        self._upsert('resources', RESOURCE_COLUMNS, resources)
+
+    def _upsert(self, table, columns, records):
+        updates = ', '.join(f'{c} = excluded.{c}' for c in columns if c != 'id')
+        sql = (f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+               f'ON CONFLICT(id) DO UPDATE SET {updates}')
+        conn = self.pool.connection()
+        with conn:
+            conn.executemany(sql, [tuple(r.get(c) for c in columns) for r in records])
+
+
+# created_at is only set on insert; updated_at on every write. entry_time
+# follows the wait from the stored created_at.
+_UPSERT_PATIENT = (
+    f'INSERT INTO patients ({", ".join(_TABLE_COLUMNS)}, entry_time, created_at, updated_at) '
+    f'VALUES ({", ".join("?" * (len(_TABLE_COLUMNS) + 3))}) '
+    'ON CONFLICT(id) DO UPDATE SET '
+    + ', '.join(f'{c} = excluded.{c}' for c in _TABLE_COLUMNS if c != 'id')
+    + ', entry_time = COALESCE(patients.created_at, excluded.created_at)'
+      ' + COALESCE(excluded.waiting_time, 0) * 60'
+    + ', updated_at = excluded.updated_at'
+)
+
+
+_INSERT_ARCHIVED = (
+    f'INSERT INTO archived_patients ({", ".join(PATIENT_COLUMNS)}, archived_at) '
+    f'VALUES ({", ".join("?" * (len(PATIENT_COLUMNS) + 1))})'
+)
+
+
+def _patient_row(patient):
+    return tuple(patient.get(c) for c in PATIENT_COLUMNS)
+
+
+def _upsert_row(row, now):
+    wait = row[_WAIT] if isinstance(row[_WAIT], (int, float)) else 0
+    return row + (now + wait * 60, now, now)
+
+
+def _patient_from_row(row):
+    patient = {c: row[t] for c, t in zip(PATIENT_COLUMNS, _TABLE_COLUMNS)}
+    if patient['entry_time'] is None:
+        patient['entry_time'] = row['entry_time']
+    for key, default in _PATIENT_DEFAULTS.items():
+        if patient[key] is None:
+            patient[key] = default
+    wait = patient['waiting_time']
+    if isinstance(wait, float) and wait.is_integer():
+        patient['waiting_time'] = int(wait)
+    # rows created by app_clean have no label, only the unix time
+    if isinstance(patient['entry_time'], (int, float)):
+        patient['entry_time'] = time.strftime('%H:%M', time.localtime(patient['entry_time']))
+    return patient
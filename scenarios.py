@@ -0,0 +1,179 @@
+"""What-if sweeps over auto-balance settings, staffing and rooms.
+
+A sweep takes a grid such as::
+
+    {
+        "crowd_threshold": [20, 40],
+        "max_moves_per_stage": [1, 3],
+        "staff": {"RN": [1, 2, 3], "Surgeon": [1, 2]},
+        "rooms": {"Room": [2, 4]},
+        "arrival_rate": [12, 18]
+    }
+
+expands it into every combination, runs `replications` seeded flow
+simulations per combination on a process pool and yields one summary per
+configuration as soon as it finishes. Replication r of every configuration
+uses the same seed, so configurations are compared on the same patients.
+
+Command line:
+
+    python scenarios.py grid.json --replications 5 --workers 8
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import flow_sim
+
+# Settings that map onto the simulator's auto-balance config
+BALANCE_KEYS = ('crowd_threshold', 'max_moves_per_stage', 'balance_interval')
+# Settings passed straight through to the simulator config
+SIM_KEYS = ('arrival_rate', 'duration')
+MAX_CONFIGS = 5000
+
+
+def expand_grid(grid):
+    """Return the list of settings dicts for every combination in `grid`."""
+    axes = []
+    for key, values in grid.items():
+        if key in ('staff', 'rooms'):
+            for name, counts in values.items():
+                axes.append(((key, name), _as_list(counts)))
+        elif key in BALANCE_KEYS or key in SIM_KEYS:
+            axes.append(((key,), _as_list(values)))
+        else:
+            raise ValueError(f'Unknown sweep setting {key!r}')
+
+    configs = []
+    for combo in itertools.product(*(values for _, values in axes)):
+        settings = {}
+        for (path, _), value in zip(axes, combo):
+            if len(path) == 2:
+                settings.setdefault(path[0], {})[path[1]] = value
+            else:
+                settings[path[0]] = value
+        configs.append(settings)
+    return configs
+
+
+def _as_list(values):
+    return list(values) if isinstance(values, (list, tuple)) else [values]
+
+
+def build_staff(base_staff, overrides):
+    """Return a staff list with the given role counts replaced."""
+    overrides = overrides or {}
+    staff = [s for s in base_staff if s.get('role') not in overrides]
+    for role, count in overrides.items():
+        staff.extend({'role': role} for _ in range(int(count)))
+    return staff
+
+
+def build_resources(base_resources, overrides):
+    """Return a resources list with the given room/equipment counts replaced.
+
+    Keys are name keywords as used by `flow_sim.STAGE_STAFFING`, e.g. "Room".
+    """
+    overrides = overrides or {}
+    resources = [r for r in base_resources if not any(k in r.get('name', '') for k in overrides)]
+    for keyword, count in overrides.items():
+        resources.extend({'name': f'{keyword} {i + 1}'} for i in range(int(count)))
+    return resources
+
+
+def sim_config(settings, base_config=None):
+    config = dict(base_config or {})
+    for key in SIM_KEYS:
+        if key in settings:
+            config[key] = settings[key]
+    if any(key in settings for key in BALANCE_KEYS):
+        config['balance'] = {
+            'interval': settings.get('balance_interval', 10),
+            'crowd_threshold': settings.get('crowd_threshold', 40),
+            'max_moves_per_stage': settings.get('max_moves_per_stage', 3),
+        }
+    return config
+
+
+def run_scenario(index, settings, replications, seed, base_staff, base_resources, base_config=None):
+    """Run one configuration `replications` times and summarise the runs.
+
+    Module-level so it can be pickled into pool workers.
+    """
+    staff = build_staff(base_staff, settings.get('staff'))
+    resources = build_resources(base_resources, settings.get('rooms'))
+    config = sim_config(settings, base_config)
+
+    means, p95s, throughputs, completed = [], [], [], 0
+    for r in range(replications):
+        result = flow_sim.run_simulation(config, seed=seed + r, staff=staff, resources=resources)
+        means.append(result['wait']['mean'])
+        p95s.append(result['wait']['p95'])
+        throughputs.append(result['throughput_per_hour'])
+        completed += result['completed']
+
+    return {
+        'index': index,
+        'settings': settings,
+        'replications': replications,
+        'mean_wait': round(sum(means) / replications, 2),
+        # mean over replications of each run's p95
+        'p95_wait': round(sum(p95s) / replications, 2),
+        'worst_p95_wait': max(p95s),
+        'throughput_per_hour': round(sum(throughputs) / replications, 2),
+        'completed': completed,
+    }
+
+
+def sweep(grid, replications=5, seed=0, workers=None, base_staff=(), base_resources=(), base_config=None):
+    """Yield one result per configuration, in completion order."""
+    configs = expand_grid(grid)
+    if len(configs) > MAX_CONFIGS:
+        raise ValueError(f'Grid expands to {len(configs)} configurations (limit {MAX_CONFIGS})')
+    if replications < 1:
+        raise ValueError('replications must be at least 1')
+    base_staff, base_resources = list(base_staff), list(base_resources)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for i, settings in enumerate(configs):
+            yield run_scenario(i, settings, replications, seed, base_staff, base_resources, base_config)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_scenario, i, settings, replications, seed, base_staff, base_resources, base_config)
+                   for i, settings in enumerate(configs)]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a what-if sweep of patient flow simulations.')
+    parser.add_argument('grid', help='JSON file with the settings grid, or - for stdin')
+    parser.add_argument('--replications', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    args = parser.parse_args(argv)
+
+    if args.grid == '-':
+        grid = json.load(sys.stdin)
+    else:
+        with open(args.grid) as f:
+            grid = json.load(f)
+
+    # Baseline staffing and rooms are the ones the dashboard app runs with
+    from app import sample_resources, sample_staff
+
+    for result in sweep(grid, args.replications, args.seed, args.workers, sample_staff, sample_resources):
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    main()
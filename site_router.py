@@ -0,0 +1,362 @@
+"""Several branches (sites) behind one local router.
+
+Each site is a separate instance of app.py with its own patients, writer
+lock, auto-flow scheduler, response cache, live stream and files (`{site}`
+in MEDIFLOW_DB / MEDIFLOW_ARCHIVE is replaced with the site id). A burst of
+writes at one site only ever waits for that site's lock. Sites run either
+
+* in this process: app.py is loaded once per site as its own module, so the
+  sites share nothing but the code (and the GIL), or
+* with `--processes`, one child process per site on a local port, which the
+  router forwards requests to over HTTP, so they share no CPU either.
+
+Routes:
+
+* `/api/<site>/...` is the site's own `/api/...` (including the stream),
+* `/sites/<site>/metrics` is the site's `/metrics`,
+* `/api/sites` lists the sites,
+* `/api/sites/overview` is the cross-site overview. It merges each site's
+  `/api/rollup` (counts summed, wait histograms merged bucket by bucket), so
+  no patient list crosses the router,
+* everything else (pages, unprefixed `/api/...`) goes to the default site, so
+  the dashboard keeps working unchanged.
+
+Run from the repo root:
+
+    python site_router.py north,south,east [--processes] [--port 5000]
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import logging
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from werkzeug.serving import make_server
+from werkzeug.test import Client
+
+from wait_stats import WaitHistogram
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+SITE_ID = re.compile(r'^[a-z0-9][a-z0-9_-]*$')
+# Headers that describe one connection and are not forwarded
+HOP_BY_HOP = frozenset(('connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te',
+                        'trailers', 'transfer-encoding', 'upgrade'))
+
+
+def load_site(site):
+    """A fresh instance of app.py serving `site`."""
+    name = f'mediflow_site_{site.replace("-", "_")}'
+    spec = importlib.util.spec_from_file_location(name, APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    previous = os.environ.get('MEDIFLOW_SITE')
+    os.environ['MEDIFLOW_SITE'] = site
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        if previous is None:
+            os.environ.pop('MEDIFLOW_SITE', None)
+        else:
+            os.environ['MEDIFLOW_SITE'] = previous
+    return module
+
+
+def api_names(app):
+    """First path segments of the app's /api routes; no site may use them."""
+    return {rule.rule.split('/')[2] for rule in app.url_map.iter_rules() if rule.rule.startswith('/api/')}
+
+
+def check_sites(sites, reserved=()):
+    """Raise ValueError unless `sites` are distinct, valid ids that do not
+    shadow an API route."""
+    if not sites:
+        raise ValueError('no sites given')
+    if len(set(sites)) != len(sites):
+        raise ValueError('site ids must be distinct')
+    for site in sites:
+        if not SITE_ID.match(site):
+            raise ValueError(f'invalid site id {site!r} (lowercase letters, digits, "-" and "_")')
+        if site == 'sites' or site in reserved:
+            raise ValueError(f'site id {site!r} would shadow /api/{site}')
+    if len(sites) > 1:
+        for variable in ('MEDIFLOW_DB', 'MEDIFLOW_ARCHIVE'):
+            value = os.environ.get(variable)
+            if value and '{site}' not in value:
+                raise ValueError(f'{variable} must contain {{site}} when serving several sites')
+
+
+class SiteProxy:
+    """WSGI app forwarding every request to a site served on a local port.
+    Bodies are passed on as they arrive, so the event stream works too.
+    Chunked request bodies are streamed on chunked when the server has
+    de-chunked the input (`wsgi.input_terminated`) and refused with 411
+    otherwise, since their end cannot be found."""
+
+    def __init__(self, host, port, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def __call__(self, environ, start_response):
+        path = quote((environ.get('PATH_INFO') or '/').encode('latin-1'), safe="/:@!$&'()*+,;=")
+        if environ.get('QUERY_STRING'):
+            path += '?' + environ['QUERY_STRING']
+        if 'chunked' in environ.get('HTTP_TRANSFER_ENCODING', '').lower():
+            if not environ.get('wsgi.input_terminated'):
+                return json_response(start_response, {'status': 'error',
+                                                      'message': 'Chunked request bodies need a Content-Length'},
+                                     '411 Length Required')
+            # an iterable body without a length is sent on chunked
+            body = _blocks(environ['wsgi.input'])
+        else:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            body = environ['wsgi.input'].read(length) if length else None
+        headers = {key[5:].replace('_', '-').title(): value for key, value in environ.items()
+                   if key.startswith('HTTP_') and key[5:].replace('_', '-').lower() not in HOP_BY_HOP}
+        if environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request(environ['REQUEST_METHOD'], path, body, headers)
+            response = conn.getresponse()
+        except OSError as e:
+            conn.close()
+            return json_response(start_response, {'status': 'error', 'message': f'Site unavailable: {e}'},
+                                 '502 Bad Gateway')
+        start_response(f'{response.status} {response.reason}',
+                       [(k, v) for k, v in response.getheaders() if k.lower() not in HOP_BY_HOP])
+        return _relay(conn, response)
+
+
+def _blocks(stream, size=65536):
+    while True:
+        block = stream.read(size)
+        if not block:
+            break
+        yield block
+
+
+def _relay(conn, response):
+    try:
+        while True:
+            chunk = response.read1(65536)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        conn.close()
+
+
+def json_response(start_response, payload, status='200 OK'):
+    body = json.dumps(payload).encode()
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def fetch_json(app, path):
+    response = Client(app).get(path)
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} returned {response.status}')
+    return json.loads(response.get_data())
+
+
+def merge_rollups(rollups):
+    """Cross-site overview from {site: rollup} (see app.py's /api/rollup).
+    Shaped like /api/overview, plus per-site figures, alert counts and the
+    wait-time summaries of all sites' patients together."""
+    active_staff = 0
+    distribution, alerts, waits, sites = {}, {}, {}, {}
+    for site, rollup in rollups.items():
+        overview = rollup['overview']
+        active_staff += overview['active_staff']
+        for stage, n in overview['patient_distribution'].items():
+            distribution[stage] = distribution.get(stage, 0) + n
+        for kind, n in rollup['alerts'].items():
+            alerts[kind] = alerts.get(kind, 0) + n
+        for key, data in rollup['wait'].items():
+            histogram = WaitHistogram.from_dict(data)
+            if key in waits:
+                waits[key].merge(histogram)
+            else:
+                waits[key] = histogram
+        sites[site] = {
+            'version': rollup['version'],
+            'patients': sum(overview['patient_distribution'].values()),
+            'occupancy': overview['occupancy'],
+            'avg_wait_time': overview['avg_wait_time'],
+        }
+    overall = waits.get('all') or WaitHistogram()
+
+    def by(kind):
+        prefix = f'{kind}:'
+        return {key[len(prefix):]: h.summary() for key, h in waits.items() if key.startswith(prefix)}
+
+    return {
+        'sites': sites,
+        'total_patients': sum(s['patients'] for s in sites.values()),
+        'active_staff': active_staff,
+        'occupancy': round(sum(s['occupancy'] for s in sites.values()) / len(sites)) if sites else 0,
+        'avg_wait_time': round(overall.mean() or 0, 1),
+        'patient_distribution': distribution,
+        'alerts': alerts,
+        'wait_times': {'all': overall.summary(), 'by_stage': by('stage'), 'by_priority': by('priority')},
+    }
+
+
+class SiteRouter:
+    """WSGI app dispatching to one WSGI app per site (see module docstring)."""
+
+    def __init__(self, sites, default=None, mode='local'):
+        self.sites = dict(sites)
+        self.default = default or next(iter(self.sites))
+        if self.default not in self.sites:
+            raise ValueError(f'default site {self.default!r} is not one of the sites')
+        self.mode = mode
+        self._pool = ThreadPoolExecutor(max_workers=len(self.sites), thread_name_prefix='site-rollup')
+
+    def __call__(self, environ, start_response):
+        parts = (environ.get('PATH_INFO') or '/').split('/', 3)
+        rest = parts[3] if len(parts) > 3 else ''
+        if len(parts) > 2 and parts[1] == 'api':
+            if parts[2] == 'sites':
+                return self._sites_api(rest, start_response)
+            if parts[2] in self.sites:
+                return self.sites[parts[2]](dict(environ, PATH_INFO='/api/' + rest), start_response)
+        elif len(parts) > 3 and parts[1] == 'sites' and parts[2] in self.sites and rest == 'metrics':
+            return self.sites[parts[2]](dict(environ, PATH_INFO='/metrics'), start_response)
+        return self.sites[self.default](environ, start_response)
+
+    def _sites_api(self, rest, start_response):
+        if rest == '':
+            return json_response(start_response, {'sites': list(self.sites), 'default': self.default,
+                                                  'mode': self.mode})
+        if rest == 'overview':
+            rollups, errors = self.rollups()
+            if not rollups:
+                return json_response(start_response, {'status': 'error', 'message': 'No site answered',
+                                                      'unavailable': errors}, '502 Bad Gateway')
+            return json_response(start_response, dict(merge_rollups(rollups), unavailable=errors))
+        return json_response(start_response, {'status': 'error', 'message': 'Not found'}, '404 NOT FOUND')
+
+    def rollups(self, timeout=10):
+        """({site: rollup}, {site: error}), fetching every site in parallel."""
+        futures = {site: self._pool.submit(fetch_json, app, '/api/rollup') for site, app in self.sites.items()}
+        rollups, errors = {}, {}
+        for site, future in futures.items():
+            try:
+                rollups[site] = future.result(timeout)
+            except Exception as e:
+                errors[site] = str(e)
+        return rollups, errors
+
+
+def local_router(sites, default=None):
+    check_sites(sites)
+    modules = {sites[0]: load_site(sites[0])}
+    check_sites(sites, api_names(modules[sites[0]].app))
+    for site in sites[1:]:
+        modules[site] = load_site(site)
+    return SiteRouter({site: module.app for site, module in modules.items()}, default), modules
+
+
+def start_site_processes(sites, host, base_port, ready_timeout=60, quiet=False):
+    """Start one child process per site on base_port, base_port + 1, ...
+    and wait until each accepts connections. Returns {site: (process, port)}."""
+    children = {}
+    try:
+        for i, site in enumerate(sites):
+            port = base_port + i
+            command = [sys.executable, os.path.abspath(__file__), site, '--serve-site',
+                       '--host', host, '--port', str(port)]
+            children[site] = (subprocess.Popen(command + ['--quiet'] * quiet), port)
+        deadline = time.monotonic() + ready_timeout
+        for site, (process, port) in children.items():
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f'site {site} exited with status {process.returncode}')
+                try:
+                    socket.create_connection((host, port), timeout=0.5).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f'site {site} did not start listening on port {port}')
+                    time.sleep(0.1)
+    except BaseException:
+        stop_site_processes(children)
+        raise
+    return children
+
+
+def stop_site_processes(children):
+    for process, _ in children.values():
+        process.terminate()
+    for process, _ in children.values():
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def process_router(sites, host, base_port, default=None, quiet=False):
+    check_sites(sites)
+    children = start_site_processes(sites, host, base_port, quiet=quiet)
+    proxies = {site: SiteProxy(host, port) for site, (_, port) in children.items()}
+    return SiteRouter(proxies, default, mode='processes'), children
+
+
+def serve_site(site, host, port, quiet=False):
+    """Child process of --processes: serve one site."""
+    if quiet:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    os.environ['MEDIFLOW_SITE'] = site
+    import app as mediflow
+    check_sites([site], api_names(mediflow.app))
+    make_server(host, port, mediflow.app, threaded=True).serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve several sites behind one local router.')
+    parser.add_argument('sites', help='comma-separated site ids, e.g. north,south')
+    parser.add_argument('--default', help='site serving pages and unprefixed /api routes (default: the first)')
+    parser.add_argument('--processes', action='store_true', help='run every site in its own process')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--site-port', type=int, help='first port of the site processes (default: port + 1)')
+    parser.add_argument('--quiet', action='store_true', help='do not log every request')
+    parser.add_argument('--serve-site', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    sites = args.sites.split(',')
+    try:
+        if args.serve_site:
+            serve_site(sites[0], args.host, args.port, args.quiet)
+            return 0
+        if args.processes:
+            router, children = process_router(sites, args.host, args.site_port or args.port + 1, args.default,
+                                              args.quiet)
+        else:
+            router, children = local_router(sites, args.default)[0], {}
+    except (ValueError, RuntimeError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+    if args.quiet:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    print(f'serving sites {", ".join(sites)} on http://{args.host}:{args.port} ({router.mode})')
+    try:
+        make_server(args.host, args.port, router, threaded=True).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_site_processes(children)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,7 +15,7 @@ function loadAnalyticsData() {
 
 function updateKPIs(kpis) {
     document.getElementById('satisfaction-score').textContent = kpis.satisfaction_score + '%';
-    document.getElementById('avg-treatment-time').textContent = kpis.avg_treatment_time + ' min';
+    document.getElementById('avg-wait-time').textContent = kpis.avg_wait_time + ' min';
     document.getElementById('resource-utilization').textContent = kpis.resource_utilization + '%';
     document.getElementById('cost-efficiency').textContent = kpis.cost_efficiency + '%';
 }
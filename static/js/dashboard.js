@@ -23,7 +23,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 manualRadio.checked = !auto;
                 document.getElementById('manual-reassignment-section').style.display = auto ? 'none' : 'block';
             }
-            if (auto) startAutoFlow();
+            if (window.setAutoPolling) window.setAutoPolling(auto);
         } catch (e) {
             console.error('Failed to get flow mode', e);
         }
@@ -35,8 +35,22 @@ function initializeDashboard() {
     // Initialize charts
     initializeCharts();
 
-    // Set up auto-refresh (every 30 seconds)
-    setInterval(loadDashboardData, 30000);
+    // Live updates pushed by the server; full refresh every 30 seconds only
+    // while the push channel is unavailable
+    LiveUpdates.on('overview', updateStatsCards);
+    LiveUpdates.on('distribution', updatePatientDistributionChart);
+    LiveUpdates.on('wait_times', updateWaitTimeAnalysis);
+    LiveUpdates.on('alerts', updateAlerts);
+    LiveUpdates.on('flow_mode', data => {
+        const autoRadio = document.getElementById('auto-mode');
+        const manualRadio = document.getElementById('manual-mode');
+        if (autoRadio && manualRadio) {
+            autoRadio.checked = !!data.auto;
+            manualRadio.checked = !data.auto;
+            document.getElementById('manual-reassignment-section').style.display = data.auto ? 'none' : 'block';
+        }
+    });
+    LiveUpdates.fallback(loadDashboardData, 30000);
 }
 
 // Set up event listeners
@@ -68,12 +82,11 @@ function setupEventListeners() {
         setFlowMode(auto);
         // show/hide manual reassignment section
         document.getElementById('manual-reassignment-section').style.display = auto ? 'none' : 'block';
-        if (auto) startAutoFlow(); else stopAutoFlow();
     }));
 }
 
-let autoFlowInterval = null;
-
+// Auto flow runs on the server (one tick scheduler, however many tabs are
+// open); the page only switches the mode and shows the pushed changes
 async function setFlowMode(auto) {
     try {
         await fetch('/api/flow-mode', {
@@ -81,38 +94,12 @@ async function setFlowMode(auto) {
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({auto: !!auto})
         });
-        if (auto) startAutoFlow(); else stopAutoFlow();
+        if (window.setAutoPolling) window.setAutoPolling(!!auto);
     } catch (e) {
         console.error('Failed to set flow mode', e);
     }
 }
 
-function startAutoFlow() {
-    if (autoFlowInterval) return;
-    // call advance every 10 seconds
-    autoFlowInterval = setInterval(async () => {
-        try {
-            const res = await fetch('/api/advance', {method: 'POST'});
-            const json = await res.json();
-            if (json && json.status === 'success') {
-                // reload dashboard data and patients
-                await loadDashboardData();
-                if (window.fetchPatientsData) window.fetchPatientsData();
-            }
-        } catch (err) {
-            console.error('Auto flow advance failed', err);
-        }
-    }, 10000);
-    if (window.setAutoPolling) window.setAutoPolling(true);
-}
-
-function stopAutoFlow() {
-    if (!autoFlowInterval) return;
-    clearInterval(autoFlowInterval);
-    autoFlowInterval = null;
-    if (window.setAutoPolling) window.setAutoPolling(false);
-}
-
 // Initialize Chart.js charts
 function initializeCharts() {
     // Patient Distribution Chart
@@ -176,43 +163,23 @@ function initializeCharts() {
 }
 
 // Load dashboard data from API
+// One batched snapshot request; the browser revalidates it with the ETag
+// (If-None-Match) so an unchanged dashboard costs an empty 304.
+let lastSnapshotVersion = null;
+
 async function loadDashboardData() {
     try {
-        // Load overview data
-        const overviewResponse = await fetch('/api/overview');
-        const overviewData = await overviewResponse.json();
-
-        // Update stats cards
-        updateStatsCards(overviewData);
-
-        // Load patient distribution data
-        const distributionResponse = await fetch('/api/patient-distribution');
-        const distributionData = await distributionResponse.json();
-
-        // Update patient distribution chart
-        updatePatientDistributionChart(distributionData);
-
-        // Load wait times data
-        const waitTimesResponse = await fetch('/api/wait-times');
-        const waitTimesData = await waitTimesResponse.json();
-
-        // Update wait time analysis
-        updateWaitTimeAnalysis(waitTimesData);
-
-        // Load alerts
-        const alertsResponse = await fetch('/api/alerts');
-        const alertsData = await alertsResponse.json();
-        updateAlerts(alertsData);
-
-        // Load doctors/staff
-        const doctorsResponse = await fetch('/api/doctors');
-        const doctorsData = await doctorsResponse.json();
-        updateDoctorsTable(doctorsData);
-
-        // Load resources
-        const resourcesResponse = await fetch('/api/resources');
-        const resourcesData = await resourcesResponse.json();
-        updateResourcesTable(resourcesData);
+        const response = await fetch('/api/dashboard-snapshot');
+        const snapshot = await response.json();
+        if (snapshot.version === lastSnapshotVersion) return;
+        lastSnapshotVersion = snapshot.version;
+
+        updateStatsCards(snapshot.overview);
+        updatePatientDistributionChart(snapshot.distribution);
+        updateWaitTimeAnalysis(snapshot.wait_times);
+        updateAlerts(snapshot.alerts);
+        updateDoctorsTable(snapshot.staff);
+        updateResourcesTable(snapshot.resources);
 
     } catch (error) {
         console.error('Error loading dashboard data:', error);
@@ -300,8 +267,8 @@ async function simulateActivity() {
         const result = await response.json();
 
         if (result.status === 'success') {
-            // Reload data immediately
-            await loadDashboardData();
+            // Reload data immediately unless the live stream already pushed it
+            if (!LiveUpdates.isConnected()) await loadDashboardData();
             showSuccessMessage('Simulation completed successfully!');
         } else {
             throw new Error(result.message);
@@ -338,8 +305,8 @@ async function resetDashboard() {
         const result = await response.json();
 
         if (result.status === 'success') {
-            // Reload data immediately
-            await loadDashboardData();
+            // Reload data immediately unless the live stream will resync us
+            if (!LiveUpdates.isConnected()) await loadDashboardData();
             showSuccessMessage('Dashboard reset successfully!');
         } else {
             throw new Error(result.message);
@@ -1,6 +1,8 @@
 document.addEventListener('DOMContentLoaded', function() {
     fetchDoctorsData();
-    setInterval(fetchDoctorsData, 10000); // Update every 10 seconds
+    // Nothing on this page changes between pushes, so only poll (every 10
+    // seconds) while the live stream is unavailable
+    LiveUpdates.fallback(fetchDoctorsData, 10000);
 });
 
 function fetchDoctorsData() {
@@ -0,0 +1,95 @@
+// MediFlow - shared live update client
+//
+// Opens one Server-Sent Events connection to /api/stream per page and hands
+// pushed deltas to the page scripts. While the stream is unavailable (no
+// EventSource support, server restart, proxy buffering) each page falls back
+// to its own polling loop; once the stream reconnects polling stops and the
+// page resyncs once.
+
+window.LiveUpdates = (function() {
+    const handlers = {};
+    const pollers = [];
+    let source = null;
+    let connected = false;
+
+    function on(eventName, handler) {
+        (handlers[eventName] = handlers[eventName] || []).push(handler);
+        if (source) attach(eventName);
+    }
+
+    // Register a polling fallback: `poll` runs every `intervalMs` only while
+    // the live stream is down, and once whenever the stream (re)connects.
+    function fallback(poll, intervalMs) {
+        const poller = { poll: poll, intervalMs: intervalMs, timer: null };
+        pollers.push(poller);
+        if (!connected) startPoller(poller);
+        connect();
+    }
+
+    function isConnected() {
+        return connected;
+    }
+
+    function startPoller(poller) {
+        if (poller.timer) return;
+        poller.timer = setInterval(poller.poll, poller.intervalMs);
+    }
+
+    function stopPoller(poller) {
+        if (!poller.timer) return;
+        clearInterval(poller.timer);
+        poller.timer = null;
+    }
+
+    function dispatch(eventName, data) {
+        (handlers[eventName] || []).forEach(handler => {
+            try {
+                handler(data);
+            } catch (e) {
+                console.error(`Live update handler for ${eventName} failed`, e);
+            }
+        });
+    }
+
+    function attach(eventName) {
+        if (attach.bound[eventName]) return;
+        attach.bound[eventName] = true;
+        source.addEventListener(eventName, e => {
+            let data = null;
+            try {
+                data = JSON.parse(e.data);
+            } catch (err) {
+                console.error('Bad live update payload', err);
+                return;
+            }
+            dispatch(eventName, data);
+        });
+    }
+    attach.bound = {};
+
+    function resync() {
+        pollers.forEach(p => p.poll());
+    }
+
+    function connect() {
+        if (source || !window.EventSource) return;
+        source = new EventSource('/api/stream');
+        source.onopen = () => {
+            if (!connected) {
+                connected = true;
+                pollers.forEach(stopPoller);
+                resync();
+            }
+        };
+        source.onerror = () => {
+            if (connected) {
+                connected = false;
+                pollers.forEach(startPoller);
+            }
+        };
+        Object.keys(handlers).forEach(attach);
+        on('resync', resync);
+    }
+
+    return { on: on, fallback: fallback, isConnected: isConnected };
+})();
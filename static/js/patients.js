@@ -2,8 +2,11 @@ document.addEventListener('DOMContentLoaded', function() {
     window.isAutoFlow = false;
     fetchFlowMode();
     fetchPatientsData();
-    // Default polling interval
-    window.patientsPollInterval = setInterval(fetchPatientsData, 10000); // Update every 10 seconds
+    // Patient changes are pushed by the server; poll every 10 seconds only
+    // while the live stream is unavailable
+    LiveUpdates.on('patients', applyPatientChanges);
+    LiveUpdates.on('flow_mode', data => setAutoFlow(!!data.auto));
+    LiveUpdates.fallback(fetchPatientsData, 10000);
     // Fetch auto-config and wire save button
     fetchAutoConfig();
     const saveBtn = document.getElementById('cfg-save');
@@ -17,38 +20,75 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
-function setPatientsPollingInterval(ms) {
-    if (window.patientsPollInterval) clearInterval(window.patientsPollInterval);
-    window.patientsPollInterval = setInterval(fetchPatientsData, ms);
+// Latest known patient records, keyed by id, and the state version they
+// reflect (null until the first full load)
+const patientsById = new Map();
+let patientsVersion = null;
+const PATIENTS_PAGE_SIZE = 500;
+
+function setAutoFlow(enabled) {
+    // the server advances and balances patients while auto flow is on; the
+    // page only hides the manual move controls
+    window.isAutoFlow = enabled;
+    renderPatients();
 }
 
 function setAutoPolling(enabled) {
-    if (enabled) setPatientsPollingInterval(5000);
-    else setPatientsPollingInterval(10000);
+    setAutoFlow(enabled);
 }
 
 function fetchPatientsData() {
-    fetch('/api/patients')
+    if (patientsVersion === null) {
+        fetchAllPatients();
+        return;
+    }
+    // Only the patients changed since the last fetch; `full` means the
+    // server could not tell (e.g. after a reset) and sent everyone
+    fetch(`/api/patients?since=${patientsVersion}`)
         .then(response => response.json())
         .then(data => {
-            updatePatientsTables(data);
-            // if in auto flow, ask server to check and balance crowded departments
-            if (window.isAutoFlow) {
-                fetch('/api/check-balance')
-                    .then(r => r.json())
-                    .then(res => {
-                        if (res.moved && res.moved.length) {
-                            console.log('Auto-balance moved:', res.moved);
-                            // refresh tables after auto-move
-                            fetchPatientsData();
-                        }
-                    })
-                    .catch(e => console.error('Error checking balance:', e));
-            }
+            if (data.full) patientsById.clear();
+            data.changed.forEach(p => patientsById.set(p.id, p));
+            data.removed.forEach(id => patientsById.delete(id));
+            patientsVersion = data.version;
+            renderPatients();
         })
         .catch(error => console.error('Error fetching patients data:', error));
 }
 
+function fetchAllPatients() {
+    // Page through the list; anything that changes meanwhile is picked up by
+    // the next `since` fetch from the first page's version
+    const loaded = new Map();
+    let version = null;
+    const loadPage = cursor => fetch(`/api/patients?limit=${PATIENTS_PAGE_SIZE}` +
+                                     (cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''))
+        .then(response => response.json())
+        .then(data => {
+            if (version === null) version = data.version;
+            data.patients.forEach(p => loaded.set(p.id, p));
+            return data.next_cursor ? loadPage(data.next_cursor) : null;
+        });
+    loadPage(null)
+        .then(() => {
+            patientsById.clear();
+            loaded.forEach((p, id) => patientsById.set(id, p));
+            patientsVersion = version;
+            renderPatients();
+        })
+        .catch(error => console.error('Error fetching patients data:', error));
+}
+
+function applyPatientChanges(delta) {
+    (delta.changed || []).forEach(p => patientsById.set(p.id, p));
+    (delta.removed || []).forEach(id => patientsById.delete(id));
+    renderPatients();
+}
+
+function renderPatients() {
+    updatePatientsTables(Array.from(patientsById.values()));
+}
+
 function updatePatientsTables(patients) {
     // Group patients by stage
     const stages = {
@@ -146,7 +186,7 @@ function fetchFlowMode() {
     fetch('/api/flow-mode')
         .then(r => r.json())
         .then(data => {
-            window.isAutoFlow = !!data.auto;
+            setAutoFlow(!!data.auto);
         })
         .catch(e => console.error('Error fetching flow mode:', e));
 }
@@ -189,7 +229,7 @@ function movePatient(id, toStage) {
     .then(r => r.json())
     .then(res => {
         if (res.status === 'success') {
-            fetchPatientsData();
+            if (!LiveUpdates.isConnected()) fetchPatientsData();
         } else {
             console.error('Move failed', res);
             alert('Move failed');
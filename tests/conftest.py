@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mediflow():
+    """app.py reset to the sample patients, flow manual."""
+    import app
+    app.flow_mode['auto'] = False
+    app.app.test_client().post('/api/reset')
+    return app
+
+
+@pytest.fixture
+def client(mediflow):
+    return mediflow.app.test_client()
@@ -0,0 +1,30 @@
+def scan(mediflow):
+    """Wait and age chart data from scanning every patient in care."""
+    current = [p for p in mediflow.patient_registry if p.get('stage') != 'Discharge']
+    waits = [p.get('waiting_time') or 0 for p in current]
+    ages = [p['age'] for p in current]
+    return ([sum(w < 15 for w in waits), sum(15 <= w < 30 for w in waits), sum(w >= 30 for w in waits)],
+            [sum(a < 18 for a in ages), sum(18 <= a < 40 for a in ages),
+             sum(40 <= a < 65 for a in ages), sum(a >= 65 for a in ages)])
+
+
+def test_current_charts_match_a_scan_of_the_patients(client, mediflow):
+    client.post('/api/simulate', json={'seed': 3})
+    client.post('/api/move-patient', json={'id': 1, 'to_stage': 'Discharge'})
+    charts = client.get('/api/analytics').get_json()['charts']
+    waits, ages = scan(mediflow)
+    assert charts['waiting_time']['data'] == waits
+    assert charts['demographics'] == {'labels': ['0-17', '18-39', '40-64', '65+'], 'data': ages}
+
+
+def test_age_bands_follow_reset(client, mediflow):
+    client.post('/api/simulate', json={'seed': 4})
+    client.post('/api/reset')
+    assert client.get('/api/analytics').get_json()['charts']['demographics']['data'] == scan(mediflow)[1]
+
+
+def test_untracked_series_are_empty(client):
+    body = client.get('/api/analytics').get_json()
+    assert 'avg_treatment_time' not in body['kpis'] and 'avg_wait_time' in body['kpis']
+    usage = body['charts']['resource_usage']
+    assert usage['mri'] == usage['ct'] == usage['xray'] == [] and usage['note']
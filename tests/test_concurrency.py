@@ -0,0 +1,31 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import stress_state
+
+
+def test_concurrent_mixed_requests_keep_invariants(mediflow, monkeypatch):
+    """A smaller run of benchmarks/stress_state.py: mixed reads and writes on
+    8 threads while the auto flow ticks and discharged patients are archived
+    almost at once."""
+    monkeypatch.setitem(mediflow.auto_config, 'tick_seconds', 0.005)
+    monkeypatch.setattr(mediflow.lifecycle, 'retention', 0.05)
+    before = mediflow.flow_scheduler.stats()
+    mediflow.flow_mode['auto'] = True
+    mediflow.flow_scheduler.ensure_started()
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    failures = []
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            for i in range(8):
+                pool.submit(stress_state.worker, i, 150, failures)
+    finally:
+        sys.setswitchinterval(old_interval)
+        mediflow.flow_mode['auto'] = False
+        mediflow.flow_scheduler.wake()
+    assert failures == []
+    after = mediflow.flow_scheduler.stats()
+    assert after['ticks'] > before['ticks'] and after['errors'] == before['errors']
+    with mediflow.state_lock:
+        assert stress_state.check_invariants(0) == []
@@ -0,0 +1,85 @@
+import json
+import random
+import time
+
+import persistence
+from benchmarks import soak_memory
+from lifecycle import JsonlArchive, PatientLifecycle
+from patient_store import PatientRegistry
+
+STAGES = ['Reception', 'Treatment', 'Discharge']
+
+
+def patient(pid, stage='Reception'):
+    return {'id': pid, 'name': f'Patient {pid}', 'stage': stage, 'priority': 'Low', 'waiting_time': 0}
+
+
+def test_discharged_patients_are_archived_after_retention(tmp_path):
+    now = [1000.0]
+    registry = PatientRegistry(STAGES)
+    archive = JsonlArchive(tmp_path / 'archive.jsonl')
+    lifecycle = PatientLifecycle(registry, retention=600, archive=archive, clock=lambda: now[0])
+    registry.add_listener(lifecycle.listener)
+    for pid in range(1, 5):
+        registry.add(patient(pid))
+    registry.move(1, 'Discharge')
+    now[0] += 300
+    registry.move(2, 'Discharge')
+    registry.move(3, 'Discharge')
+    registry.move(3, 'Treatment')  # back in care: no longer due
+
+    assert lifecycle.sweep() == []
+    now[0] += 301
+    assert [p['id'] for p in lifecycle.sweep()] == [1]
+    now[0] += 300
+    assert [p['id'] for p in lifecycle.sweep()] == [2]
+    assert sorted(p['id'] for p in registry) == [3, 4] and len(lifecycle) == 0
+    archived = [json.loads(line) for line in (tmp_path / 'archive.jsonl').read_text().splitlines()]
+    assert [(p['id'], p['archived_at']) for p in archived] == [(1, 1601.0), (2, 1901.0)]
+
+
+def test_archived_ids_are_not_handed_out_again(tmp_path):
+    db = persistence.PatientStore(persistence.ConnectionPool(str(tmp_path / 'db.sqlite')))
+    db.ensure_schema()
+    db.archive_patients([patient(41, 'Discharge')], time.time())
+    registry = PatientRegistry(STAGES, [patient(1)])
+    registry.reserve_ids(db.last_archived_id())
+    assert registry.next_id() == 42
+
+
+def test_total_patients_counts_the_registry(client, mediflow):
+    assert client.get('/api/overview').get_json()['total_patients'] == len(mediflow.sample_patients)
+    client.post('/api/simulate', json={'seed': 5})
+    assert client.get('/api/overview').get_json()['total_patients'] == len(mediflow.patient_registry)
+
+
+def test_archiving_lowers_total_patients(client, mediflow, monkeypatch):
+    client.post('/api/move-patient', json={'id': 1, 'to_stage': 'Discharge'})
+    before = client.get('/api/overview').get_json()['total_patients']
+    monkeypatch.setattr(mediflow.lifecycle, 'clock', lambda: time.time() + 10 ** 6)
+    with mediflow.state_lock:
+        archived = mediflow.archive_discharged()
+        mediflow.publish_changes(removed=archived)
+    assert 1 in archived and 1 not in mediflow.patient_registry
+    assert client.get('/api/overview').get_json()['total_patients'] == before - len(archived)
+
+
+def test_patient_count_stays_flat_over_simulated_days(client, mediflow, monkeypatch):
+    """A shorter benchmarks/soak_memory.py: after the first day, archiving
+    keeps the patients held level while admissions continue."""
+    rng = random.Random(3)
+    now = [time.time()]
+    for component in (mediflow.lifecycle, mediflow.movement_log, mediflow.wait_stats, mediflow.alert_engine):
+        monkeypatch.setattr(component, 'clock', lambda: now[0])
+    monkeypatch.setattr(mediflow.lifecycle, 'retention', 4 * 3600)
+    mediflow.lifecycle.sync(mediflow.patient_registry)
+    held = []
+    for day in range(3):
+        for _ in range(24 * 3600 // soak_memory.SLOT_SECONDS):
+            now[0] += soak_memory.SLOT_SECONDS
+            client.post('/api/simulate', json={'seed': rng.randrange(1 << 30)})
+            soak_memory.admit(20, rng)
+            soak_memory.move_everyone(rng)
+        held.append(len(mediflow.patient_registry))
+    assert mediflow.lifecycle.stats['archived'] > 2 * 24 * 3600 // soak_memory.SLOT_SECONDS * 20
+    assert max(held[1:]) <= held[0] * 1.1 + 20
@@ -0,0 +1,48 @@
+import json
+
+
+def stream_events(client, mediflow, action):
+    """{event: data} of what an SSE subscriber receives after `action()`."""
+    heartbeat = mediflow.live_broker.heartbeat
+    mediflow.live_broker.heartbeat = 0.05
+    response = client.get('/api/stream')
+    try:
+        chunks = iter(response.response)
+        next(chunks)  # retry hint: the client is subscribed from here on
+        action()
+        events = {}
+        for chunk in chunks:
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith(':'):  # keep-alive: nothing more queued
+                break
+            fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+            events[fields['event']] = json.loads(fields['data'])
+        return events
+    finally:
+        response.close()
+        mediflow.live_broker.heartbeat = heartbeat
+
+
+def test_auto_flow_tick_pushes_overview_and_wait_times(client, mediflow):
+    mediflow.flow_mode['auto'] = True
+    try:
+        events = stream_events(client, mediflow, mediflow.flow_tick)
+    finally:
+        mediflow.flow_mode['auto'] = False
+    assert mediflow.last_tick['advanced']
+    assert events['overview'] == mediflow.read_view['overview']
+    assert events['wait_times'] == mediflow.read_view['wait_times']
+
+
+def test_manual_move_pushes_wait_times(client, mediflow):
+    before = mediflow.read_view['wait_times']
+    events = stream_events(client, mediflow, lambda: client.post('/api/move-patient', json={'id': 1,
+                                                                                           'to_stage': 'Screening'}))
+    assert events['wait_times'] == mediflow.read_view['wait_times'] != before
+    assert events['wait_times']['by_stage']['Screening']['count'] == 1
+
+
+def test_unchanged_figures_are_not_pushed_again(client, mediflow):
+    events = stream_events(client, mediflow, lambda: client.post('/api/move-patient', json={'id': 999,
+                                                                                           'to_stage': 'Imaging'}))
+    assert 'wait_times' not in events and 'overview' not in events
@@ -0,0 +1,79 @@
+import base64
+import json
+import threading
+
+import pytest
+
+
+def cursor(*key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+@pytest.mark.parametrize('key', [
+    ('waiting_time', None, 3),
+    ('waiting_time', 'x', 3),
+    ('waiting_time', True, 3),
+    ('waiting_time', 5, None),
+    ('waiting_time', 5, 2.5),
+    ('waiting_time', 5, True),
+    ('id', [1], 3),
+    ('entry_time', 5, 3),
+])
+def test_malformed_cursor_is_rejected(client, key):
+    response = client.get(f'/api/patients?limit=2&sort={key[0]}&cursor={cursor(*key)}')
+    assert response.status_code == 400
+
+
+def test_pages_follow_the_cursor(client):
+    first = client.get('/api/patients?limit=2&sort=waiting_time&order=desc').get_json()
+    rest = client.get(f'/api/patients?limit=10&sort=waiting_time&order=desc'
+                      f'&cursor={first["next_cursor"]}').get_json()
+    waits = [p['waiting_time'] for p in first['patients'] + rest['patients']]
+    assert waits == sorted(waits, reverse=True) and len(waits) == 5
+    assert rest['next_cursor'] is None
+
+
+def test_page_is_served_while_a_writer_holds_the_lock(client, mediflow):
+    result = {}
+    with mediflow.state_lock:
+        reader = threading.Thread(target=lambda: result.update(
+            response=client.get('/api/patients?limit=2&sort=waiting_time')))
+        reader.start()
+        reader.join(5)
+        assert not reader.is_alive(), 'paged read waited for the writer lock'
+    assert result['response'].status_code == 200
+
+
+def test_pages_stay_consistent_during_moves(client, mediflow):
+    ids = []
+    with mediflow.state_lock:
+        for i in range(2000):
+            ids.append(mediflow.patient_registry.next_id())
+            mediflow.patient_registry.add(dict(mediflow.sample_patients[0], id=ids[-1], waiting_time=i % 60))
+        mediflow.publish_changes()
+    stop = threading.Event()
+    moves = []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            with mediflow.state_lock:
+                mediflow.patient_registry.move(ids[i % len(ids)], mediflow.STAGE_ORDER[i % 7],
+                                               waiting_time=(i * 13) % 60)
+            i += 1
+            moves.append(i)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(200):
+            response = client.get('/api/patients?limit=100&sort=waiting_time&stage=Reception')
+            assert response.status_code == 200
+            page = response.get_json()['patients']
+            seen = [p['id'] for p in page]
+            assert len(seen) == len(set(seen))
+    finally:
+        stop.set()
+        thread.join()
+    assert len(moves) > 200, 'the writer stopped early'
+    mediflow.patient_registry.check_consistency()
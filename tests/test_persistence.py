@@ -0,0 +1,52 @@
+import sqlite3
+
+import migrations
+import persistence
+from patient_store import PatientRegistry
+
+STAGES = ['Reception', 'Imaging']
+
+
+def patient(pid, **fields):
+    return dict({'id': pid, 'name': f'Patient {pid}', 'age': 40, 'condition': 'General', 'status': 'Waiting',
+                 'stage': 'Reception', 'priority': 'Medium', 'doctor_id': None, 'entry_time': '10:15',
+                 'waiting_time': 25}, **fields)
+
+
+def open_store(path):
+    db = persistence.PatientStore(persistence.ConnectionPool(str(path)))
+    db.ensure_schema()
+    return db
+
+
+def test_entry_time_is_stored_as_unix_time_with_the_label_beside_it(tmp_path):
+    db = open_store(tmp_path / 'db.sqlite')
+    registry = PatientRegistry(STAGES)
+    db.track(registry)
+    registry.add(patient(1))
+    registry.add(patient(2, entry_time='now', waiting_time=0))
+    db.flush()
+    registry.move(1, 'Imaging', waiting_time=40)
+    db.flush()
+    rows = {r['id']: r for r in db.pool.connection().execute(
+        'SELECT id, entry_label, typeof(entry_time) AS kind, entry_time - created_at AS wait FROM patients')}
+    assert [rows[1]['kind'], rows[2]['kind']] == ['real', 'real']
+    # app_clean reads entry_time - created_at as the wait
+    assert (rows[1]['wait'], rows[2]['wait']) == (40 * 60, 0)
+    assert [p['entry_time'] for p in db.load_patients()] == ['10:15', 'now']
+
+
+def test_migration_moves_labels_out_of_entry_time(tmp_path):
+    path = tmp_path / 'db.sqlite'
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn, 5)
+    conn.execute("INSERT INTO patients (id, name, stage, entry_time, waiting_time, created_at) "
+                 "VALUES (1, 'a', 'Reception', '10:15', 25, 1000)")
+    conn.execute("INSERT INTO patients (id, name, stage, entry_time, created_at) VALUES (2, 'b', 'Reception', 1600, 1000)")
+    conn.commit()
+    conn.close()
+    db = open_store(path)
+    rows = db.pool.connection().execute('SELECT id, entry_time, entry_label FROM patients ORDER BY id').fetchall()
+    assert [tuple(r) for r in rows] == [(1, 1000 + 25 * 60, '10:15'), (2, 1600, None)]
+    loaded = db.load_patients()
+    assert loaded[0]['entry_time'] == '10:15' and loaded[1]['entry_time'].count(':') == 1
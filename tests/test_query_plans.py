@@ -0,0 +1,37 @@
+import sqlite3
+
+import pytest
+
+import migrations
+from benchmarks import check_query_plans as plans
+
+
+def rows(conn, sql, params):
+    # averages may differ in the last bit with the summation order
+    return [tuple(round(v, 9) if isinstance(v, float) else v for v in row) for row in conn.execute(sql, params)]
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    """Synthetic database populated before the index migrations, then
+    migrated, as an existing deployment would be."""
+    conn = sqlite3.connect(tmp_path_factory.mktemp('plans') / 'plans.db')
+    migrations.migrate(conn, target=plans.INDEX_MIGRATION - 1)
+    plans.populate(conn, 20_000)
+    migrations.migrate(conn)
+    conn.execute('ANALYZE')
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('name, sql, params, index, no_temp_btree', plans.HOT_QUERIES,
+                         ids=[query[0] for query in plans.HOT_QUERIES])
+def test_hot_query_uses_its_index(conn, name, sql, params, index, no_temp_btree):
+    plan, problems = plans.plan_problems(conn, sql, params, index, no_temp_btree)
+    assert problems == [], plan
+
+
+@pytest.mark.parametrize('name, sql, params, index, no_temp_btree', plans.HOT_QUERIES,
+                         ids=[query[0] for query in plans.HOT_QUERIES])
+def test_bucket_columns_give_the_same_rows(conn, name, sql, params, index, no_temp_btree):
+    assert rows(conn, sql, params) == rows(conn, plans.unindexed(sql), params)
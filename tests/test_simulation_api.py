@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+import flow_sim
+
+
+@pytest.mark.parametrize('config', [
+    {'duration': 1e9},
+    {'duration': float('nan')},
+    {'arrival_rate': 1e7},
+    {'arrival_rate': 900, 'duration': 10000},
+    {'initial_queues': {'Reception': 1e8}},
+    {'initial_queues': {'Reception': 5000, 'Imaging': 5001}},
+    {'initial_queues': {'Reception': -1}},
+    {'initial_queues': ['Reception']},
+    {'balance': {'interval': 1e-9}},
+])
+def test_oversized_simulation_is_rejected(client, config):
+    start = time.perf_counter()
+    response = client.post('/api/simulation/run', json=config)
+    assert response.status_code == 400
+    assert time.perf_counter() - start < 1
+
+
+def test_simulation_within_limits_runs(client):
+    limits = flow_sim.REQUEST_LIMITS
+    response = client.post('/api/simulation/run', json={'seed': 1, 'duration': 600, 'arrival_rate': 20,
+                                                        'initial_queues': {'Reception': limits['initial_queues']}})
+    assert response.status_code == 200
+    assert response.get_json()['result']['arrivals'] > 0
+
+
+def test_sweep_checks_every_configuration(client):
+    response = client.post('/api/scenarios/sweep', json={'grid': {'duration': [600, 1e9]}})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('seed', [{'a': 1}, [1], 1.5, True])
+def test_simulate_rejects_unusable_seeds(client, mediflow, seed):
+    version = mediflow.read_view['version']
+    assert client.post('/api/simulate', json={'seed': seed}).status_code == 400
+    assert client.post('/api/simulation/run', json={'seed': seed}).status_code == 400
+    assert mediflow.read_view['version'] == version
+
+
+@pytest.mark.parametrize('seed', [7, 'monday'])
+def test_simulate_is_reproducible_for_a_seed(client, mediflow, seed):
+    results = []
+    for _ in range(2):
+        client.post('/api/reset')
+        client.post('/api/simulate', json={'seed': seed})
+        # ids keep counting across resets, so compare everything else
+        results.append([(p['stage'], p['priority'], p['age'], p['waiting_time'])
+                        for p in client.get('/api/patients').get_json()])
+    assert results[0] == results[1]
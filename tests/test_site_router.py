@@ -0,0 +1,60 @@
+import http.client
+import io
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import site_router
+
+
+def echo(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'application/octet-stream')])
+    return [body]
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(app):
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_port
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_chunked_body_is_streamed_to_the_site(serve):
+    port = serve(site_router.SiteProxy('127.0.0.1', serve(echo)))
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('POST', '/api/patients', body=iter([b'{"name": ', b'"Ada"}']),
+                 headers={'Content-Type': 'application/json'}, encode_chunked=True)
+    response = conn.getresponse()
+    assert (response.status, response.read()) == (200, b'{"name": "Ada"}')
+    conn.close()
+
+
+def test_chunked_body_without_end_is_refused(serve):
+    proxy = site_router.SiteProxy('127.0.0.1', serve(echo))
+    statuses = []
+    environ = {'REQUEST_METHOD': 'POST', 'PATH_INFO': '/api/patients', 'HTTP_TRANSFER_ENCODING': 'chunked',
+               'wsgi.input': io.BytesIO(b'5\r\nhello\r\n0\r\n\r\n')}
+    proxy(environ, lambda status, headers: statuses.append(status))
+    assert statuses == ['411 Length Required']
+
+
+def rollup(site, distribution):
+    return {'site': site, 'version': 1, 'alerts': {}, 'wait': {},
+            'overview': {'total_patients': 145, 'active_staff': 10, 'occupancy': 80, 'avg_wait_time': 0,
+                         'patient_distribution': distribution}}
+
+
+def test_total_patients_is_the_sum_of_site_patients():
+    merged = site_router.merge_rollups({'north': rollup('north', {'Reception': 2, 'Discharge': 1}),
+                                        'south': rollup('south', {'Imaging': 4})})
+    assert merged['total_patients'] == 7 == sum(s['patients'] for s in merged['sites'].values())
@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks import check_startup as startup
+
+
+@pytest.mark.parametrize('module', sorted(startup.BUDGETS))
+def test_import_stays_within_budget(module):
+    seconds, rss_mb, lazy = startup.BUDGETS[module]
+    runs = []
+    for _ in range(3):
+        stats, error = startup.probe(module, lazy)
+        if error:
+            pytest.skip(f'{module} cannot be imported here: {error}')
+        runs.append(stats)
+    best = min(runs, key=lambda stats: stats['seconds'])
+    assert best['loaded'] == [], 'loaded at import'
+    assert best['rss_mb'] <= rss_mb
+    assert best['seconds'] <= seconds
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from benchmarks import check_wait_stats as checks
+from wait_stats import WaitHistogram
+
+
+@pytest.mark.parametrize('name', sorted(checks.DISTRIBUTIONS))
+def test_histogram_matches_exact_percentiles(name):
+    rng = random.Random(1)
+    values = [checks.DISTRIBUTIONS[name](rng) for _ in range(20_000)]
+    histogram = WaitHistogram()
+    for value in values:
+        histogram.add(value)
+    assert checks.misses(name, histogram, values) == []
+
+    rng.shuffle(values)
+    for value in values[10_000:]:
+        histogram.remove(value)
+    assert checks.misses(name, histogram, values[:10_000]) == []
+
+
+def test_registry_stats_match_exact_percentiles():
+    assert checks.check_registry(30, random.Random(2)) == []
+
+
+def test_sliding_windows_match_exact_percentiles():
+    assert checks.check_windows(20_000, random.Random(3)) == []
+
+
+def test_count_below_matches_a_count_of_whole_minute_waits():
+    rng = random.Random(4)
+    values = [rng.randint(0, 136) for _ in range(5_000)]
+    histogram = WaitHistogram()
+    for value in values:
+        histogram.add(value)
+    for limit in (1, 15, 30, 45, 136):
+        assert histogram.count_below(limit) == sum(v < limit for v in values)
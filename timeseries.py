@@ -0,0 +1,164 @@
+"""Columnar time-series store with incremental rollups.
+
+A fixed set of metrics is sampled together (e.g. per-stage counts and mean
+waits on every dashboard tick). Each sample is folded straight into
+fixed-size ring buffers at three resolutions:
+
+    level    bucket    retained
+    minute   60 s      2 days     (2880 buckets)
+    hour     1 h       90 days    (2160 buckets)
+    day      1 day     2 years    (730 buckets)
+
+Every level keeps, column-wise in `array` buffers laid out bucket-major
+(`bucket * n_metrics + metric`), the sample count, sum, min and max of every
+metric. Adding a sample is O(levels * metrics), no raw samples are kept, and
+memory is fixed when the store is created (see `nbytes`), however long the
+app runs. Queries read the finest level that covers the range in at most
+`max_points` buckets, so a 30-day trend reads 720 hourly buckets.
+"""
+from array import array
+
+DEFAULT_LEVELS = (
+    ('minute', 60, 2 * 24 * 60),
+    ('hour', 3600, 90 * 24),
+    ('day', 86400, 2 * 365),
+)
+
+
+class _Level:
+    def __init__(self, name, resolution, capacity, n_metrics):
+        self.name = name
+        self.resolution = resolution
+        self.capacity = capacity
+        cells = capacity * n_metrics
+        # bucket number (ts // resolution) currently held by each slot
+        self.bucket_ids = array('q', [-1]) * capacity
+        self.counts = array('I', [0]) * cells
+        self.sums = array('d', [0.0]) * cells
+        self.mins = array('d', [0.0]) * cells
+        self.maxs = array('d', [0.0]) * cells
+
+    def arrays(self):
+        return (self.bucket_ids, self.counts, self.sums, self.mins, self.maxs)
+
+
+class TimeSeriesStore:
+    def __init__(self, metrics, levels=DEFAULT_LEVELS):
+        self.metrics = list(metrics)
+        self._index = {name: i for i, name in enumerate(self.metrics)}
+        self.levels = [_Level(name, res, cap, len(self.metrics)) for name, res, cap in levels]
+        self.samples = 0
+        self.last_ts = None
+
+    def __contains__(self, metric):
+        return metric in self._index
+
+    def nbytes(self):
+        """Memory held by the ring buffers, in bytes."""
+        return sum(a.itemsize * len(a) for level in self.levels for a in level.arrays())
+
+    # -- writing --------------------------------------------------------------
+
+    def add(self, ts, values):
+        """Fold one sample `{metric: value}` taken at unix time `ts` into
+        every rollup level. Metrics left out (or None) are not sampled."""
+        cells = [(self._index[name], float(v)) for name, v in values.items() if v is not None]
+        m = len(self.metrics)
+        for level in self.levels:
+            bucket = int(ts // level.resolution)
+            slot = bucket % level.capacity
+            base = slot * m
+            held = level.bucket_ids[slot]
+            if held != bucket:
+                if held > bucket:
+                    continue  # older than anything this level still keeps
+                level.bucket_ids[slot] = bucket
+                for k in range(base, base + m):
+                    level.counts[k] = 0
+            counts, sums, mins, maxs = level.counts, level.sums, level.mins, level.maxs
+            for j, v in cells:
+                k = base + j
+                if counts[k]:
+                    sums[k] += v
+                    if v < mins[k]:
+                        mins[k] = v
+                    if v > maxs[k]:
+                        maxs[k] = v
+                else:
+                    sums[k] = mins[k] = maxs[k] = v
+                counts[k] += 1
+        self.samples += 1
+        self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+
+    # -- reading --------------------------------------------------------------
+
+    def pick_level(self, start, end, max_points=1000):
+        """Finest level that still holds `start` and spans [start, end] in at
+        most `max_points` buckets (the coarsest level otherwise)."""
+        for level in self.levels:
+            first, last = int(start // level.resolution), int(end // level.resolution)
+            if last - first + 1 <= max_points and first > last - level.capacity:
+                return level
+        return self.levels[-1]
+
+    def query(self, metric, start, end, stat='mean', max_points=1000, level=None):
+        """Return (level, bucket start times, values) for `metric` over
+        [start, end]. `stat` is mean, min, max, sum or count; buckets with no
+        samples are None."""
+        j = self._index[metric]
+        level = self.pick_level(start, end, max_points) if level is None else self._level(level)
+        m, res, cap = len(self.metrics), level.resolution, level.capacity
+        first, last = int(start // res), int(end // res)
+        first = max(first, last - cap + 1)
+        times, values = [], []
+        for bucket in range(first, last + 1):
+            times.append(bucket * res)
+            slot = bucket % cap
+            k = slot * m + j
+            if level.bucket_ids[slot] != bucket or not level.counts[k]:
+                values.append(None)
+            else:
+                values.append(_stat(level, k, stat))
+        return level, times, values
+
+    def aggregate(self, metric, start, end, stat='mean', max_points=1000):
+        """One value for `metric` over [start, end], from the same buckets
+        `query` would read. None if nothing was sampled."""
+        j = self._index[metric]
+        level = self.pick_level(start, end, max_points)
+        m, res, cap = len(self.metrics), level.resolution, level.capacity
+        last = int(end // res)
+        first = max(int(start // res), last - cap + 1)
+        count, total, low, high = 0, 0.0, None, None
+        for bucket in range(first, last + 1):
+            slot = bucket % cap
+            k = slot * m + j
+            if level.bucket_ids[slot] != bucket or not level.counts[k]:
+                continue
+            count += level.counts[k]
+            total += level.sums[k]
+            low = level.mins[k] if low is None else min(low, level.mins[k])
+            high = level.maxs[k] if high is None else max(high, level.maxs[k])
+        if not count:
+            return None
+        return {'mean': total / count, 'sum': total, 'count': count, 'min': low, 'max': high}[stat]
+
+    def _level(self, name):
+        for level in self.levels:
+            if level.name == name:
+                return level
+        raise KeyError(name)
+
+
+def _stat(level, k, stat):
+    if stat == 'mean':
+        return level.sums[k] / level.counts[k]
+    if stat == 'min':
+        return level.mins[k]
+    if stat == 'max':
+        return level.maxs[k]
+    if stat == 'sum':
+        return level.sums[k]
+    if stat == 'count':
+        return level.counts[k]
+    raise ValueError(f'Unknown statistic {stat!r}')
@@ -0,0 +1,246 @@
+"""Waiting-time prediction model: training, on-disk cache and batch scoring.
+
+The model maps (hour of day, day of week, patients created in that hour) to
+the average wait in minutes, as trained on the hourly rollup of the patients
+table. Everything works on NumPy arrays:
+
+* training reads the rollup straight into a float matrix (no DataFrame),
+* scoring builds one feature matrix for all waiting patients, predicts only
+  its distinct rows in a single call and broadcasts the results back, so
+  10k patients cost about as much as the few hundred distinct rows among
+  them.
+
+The trained model is pickled to `path` and loaded on first use, not at
+import. `RetrainWorker` retrains in a background thread when the patients
+table changes and swaps the new model in. Requests keep scoring with the
+old model meanwhile.
+"""
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+FEATURES = ('hour', 'day_of_week', 'patient_count')
+
+# Hourly rollup the model is trained on (served by idx_patients_created_hour)
+TRAINING_QUERY = '''
+    SELECT
+        strftime('%H', MIN(created_at), 'unixepoch') AS hour,
+        strftime('%w', MIN(created_at), 'unixepoch') AS day_of_week,
+        COUNT(*) AS patient_count,
+        AVG((entry_time - created_at) / 60) AS avg_waiting_time
+    FROM patients
+    GROUP BY created_hour
+    ORDER BY created_hour DESC
+    LIMIT ?
+'''
+
+# Patients still in the hospital. The two ranges let SQLite use
+# idx_patients_stage; `stage != 'Discharge'` would scan the table.
+WAITING_QUERY = '''
+    SELECT id, created_at FROM patients
+    WHERE (stage < 'Discharge' OR stage > 'Discharge') AND created_at IS NOT NULL
+'''
+
+# Patients per arrival hour (as hour numbers) from the first waiting
+# patient's hour on, read from idx_patients_created_hour alone
+HOUR_COUNTS_QUERY = '''
+    SELECT CAST(MIN(created_at) / 3600 AS INTEGER), COUNT(*) FROM patients
+    WHERE created_hour >= strftime('%Y-%m-%d %H', ?, 'unixepoch')
+    GROUP BY created_hour
+'''
+
+MODEL_OPTIONS = {
+    'n_estimators': 100,
+    'max_depth': 12,
+    'random_state': 42,
+}
+
+
+def load_training_data(conn, limit=1000):
+    """(X, y) float arrays from the hourly rollup; missing values become 0."""
+    rows = conn.execute(TRAINING_QUERY, (limit,)).fetchall()
+    data = np.array([tuple(row) for row in rows], dtype=float).reshape(-1, len(FEATURES) + 1)
+    data = np.nan_to_num(data)
+    return data[:, :-1], data[:, -1]
+
+
+def data_marker(conn):
+    """Changes whenever patients are added or removed; used to skip
+    retraining on unchanged data."""
+    return tuple(conn.execute('SELECT COUNT(*), MAX(created_at) FROM patients').fetchone())
+
+
+def train(X, y, options=None):
+    """Fit the scaler and forest on (X, y). Returns the model bundle that is
+    pickled to disk."""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    scaler = StandardScaler()
+    model = RandomForestRegressor(**{**MODEL_OPTIONS, **(options or {})})
+    model.fit(scaler.fit_transform(X_train), y_train)
+    return {
+        'model': model,
+        'scaler': scaler,
+        'features': FEATURES,
+        'trained_at': time.time(),
+        'rows': len(X),
+        'test_score': float(model.score(scaler.transform(X_test), y_test)) if len(X_test) > 1 else None,
+    }
+
+
+def waiting_patients(conn):
+    """(patient ids, feature matrix) for every patient not yet discharged."""
+    cursor = conn.cursor()
+    cursor.row_factory = None  # plain tuples convert to arrays fastest
+    data = np.array(cursor.execute(WAITING_QUERY).fetchall(), dtype=float).reshape(-1, 2)
+    if not len(data):
+        return np.empty(0, dtype=int), waiting_features(data[:, 1], data[:, 1])
+    hours = data[:, 1] // 3600
+    counts = np.array(cursor.execute(HOUR_COUNTS_QUERY, (hours.min() * 3600,)).fetchall(), dtype=float)
+    # every waiting patient's hour is in `counts` (it counts the patient)
+    patient_count = counts[np.searchsorted(counts[:, 0], hours), 1]
+    return data[:, 0].astype(int), waiting_features(data[:, 1], patient_count)
+
+
+def waiting_features(created_at, patient_count):
+    """Feature matrix for patients created at unix times `created_at` whose
+    arrival hour saw `patient_count` patients. Hours and weekdays are UTC,
+    as strftime(..., 'unixepoch') computes them for training."""
+    created_at = np.asarray(created_at, dtype=float)
+    X = np.empty((len(created_at), len(FEATURES)))
+    X[:, 0] = (created_at // 3600) % 24
+    X[:, 1] = (created_at // 86400 + 4) % 7  # 1970-01-01 was a Thursday (%w = 4)
+    X[:, 2] = patient_count
+    return X
+
+
+def distinct_rows(X):
+    """(distinct rows of `X`, index of each row of `X` in them). Same as
+    np.unique(X, axis=0, return_inverse=True), without its slow structured
+    sort."""
+    order = np.lexsort(X.T[::-1])
+    ordered = X[order]
+    first = np.empty(len(X), dtype=bool)
+    first[:1] = True
+    first[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    inverse = np.empty(len(X), dtype=np.intp)
+    inverse[order] = np.cumsum(first) - 1
+    return ordered[first], inverse
+
+
+class WaitModel:
+    """Lazily loaded, atomically replaced model bundle.
+
+    Predictions are cached per distinct feature row for the current bundle,
+    so repeated scoring of the same waiting room only runs the forest for
+    rows it has not seen.
+    """
+
+    def __init__(self, path, cache_size=100_000):
+        self.path = path
+        self.cache_size = cache_size
+        self._bundle = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._cache = (None, {})  # (bundle, {feature row: prediction})
+
+    def get(self):
+        """The current bundle, loaded from disk on first use (None if no
+        model has been trained yet)."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    if os.path.exists(self.path):
+                        with open(self.path, 'rb') as f:
+                            self._bundle = pickle.load(f)
+                    self._loaded = True
+        return self._bundle
+
+    def replace(self, bundle):
+        """Persist `bundle` and make it the model new requests score with."""
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        with self._lock:
+            self._bundle = bundle
+            self._loaded = True
+
+    def predict(self, X, bundle=None):
+        """Predicted waits (minutes) for every row of `X`, from at most one
+        model call over the distinct rows not already cached."""
+        bundle = bundle or self.get()
+        if bundle is None:
+            raise LookupError('No wait model has been trained yet')
+        if not len(X):
+            return np.empty(0)
+        unique, inverse = distinct_rows(X)
+        cached_for, cache = self._cache
+        if cached_for is not bundle or len(cache) > self.cache_size:
+            cache = {}
+            self._cache = (bundle, cache)
+        keys = [row.tobytes() for row in unique]
+        missing = [i for i, key in enumerate(keys) if key not in cache]
+        if missing:
+            predicted = bundle['model'].predict(bundle['scaler'].transform(unique[missing]))
+            cache.update(zip((keys[i] for i in missing), np.maximum(predicted, 0).tolist()))
+        return np.array([cache[key] for key in keys])[inverse]
+
+
+class RetrainWorker(threading.Thread):
+    """Retrains `wait_model` every `interval` seconds (or on `request()`)
+    when the training data has changed since the last run."""
+
+    def __init__(self, wait_model, connect, interval=3600, min_rows=10):
+        super().__init__(name='wait-model-retrain', daemon=True)
+        self.wait_model = wait_model
+        self.connect = connect
+        self.interval = interval
+        self.min_rows = min_rows
+        self.stats = {'runs': 0, 'trained': 0, 'skipped': 0, 'errors': 0, 'last_error': None, 'last_seconds': None}
+        self._wake = threading.Event()
+        self._marker = None
+
+    def request(self):
+        """Ask for a retrain soon; returns immediately."""
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self.retrain()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def retrain(self):
+        self.stats['runs'] += 1
+        start = time.perf_counter()
+        try:
+            conn = self.connect()
+            try:
+                marker = data_marker(conn)
+                if marker == self._marker and self.wait_model.get() is not None:
+                    self.stats['skipped'] += 1
+                    return False
+                X, y = load_training_data(conn)
+            finally:
+                conn.close()
+            if len(X) < self.min_rows:
+                self.stats['skipped'] += 1
+                return False  # not enough data for training
+            self.wait_model.replace(train(X, y))
+            self._marker = marker
+            self.stats['trained'] += 1
+            return True
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.stats['last_error'] = str(e)
+            print(f'ML training error: {e}')
+            return False
+        finally:
+            self.stats['last_seconds'] = round(time.perf_counter() - start, 3)
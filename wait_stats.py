@@ -0,0 +1,255 @@
+"""Streaming waiting-time statistics (HDR-style histograms).
+
+Waits are counted in log-linear buckets, as in HdrHistogram: values are
+stored in units of `unit` minutes (one second by default). Values below
+2**precision_bits units get one bucket each. Above that, every power of two
+is split into 2**(precision_bits - 1) equal buckets. Each bucket keeps the
+count and sum of its values and reports their mean. That mean is exact when
+the values are equal (whole-minute waits) and otherwise within
+2**-(precision_bits - 1) (0.8% at the default 8 bits) of any value in the
+bucket. Only non-empty buckets are stored, so:
+
+* add / remove are O(1),
+* percentiles sort the distinct buckets in use (a few hundred for minute
+  waits), never the patients.
+
+Histograms with the same unit and precision merge bucket by bucket, so the
+histograms of several sites add up to the histogram of all their patients;
+`to_dict` / `from_dict` carry them between processes.
+
+`WaitStats` listens to the patient registry. It keeps the waits of the
+patients currently in care, overall and per stage and priority. It also
+keeps sliding windows of completed stage waits (the wait a patient had when
+they moved on), in one-minute slots.
+"""
+import time
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+
+class WaitHistogram:
+    def __init__(self, unit=1 / 60, precision_bits=8):
+        self.unit = unit
+        self.precision_bits = precision_bits
+        self._sub = 1 << precision_bits
+        self._half = self._sub >> 1
+        self.buckets = {}  # bucket index -> (count, sum)
+        self.count = 0
+        self.total = 0.0
+
+    def __len__(self):
+        return self.count
+
+    def _bucket(self, value):
+        x = int(value / self.unit + 0.5) if value > 0 else 0
+        if x < self._sub:
+            return x
+        shift = x.bit_length() - self.precision_bits
+        return self._sub + (shift - 1) * self._half + ((x >> shift) - self._half)
+
+    def _value(self, index):
+        count, total = self.buckets[index]
+        return total / count
+
+    def add(self, value, n=1):
+        index = self._bucket(value)
+        count, total = self.buckets.get(index, (0, 0.0))
+        count += n
+        if count > 0:
+            self.buckets[index] = (count, total + value * n)
+        else:
+            self.buckets.pop(index, None)
+        self.count += n
+        self.total += value * n
+        if not self.count:
+            self.total = 0.0  # drop accumulated rounding once empty
+
+    def remove(self, value):
+        self.add(value, -1)
+
+    def clear(self):
+        self.buckets.clear()
+        self.count = 0
+        self.total = 0.0
+
+    def merge(self, other):
+        # copy() is atomic, so a reader can merge a histogram the writer is
+        # still updating
+        for index, (n, total) in other.buckets.copy().items():
+            count, sum_ = self.buckets.get(index, (0, 0.0))
+            self.buckets[index] = (count + n, sum_ + total)
+        self.count += other.count
+        self.total += other.total
+        return self
+
+    def to_dict(self):
+        """JSON-safe copy of the buckets, so a histogram kept in another
+        process can be merged (see from_dict)."""
+        return {'unit': self.unit, 'precision_bits': self.precision_bits,
+                'buckets': [[index, n, total] for index, (n, total) in sorted(self.buckets.copy().items())]}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['unit'], data['precision_bits'])
+        for index, n, total in data['buckets']:
+            histogram.buckets[index] = (n, total)
+            histogram.count += n
+            histogram.total += total
+        return histogram
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def min(self):
+        return self._value(min(self.buckets)) if self.buckets else None
+
+    def max(self):
+        return self._value(max(self.buckets)) if self.buckets else None
+
+    def count_below(self, value):
+        """How many values are below `value`, judged by bucket mean. Exact for
+        whole-minute waits up to 2**13 units (over two hours at the default
+        unit), where every minute still has a bucket of its own."""
+        return sum(n for n, total in self.buckets.copy().values() if total / n < value)
+
+    def percentiles(self, qs=DEFAULT_PERCENTILES):
+        """{q: value} for each percentile q in (0, 100], nearest-rank, in one
+        pass over the sorted buckets."""
+        if not self.count:
+            return {q: None for q in qs}
+        targets = sorted((max(1, -(-q * self.count // 100)), q) for q in qs)
+        result, seen, i = {}, 0, 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index][0]
+            while i < len(targets) and targets[i][0] <= seen:
+                result[targets[i][1]] = self._value(index)
+                i += 1
+            if i == len(targets):
+                break
+        return result
+
+    def percentile(self, q):
+        return self.percentiles((q,))[q]
+
+    def summary(self, qs=DEFAULT_PERCENTILES, digits=1):
+        """Count, mean, min, max and percentiles as the API returns them."""
+        values = {'count': self.count, 'mean': self.mean(), 'min': self.min(), 'max': self.max()}
+        values.update((f'p{q}', v) for q, v in self.percentiles(qs).items())
+        return {k: v if v is None or k == 'count' else round(v, digits) for k, v in values.items()}
+
+
+class SlidingHistogram:
+    """Histograms of the last `span` seconds, kept in `slot_seconds` slots.
+    A slot is reset when its ring position comes round again; slots that fell
+    out of the window are released whenever a new slot starts."""
+
+    def __init__(self, span=4 * 3600, slot_seconds=60, clock=time.time, **histogram_options):
+        self.slot_seconds = slot_seconds
+        self.span = span
+        self.clock = clock
+        self._options = histogram_options
+        self._slots = [(None, None)] * (span // slot_seconds + 1)
+
+    def add(self, value, ts=None):
+        slot = int((self.clock() if ts is None else ts) // self.slot_seconds)
+        i = slot % len(self._slots)
+        held, histogram = self._slots[i]
+        if held != slot:
+            if held is not None and held > slot:
+                return  # older than the window
+            histogram = WaitHistogram(**self._options)
+            oldest = slot - len(self._slots) + 1
+            # swapped in whole: window() reads a copy of the list
+            self._slots = [(held, h) if held is not None and held >= oldest else (None, None)
+                           for held, h in self._slots]
+            self._slots[i] = (slot, histogram)
+        histogram.add(value)
+
+    def window(self, seconds, now=None):
+        """One histogram merged from the slots in the last `seconds`."""
+        now = self.clock() if now is None else now
+        last = int(now // self.slot_seconds)
+        first = last - max(1, min(seconds, self.span) // self.slot_seconds) + 1
+        merged = WaitHistogram(**self._options)
+        for held, histogram in list(self._slots):
+            if held is not None and first <= held <= last:
+                merged.merge(histogram)
+        return merged
+
+
+class WaitStats:
+    """Waits of patients in care and of completed stage waits, kept up to date
+    from registry changes.
+
+    Keys are 'all', 'stage:<name>' and 'priority:<name>'. Patients in
+    `exclude` stages (e.g. Discharge) are not counted.
+    """
+
+    def __init__(self, exclude=(), span=4 * 3600, clock=time.time):
+        self.exclude = set(exclude)
+        self.span = span
+        self.clock = clock
+        self.current = {}
+        self.completed = {}
+        self._counted = {}  # patient id -> (stage, priority, wait) as counted
+
+    def _keys(self, stage, priority):
+        return ('all', f'stage:{stage}', f'priority:{priority}')
+
+    def _current(self, key):
+        histogram = self.current.get(key)
+        if histogram is None:
+            histogram = self.current[key] = WaitHistogram()
+        return histogram
+
+    def listener(self, patient, old_stage, removed):
+        """Registry listener (see PatientRegistry.add_listener)."""
+        pid = patient['id']
+        previous = self._counted.pop(pid, None)
+        if previous is not None:
+            stage, priority, wait = previous
+            for key in self._keys(stage, priority):
+                self.current[key].remove(wait)
+            if not removed and patient.get('stage') != stage:
+                now = self.clock()
+                for key in self._keys(stage, priority):
+                    window = self.completed.get(key)
+                    if window is None:
+                        window = self.completed[key] = SlidingHistogram(self.span, clock=self.clock)
+                    window.add(wait, now)
+        if removed or patient.get('stage') in self.exclude:
+            return
+        entry = (patient.get('stage'), patient.get('priority'), patient.get('waiting_time') or 0)
+        self._counted[pid] = entry
+        for key in self._keys(entry[0], entry[1]):
+            self._current(key).add(entry[2])
+
+    def sync(self, patients):
+        """Count every patient in `patients` from scratch (startup, reset)."""
+        self.clear()
+        for patient in patients:
+            self.listener(patient, None, False)
+
+    def clear(self):
+        """Forget the current patients; completed-wait windows are kept."""
+        self.current.clear()
+        self._counted.clear()
+
+    def mean(self, key='all'):
+        histogram = self.current.get(key)
+        return histogram.mean() if histogram is not None else None
+
+    def summary(self, key='all'):
+        histogram = self.current.get(key)
+        return (histogram or WaitHistogram()).summary()
+
+    def recent(self, key='all', minutes=60):
+        """Summary of stage waits completed in the last `minutes`."""
+        window = self.completed.get(key)
+        if window is None:
+            return WaitHistogram().summary()
+        return window.window(minutes * 60).summary()
+
+    def keys(self, kind):
+        prefix = f'{kind}:'
+        return sorted(k[len(prefix):] for k in set(self.current) | set(self.completed) if k.startswith(prefix))